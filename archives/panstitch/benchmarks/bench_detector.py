@@ -0,0 +1,47 @@
+"""Scaling of FeatureDetector.detect from 1 to N workers
+
+python -m benchmarks.bench_detector
+"""
+import os
+import time
+
+from .context import image_set
+from stitching.feature_detector import FeatureDetector  # noqa: E402
+from stitching.images import Images  # noqa: E402
+
+
+def time_detection(detector, imgs, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        features = detector.detect(imgs)
+        best = min(best, time.perf_counter() - start)
+    return best, features
+
+
+def same_features(features1, features2):
+    return all(
+        [kp.pt for kp in f1.getKeypoints()] == [kp.pt for kp in f2.getKeypoints()]
+        for f1, f2 in zip(features1, features2)
+    )
+
+
+def main():
+    max_workers = os.cpu_count() or 1
+    for set_name in ("boardtest", "simtests"):
+        images = Images.of(image_set(set_name))
+        imgs = list(images.resize(Images.Resolution.MEDIUM))
+
+        baseline, reference = time_detection(FeatureDetector(workers=1), imgs)
+        print(f"{set_name}: {len(imgs)} images")
+        for workers in range(1, max_workers + 1):
+            needed, features = time_detection(FeatureDetector(workers=workers), imgs)
+            assert same_features(reference, features)
+            print(
+                f"  workers={workers:2d}  {needed * 1000:8.1f} ms"
+                f"  speedup {baseline / needed:4.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Decode counts and wall time of Stitcher.stitch with and without ImageCache
+
+python -m benchmarks.bench_image_cache
+"""
+
+import tempfile
+import time
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+
+
+def time_stitch(imgs, **settings):
+    # the first run fills the cache (and reuses it between the passes), the
+    # second one reuses it from the start
+    stitcher = Stitcher(crop=False, **settings)
+    needed = []
+    for _ in range(2):
+        start = time.perf_counter()
+        stitcher.stitch(imgs)
+        needed.append(time.perf_counter() - start)
+        stats = stitcher.image_cache.stats
+    return needed, stats, stitcher.image_cache
+
+
+def report(name, needed, stats=None):
+    print(f"{name:14} first {needed[0]:6.2f} s  second {needed[1]:6.2f} s", end="")
+    print(f"  {stats}" if stats else "")
+
+
+def main():
+    imgs = image_set("boardtest")
+
+    needed, _, _ = time_stitch(imgs)
+    report("no cache:", needed)
+
+    needed, stats, _ = time_stitch(imgs, cache_megabytes=1000)
+    report("memory cache:", needed, stats)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        needed, stats, cache = time_stitch(imgs, cache_megabytes=0, cache_dir=cache_dir)
+        report("disk cache:", needed, stats)
+        cache.clear()
+
+
+if __name__ == "__main__":
+    main()
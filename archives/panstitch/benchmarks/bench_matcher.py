@@ -0,0 +1,51 @@
+"""Pairwise matching with apply2 against 1 to N matching workers
+
+python -m benchmarks.bench_matcher
+"""
+
+import os
+import time
+
+from .context import image_set
+from stitching.feature_detector import FeatureDetector  # noqa: E402
+from stitching.feature_matcher import FeatureMatcher  # noqa: E402
+from stitching.images import Images  # noqa: E402
+
+
+def time_matching(matcher, features, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        matches = matcher.match_features(features)
+        best = min(best, time.perf_counter() - start)
+    return best, matches
+
+
+def matched_pairs(matches):
+    return sum(m.src_img_idx != -1 for m in matches) // 2
+
+
+def main():
+    max_workers = os.cpu_count() or 1
+    for set_name in ("boardtest", "simtests"):
+        images = Images.of(image_set(set_name))
+        imgs = list(images.resize(Images.Resolution.MEDIUM))
+        features = FeatureDetector().detect(imgs)
+
+        baseline, _ = time_matching(FeatureMatcher(), features)
+        print(f"{set_name}: {len(imgs)} images, apply2 {baseline * 1000:8.1f} ms")
+        for workers in range(2, max(max_workers, 2) + 1):
+            for stop_when_connected in (False, True):
+                matcher = FeatureMatcher(
+                    workers=workers, stop_when_connected=stop_when_connected
+                )
+                needed, matches = time_matching(matcher, features)
+                print(
+                    f"  workers={workers:2d}  stop={stop_when_connected!s:5}"
+                    f"  {needed * 1000:8.1f} ms  speedup {baseline / needed:4.2f}x"
+                    f"  pairs matched {matched_pairs(matches)}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Stitcher.stitch end-to-end with the sequential final resolution composition
+against the pipelined one (decode, resize, warp, crop, compensate and feed
+overlapping in threads)
+
+python -m benchmarks.bench_pipeline
+"""
+
+import os
+import time
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+
+CONFIGURATIONS = {
+    "sequential": {},
+    "read ahead (2 frames)": {"composition_frames": 2},
+    "pipelined": {"pipelined_composition": True},
+    "pipelined (queue size 2)": {
+        "pipelined_composition": True,
+        "pipeline_queue_size": 2,
+    },
+}
+
+
+def time_stitch(imgs, repeats=3, **settings):
+    best = float("inf")
+    for _ in range(repeats):
+        stitcher = Stitcher(crop=False, **settings)
+        start = time.perf_counter()
+        stitcher.stitch(imgs)
+        best = min(best, time.perf_counter() - start)
+    return best, stitcher
+
+
+def main():
+    # the stages only overlap on more than one core
+    print(f"{os.cpu_count()} cpus")
+    for name in ("boardtest",):
+        imgs = image_set(name)
+        # the cameras are estimated once, only the composition differs
+        _, stitcher = time_stitch(imgs, repeats=1)
+        calibration = stitcher.calibration
+        print(f"{name} ({len(imgs)} images)")
+        for configuration, settings in CONFIGURATIONS.items():
+            needed, stitcher = time_stitch(imgs, rig_model=calibration, **settings)
+            print(f"  {configuration:26} {needed:6.2f} s")
+        for stage, summary in stitcher.composition_pipeline.summary().items():
+            if stage != "wall_time_s":
+                print(
+                    f"    {stage:10} {summary['mean_ms']:7.1f} ms/image, "
+                    f"waited {summary['waited_s']:5.2f} s"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Overhead of the Stitcher profiler: disabled, enabled and with traced memory.
+Also writes the report and Chrome trace of the last run
+
+python -m benchmarks.bench_profiler [output_dir]
+"""
+
+import os
+import sys
+import time
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+
+
+def time_stitch(imgs, repeats=3, **settings):
+    best = float("inf")
+    for _ in range(repeats):
+        stitcher = Stitcher(crop=False, **settings)
+        start = time.perf_counter()
+        stitcher.stitch(imgs)
+        best = min(best, time.perf_counter() - start)
+    return best, stitcher
+
+
+def main():
+    output_dir = sys.argv[1] if len(sys.argv) > 1 else "."
+    imgs = image_set("boardtest")
+    for name, settings in (
+        ("disabled", {}),
+        ("enabled", {"profile": True}),
+        ("enabled, traced memory", {"profile": True, "profile_memory": True}),
+    ):
+        needed, stitcher = time_stitch(imgs, **settings)
+        print(f"{name:24} {needed:6.2f} s")
+
+    for stage, summary in stitcher.profiler.summary().items():
+        print(
+            f"  {stage:32} {summary['calls']:3}x {summary['wall_s']:6.2f} s "
+            f"cpu {summary['cpu_s']:6.2f} s "
+            f"{summary['pixels_out'] / 10**6:6.1f} MPx out "
+            f"peak {summary['memory_peak_mb']:7.1f} MB"
+        )
+    stitcher.profiler.save_json(os.path.join(output_dir, "profile.json"))
+    stitcher.profiler.save_chrome_trace(os.path.join(output_dir, "trace.json"))
+
+
+if __name__ == "__main__":
+    main()
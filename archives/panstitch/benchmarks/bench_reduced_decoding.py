@@ -0,0 +1,53 @@
+"""Decode time and peak memory per resolution, full vs. reduced JPEG decoding
+
+python -m benchmarks.bench_reduced_decoding
+"""
+import time
+import tracemalloc
+
+import cv2 as cv
+
+from .context import image_set
+from stitching.images import Images  # noqa: E402
+
+
+def measure(func, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args)
+    needed = time.perf_counter() - start
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return needed, peak_memory
+
+
+def full_decoding(names, scaler, sizes):
+    for name, size in zip(names, sizes):
+        Images.resize_img_by_scaler(scaler, size, Images.read_image(name))
+
+
+def reduced_decoding(names, scaler, sizes):
+    for name, size in zip(names, sizes):
+        flag = Images.get_read_flag(scaler, size)
+        Images.resize_img_by_scaler(scaler, size, Images.read_image(name, flag))
+
+
+def main():
+    names = image_set("boardtest")
+    images = Images.of(names)
+    sizes = [Images.get_image_size(cv.imread(name)) for name in names]
+    images._set_scales(sizes[0])
+
+    for resolution in Images.Resolution:
+        scaler = images._get_scaler(resolution)
+        print(f"{resolution.name} ({len(names)} images)")
+        for label, func in (("full", full_decoding), ("reduced", reduced_decoding)):
+            needed, peak_memory = measure(func, names, scaler, sizes)
+            print(
+                f"  {label:8s} {needed * 1000:8.1f} ms"
+                f"  peak {peak_memory / 10**6:7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Recall vs. speedup of retrieval pair selection against exhaustive matching
+
+python -m benchmarks.bench_retrieval
+"""
+import time
+
+from .context import image_set
+from stitching.feature_detector import FeatureDetector  # noqa: E402
+from stitching.feature_matcher import FeatureMatcher  # noqa: E402
+from stitching.image_retrieval import ImageRetrieval  # noqa: E402
+from stitching.images import Images  # noqa: E402
+from stitching.pair_selector import PairSelector  # noqa: E402
+from stitching.subsetter import Subsetter  # noqa: E402
+
+
+def confident_pairs(matches, nr_imgs, conf_thresh):
+    return {
+        (i, j)
+        for i, j in FeatureMatcher.get_all_img_combinations(nr_imgs)
+        if matches[i * nr_imgs + j].confidence >= conf_thresh
+    }
+
+
+def main():
+    # two unrelated scenes, only pairs within a scene should be matched
+    imgs = [
+        img
+        for set_name in ("boardtest", "simtests")
+        for img in Images.of(image_set(set_name)).resize(Images.Resolution.MEDIUM)
+    ]
+    features = FeatureDetector().detect(imgs)
+    nr_imgs = len(features)
+    conf_thresh = Subsetter.DEFAULT_CONFIDENCE_THRESHOLD
+    matcher = FeatureMatcher(match_conf=FeatureMatcher.get_default_match_conf("orb"))
+
+    start = time.perf_counter()
+    matches = matcher.match_features(features)
+    exhaustive_time = time.perf_counter() - start
+    true_pairs = confident_pairs(matches, nr_imgs, conf_thresh)
+    nr_all_pairs = nr_imgs * (nr_imgs - 1) // 2
+    print(
+        f"exhaustive: {nr_all_pairs} pairs, {len(true_pairs)} confident,"
+        f" {exhaustive_time * 1000:.1f} ms"
+    )
+
+    retrieval = ImageRetrieval()
+    for k in (1, 2, 3, 4, 6):
+        start = time.perf_counter()
+        pairs = retrieval.top_k_pairs(features, k)
+        mask = PairSelector.pairs_to_mask(nr_imgs, pairs)
+        matcher.match_features(features, mask)
+        needed = time.perf_counter() - start
+        recall = len(true_pairs & set(pairs)) / max(len(true_pairs), 1)
+        print(
+            f"top-{k}: {len(pairs):3d} pairs  recall {recall:5.1%}"
+            f"  {needed * 1000:7.1f} ms  speedup {exhaustive_time / needed:4.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
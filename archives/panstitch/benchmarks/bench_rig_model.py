@@ -0,0 +1,50 @@
+"""Stitcher.stitch with full estimation against the reuse of a saved RigModel
+
+python -m benchmarks.bench_rig_model
+"""
+
+import os
+import tempfile
+import time
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+
+
+def time_stitch(imgs, repeats=3, **settings):
+    best = float("inf")
+    for _ in range(repeats):
+        stitcher = Stitcher(crop=False, **settings)
+        start = time.perf_counter()
+        stitcher.stitch(imgs)
+        best = min(best, time.perf_counter() - start)
+    return best, stitcher
+
+
+def main():
+    imgs = image_set("boardtest")
+    for final_megapix in (-1, 1):
+        print(f"final_megapix={final_megapix}")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rig_model = os.path.join(tmp_dir, "rig.npz")
+
+            needed, stitcher = time_stitch(imgs, final_megapix=final_megapix)
+            stitcher.calibration.save(rig_model)
+            print(f"  full estimation:        {needed:6.2f} s")
+
+            needed, _ = time_stitch(
+                imgs, final_megapix=final_megapix, rig_model=rig_model
+            )
+            print(f"  rig model:              {needed:6.2f} s")
+
+            needed, _ = time_stitch(
+                imgs,
+                final_megapix=final_megapix,
+                rig_model=rig_model,
+                rig_drift_threshold=5,
+            )
+            print(f"  rig model, drift check: {needed:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
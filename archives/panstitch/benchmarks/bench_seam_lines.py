@@ -0,0 +1,84 @@
+"""SeamFinder.extract_seam_lines against the former per pixel python loop,
+on the blended seam masks of boardtest at low and final resolution
+
+python -m benchmarks.bench_seam_lines
+"""
+
+import time
+
+import cv2 as cv
+import numpy as np
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+from stitching.seam_finder import SeamFinder  # noqa: E402
+
+
+class SeamMaskStitcher(Stitcher):
+    def find_seam_masks(self, imgs, corners, masks):
+        seam_masks = super().find_seam_masks(imgs, corners, masks)
+        sizes = [(img.shape[1], img.shape[0]) for img in imgs]
+        self.low_seam_masks = (seam_masks, corners, sizes)
+        return seam_masks
+
+    def blend_images(self, frames):
+        self.final_seam_masks = ([], [], [])
+        for _ in self.images.names:
+            img, seam_mask, corner = next(frames)
+            self.final_seam_masks[0].append(seam_mask)
+            self.final_seam_masks[1].append(corner)
+            self.final_seam_masks[2].append((img.shape[1], img.shape[0]))
+            self.blender.feed(img, seam_mask, corner)
+
+
+def extract_seam_lines_loop(blended_seam_masks, linesize=1):
+    # the implementation before the vectorization
+    def get_pixel_value(img, x, y):
+        try:
+            return img[x, y]
+        except IndexError:
+            pass
+
+    def is_pixel_black(img, x, y):
+        return np.all(get_pixel_value(img, x, y) == 0)
+
+    seam_lines = cv.Canny(np.uint8(blended_seam_masks), 100, 200)
+    for x, y in zip(*(seam_lines == 255).nonzero()):
+        if any(
+            is_pixel_black(blended_seam_masks, x + dx, y + dy)
+            for dx, dy in ((0, 0), (1, 0), (-1, 0), (0, 1), (0, -1))
+        ):
+            seam_lines[x, y] = 0
+    kernelsize = linesize + linesize - 1
+    kernel = np.ones((kernelsize, kernelsize), np.uint8)
+    return cv.dilate(seam_lines, kernel)
+
+
+def best_time(function, *args, repeats=3):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    stitcher = SeamMaskStitcher(crop=False)
+    stitcher.stitch(image_set("boardtest"))
+    for name, seam_masks in (
+        ("low", stitcher.low_seam_masks),
+        ("final", stitcher.final_seam_masks),
+    ):
+        blended = SeamFinder.blend_seam_masks(*seam_masks)
+        print(f"{name} resolution, {blended.shape[1]}x{blended.shape[0]}")
+        repeats = 3 if name == "low" else 1
+        loop, expected = best_time(extract_seam_lines_loop, blended, repeats=repeats)
+        vectorized, result = best_time(SeamFinder.extract_seam_lines, blended)
+        print(f"  loop        {loop * 1000:10.1f} ms")
+        print(f"  vectorized  {vectorized * 1000:10.1f} ms")
+        print(f"  identical   {np.array_equal(result, expected)}")
+
+
+if __name__ == "__main__":
+    main()
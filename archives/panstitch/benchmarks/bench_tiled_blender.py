@@ -0,0 +1,53 @@
+"""Peak memory (max RSS) and wall time of Stitcher.stitch with the Blender and
+the TiledBlender. Every run happens in a fresh process.
+
+python -m benchmarks.bench_tiled_blender
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+from stitching.profiler import Profiler  # noqa: E402
+
+
+def stitch(imgs, settings, results):
+    start = time.perf_counter()
+    Stitcher(crop=False, **settings).stitch(imgs)
+    needed = time.perf_counter() - start
+    max_rss = Profiler.get_peak_rss_mb()
+    results.put((needed, max_rss))
+
+
+def run(imgs, **settings):
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(target=stitch, args=(imgs, settings, results))
+    process.start()
+    needed, max_rss = results.get()
+    process.join()
+    return needed, max_rss
+
+
+def main():
+    imgs = image_set("boardtest")
+    with tempfile.TemporaryDirectory() as output_dir:
+        runs = {
+            "Blender": {},
+            "tiles 2048": {"blend_tile_size": 2048},
+            "tiles 1024": {"blend_tile_size": 1024},
+            "tiles 512": {"blend_tile_size": 512},
+            "tiles 1024 -> tif": {
+                "blend_tile_size": 1024,
+                "blend_output": os.path.join(output_dir, "panorama.tif"),
+            },
+        }
+        for name, settings in runs.items():
+            needed, max_rss = run(imgs, **settings)
+            print(f"{name:18s} {needed:6.2f} s  max rss {max_rss:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""VideoStitcher throughput and per-stage latency on recorded videos of a
+simulated two camera rig, blocking against dropping frames at a target fps
+
+python -m benchmarks.bench_video_stitcher
+"""
+
+import os
+import tempfile
+
+import cv2 as cv
+import numpy as np
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+from stitching.video_stitcher import VideoStitcher  # noqa: E402
+
+
+def record_videos(tmp_dir, nr_frames=60, size=(1920, 1080), overlap=0.3):
+    img = cv.resize(cv.imread(image_set("boardtest")[0]), size)
+    width = int(size[0] * (1 + overlap) / 2)
+    videos = []
+    for idx, x in enumerate((0, size[0] - width)):
+        path = os.path.join(tmp_dir, f"camera{idx}.avi")
+        writer = cv.VideoWriter(
+            path, cv.VideoWriter_fourcc(*"MJPG"), 30, (width, size[1])
+        )
+        for frame in range(nr_frames):
+            writer.write(np.roll(img, frame, axis=0)[:, x : x + width])
+        writer.release()
+        videos.append(path)
+    return videos
+
+
+def print_summary(summary):
+    for stage in VideoStitcher.STAGES:
+        s = summary[stage]
+        print(
+            f"    {stage:8} n={s['count']:3} dropped={s['dropped']:3} "
+            f"mean={s['mean_ms']:7.1f} ms  p95={s['p95_ms']:7.1f} ms  "
+            f"max={s['max_ms']:7.1f} ms"
+        )
+    print(f"    {summary['fps']:.1f} fps")
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        videos = record_videos(tmp_dir)
+        for drop_policy, target_fps in (
+            ("block", None),
+            ("drop_oldest", None),
+            ("drop_oldest", 30),
+        ):
+            print(f"drop_policy={drop_policy}, target_fps={target_fps}")
+            video_stitcher = VideoStitcher(
+                videos, Stitcher(crop=False), target_fps, drop_policy
+            )
+            for _ in video_stitcher.stream():
+                pass
+            print_summary(video_stitcher.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Warping with and without the WarpMapCache of the Warper
+
+python -m benchmarks.bench_warper
+"""
+
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+from .context import image_set
+from stitching import Stitcher  # noqa: E402
+from stitching.images import Images  # noqa: E402
+from stitching.warper import Warper  # noqa: E402
+
+
+class CameraStitcher(Stitcher):
+    def estimate_scale(self, cameras):
+        super().estimate_scale(cameras)
+        self.cameras = cameras
+
+
+def warp_without_maps(warper, img, camera, aspect):
+    # image, mask and roi each with its own projection as before the map cache
+    rotation_warper = cv.PyRotationWarper(warper.warper_type, warper.scale * aspect)
+    K = Warper.get_K(camera, aspect)
+    size = (img.shape[1], img.shape[0])
+    rotation_warper.warpRoi(size, K, camera.R)
+    _, warped = rotation_warper.warp(
+        img, K, camera.R, cv.INTER_LINEAR, cv.BORDER_REFLECT
+    )
+    mask = np.full(img.shape[:2], 255, np.uint8)
+    rotation_warper.warp(mask, K, camera.R, cv.INTER_NEAREST, cv.BORDER_CONSTANT)
+    return warped
+
+
+def warp_with_maps(warper, img, camera, aspect):
+    warper.warp_roi((img.shape[1], img.shape[0]), camera, aspect)
+    warped, _ = warper.warp_image_and_mask(img, camera, aspect)
+    return warped
+
+
+def time_warping(warp, warper, imgs, cameras, aspect, repeats=3):
+    needed = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for img, camera in zip(imgs, cameras):
+            warp(warper, img, camera, aspect)
+        needed.append(time.perf_counter() - start)
+    return needed
+
+
+def main():
+    stitcher = CameraStitcher(crop=False)
+    stitcher.stitch(image_set("boardtest"))
+    images, cameras = stitcher.images, stitcher.cameras
+
+    for resolution in (Images.Resolution.LOW, Images.Resolution.FINAL):
+        imgs = list(images.resize(resolution))
+        aspect = images.get_ratio(Images.Resolution.MEDIUM, resolution)
+        print(f"{resolution.name}: {len(imgs)} images of {imgs[0].shape}")
+
+        warper = Warper(map_cache_megabytes=0)
+        warper.scale = stitcher.warper.scale
+        needed = time_warping(warp_without_maps, warper, imgs, cameras, aspect)
+        print(f"  without maps       {min(needed) * 1000:8.1f} ms")
+
+        needed = time_warping(warp_with_maps, warper, imgs, cameras, aspect)
+        print(f"  maps, no cache     {min(needed) * 1000:8.1f} ms")
+
+        warper = Warper(map_cache_megabytes=1000)
+        warper.scale = stitcher.warper.scale
+        needed = time_warping(warp_with_maps, warper, imgs, cameras, aspect)
+        print(
+            f"  memory cache       {needed[0] * 1000:8.1f} ms first,"
+            f" {min(needed[1:]) * 1000:8.1f} ms cached"
+        )
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            warper = Warper(map_cache_megabytes=0, map_cache_dir=cache_dir)
+            warper.scale = stitcher.warper.scale
+            needed = time_warping(warp_with_maps, warper, imgs, cameras, aspect)
+            print(
+                f"  disk cache         {needed[0] * 1000:8.1f} ms first,"
+                f" {min(needed[1:]) * 1000:8.1f} ms cached"
+            )
+
+
+if __name__ == "__main__":
+    main()
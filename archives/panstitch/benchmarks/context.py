@@ -0,0 +1,16 @@
+import os
+import sys
+from glob import glob
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+IMAGE_SETS = {
+    "boardtest": os.path.join(ROOT_DIR, "boardtest", "2024*.jpg"),
+    "simtests": os.path.join(ROOT_DIR, "simtests", "simtest*.jpg"),
+}
+
+
+def image_set(name):
+    return sorted(glob(IMAGE_SETS[name]))
@@ -0,0 +1,307 @@
+"""Micro-benchmarks of the stitching classes and end-to-end stitches on
+synthetic scenes. Every run is appended to a JSON lines history, and runs are
+compared against the median of the earlier runs on the same machine so that
+throughput and peak memory regressions are caught.
+
+python -m benchmarks.suite
+python -m benchmarks.suite --scene 6,1920x1080,0.3 --repeats 5 --check
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import cv2 as cv
+
+from .context import ROOT_DIR
+from .synthetic import synthetic_scene
+from stitching import Stitcher  # noqa: E402
+from stitching.blender import Blender  # noqa: E402
+from stitching.cropper import Cropper  # noqa: E402
+from stitching.images import Images  # noqa: E402
+from stitching.warper import Warper  # noqa: E402
+
+DEFAULT_HISTORY = os.path.join(ROOT_DIR, "benchmarks", "results", "history.jsonl")
+DEFAULT_SCENES = ("4,1280x960,0.4", "8,1280x960,0.3", "3,3000x2000,0.4")
+DEFAULT_THRESHOLD = 0.15
+
+
+class Scene:
+    def __init__(self, description):
+        nr_images, size, overlap = description.split(",")
+        self.nr_images = int(nr_images)
+        self.size = tuple(int(i) for i in size.split("x"))
+        self.overlap = float(overlap)
+        self.name = description
+        self.imgs = synthetic_scene(self.nr_images, self.size, self.overlap)
+
+    @property
+    def megapixels(self):
+        return self.nr_images * self.size[0] * self.size[1] / 10**6
+
+
+class Intermediates:
+    """the inputs of every stage, computed once like in Stitcher.stitch"""
+
+    def __init__(self, scene):
+        stitcher = Stitcher(crop=False)
+        stitcher.images = Images.of(
+            list(scene.imgs),
+            stitcher.medium_megapix,
+            stitcher.low_megapix,
+            stitcher.final_megapix,
+        )
+        self.stitcher = stitcher
+        self.medium_imgs = stitcher.resize_medium_resolution()
+        features = stitcher.find_features(self.medium_imgs)
+        matches = stitcher.match_features(features)
+        _, self.features, matches = stitcher.subset(None, features, matches)
+        self.medium_imgs = [self.medium_imgs[i] for i in stitcher.subset_indices]
+        cameras = stitcher.estimate_camera_parameters(self.features, matches)
+        cameras = stitcher.refine_camera_parameters(self.features, matches, cameras)
+        self.cameras = stitcher.perform_wave_correction(cameras)
+        stitcher.estimate_scale(self.cameras)
+
+        low_imgs = stitcher.resize_low_resolution()
+        (
+            self.low_imgs,
+            self.low_masks,
+            self.low_corners,
+            self.low_sizes,
+        ) = stitcher.warp_low_resolution(low_imgs, self.cameras)
+        stitcher.prepare_cropper(
+            self.low_imgs, self.low_masks, self.low_corners, self.low_sizes
+        )
+        stitcher.estimate_exposure_errors(
+            self.low_corners, self.low_imgs, self.low_masks
+        )
+        self.seam_masks = stitcher.find_seam_masks(
+            self.low_imgs, self.low_corners, self.low_masks
+        )
+        self.final_imgs = list(stitcher.resize_final_resolution())
+        self.camera_aspect = stitcher.images.get_ratio(
+            Images.Resolution.MEDIUM, Images.Resolution.FINAL
+        )
+        self.corners, self.sizes = stitcher.get_final_resolution_rois(self.cameras)
+        self.frames = list(
+            stitcher.prepare_final_resolution_frames(
+                self.cameras, self.seam_masks, self.corners
+            )
+        )
+
+
+def micro_benchmarks(scene):
+    """name, function and processed megapixels of each micro-benchmark"""
+    data = Intermediates(scene)
+    stitcher = data.stitcher
+    medium_mpx = sum(img.size / 3 for img in data.medium_imgs) / 10**6
+    low_mpx = sum(img.size / 3 for img in data.low_imgs) / 10**6
+    final_mpx = sum(img.size / 3 for img in data.final_imgs) / 10**6
+    frames_mpx = sum(img.size / 3 for img, _, _ in data.frames) / 10**6
+
+    def warp_final():
+        warper = Warper(stitcher.warper.warper_type, map_cache_megabytes=0)
+        warper.scale = stitcher.warper.scale
+        for img, camera in zip(data.final_imgs, data.cameras):
+            warper.warp_image_and_mask(img, camera, data.camera_aspect)
+
+    def crop():
+        Cropper(True).prepare(
+            data.low_imgs, data.low_masks, data.low_corners, data.low_sizes
+        )
+
+    def compensate_feed():
+        stitcher.compensator.feed(data.low_corners, data.low_imgs, data.low_masks)
+
+    def compensate_apply():
+        for idx, (img, mask, corner) in enumerate(data.frames):
+            stitcher.compensator.apply(idx, corner, img.copy(), mask)
+
+    def blend():
+        blender = Blender()
+        blender.prepare(data.corners, data.sizes)
+        for img, mask, corner in data.frames:
+            blender.feed(img, mask, corner)
+        blender.blend()
+
+    def detect():
+        stitcher.detector.detect(data.medium_imgs)
+
+    def match():
+        stitcher.matcher.match_features(data.features)
+
+    def find_seams():
+        stitcher.seam_finder.find(data.low_imgs, data.low_corners, data.low_masks)
+
+    return [
+        ("FeatureDetector.detect", detect, medium_mpx),
+        ("FeatureMatcher.match_features", match, medium_mpx),
+        ("Warper.warp_image_and_mask", warp_final, final_mpx),
+        ("Cropper.prepare", crop, low_mpx),
+        ("SeamFinder.find", find_seams, low_mpx),
+        ("ExposureErrorCompensator.feed", compensate_feed, low_mpx),
+        ("ExposureErrorCompensator.apply", compensate_apply, frames_mpx),
+        ("Blender", blend, frames_mpx),
+    ]
+
+
+def end_to_end_benchmarks(scene):
+    return [
+        ("Stitcher.stitch", lambda: Stitcher(crop=False).stitch(scene.imgs)),
+        ("Stitcher.stitch (crop)", lambda: Stitcher().stitch(scene.imgs)),
+    ]
+
+
+def measure(function, repeats):
+    """best wall time of repeats runs and the traced peak memory of one more"""
+    seconds = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak / 10**6
+
+
+def machine():
+    return {
+        "node": platform.node(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv.__version__,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.isfile(path):
+        return []
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def save_results(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "a") as file:
+        for result in results:
+            file.write(json.dumps(result) + "\n")
+
+
+def find_regressions(result, history, threshold):
+    """compared to the median of the earlier runs of the same benchmark and
+    scene on the same machine"""
+    earlier = [
+        r
+        for r in history
+        if r["benchmark"] == result["benchmark"]
+        and r["scene"] == result["scene"]  # noqa: W503
+        and r["machine"] == result["machine"]  # noqa: W503
+    ]
+    if not earlier:
+        return []
+    regressions = []
+    for key, name in (("seconds", "time"), ("peak_mb", "peak memory")):
+        baseline = statistics.median(r[key] for r in earlier)
+        if baseline > 0 and result[key] > baseline * (1 + threshold):
+            regressions.append(
+                f"{name} {result[key]:.3f} vs {baseline:.3f}"
+                f" (+{result[key] / baseline - 1:.0%})"
+            )
+    return regressions
+
+
+def run(scenes, repeats, only=None):
+    timestamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    commit, machine_info = git_commit(), machine()
+    for description in scenes:
+        scene = Scene(description)
+        benchmarks = []
+        if only in (None, "micro"):
+            benchmarks += micro_benchmarks(scene)
+        if only in (None, "end-to-end"):
+            benchmarks += [
+                (name, function, scene.megapixels)
+                for name, function in end_to_end_benchmarks(scene)
+            ]
+        for name, function, megapixels in benchmarks:
+            seconds, peak_mb = measure(function, repeats)
+            yield {
+                "timestamp": timestamp,
+                "commit": commit,
+                "machine": machine_info,
+                "scene": scene.name,
+                "benchmark": name,
+                "seconds": seconds,
+                "megapixels_per_s": megapixels / seconds,
+                "peak_mb": peak_mb,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scene",
+        action="append",
+        help="nr_images,WIDTHxHEIGHT,overlap (repeatable), "
+        f"default: {' '.join(DEFAULT_SCENES)}",
+    )
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", choices=("micro", "end-to-end"))
+    parser.add_argument("--history", default=DEFAULT_HISTORY)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="relative slowdown or memory increase reported as regression",
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="exit with 1 if there are regressions"
+    )
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    results, nr_regressions = [], 0
+    for result in run(args.scene or DEFAULT_SCENES, args.repeats, args.only):
+        regressions = find_regressions(result, history, args.threshold)
+        nr_regressions += len(regressions)
+        print(
+            f"{result['scene']:18} {result['benchmark']:36}"
+            f" {result['seconds'] * 1000:9.1f} ms"
+            f" {result['megapixels_per_s']:8.1f} MPx/s"
+            f" {result['peak_mb']:8.1f} MB"
+            + "".join(f"  REGRESSION {r}" for r in regressions)
+        )
+        results.append(result)
+
+    if not args.no_save:
+        save_results(args.history, results)
+    if args.check and nr_regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Synthetic image sets of a camera rotating about its center, rendered from
+one large cylindrical panorama so that the ground truth is known and any
+image count, resolution and overlap can be generated locally"""
+
+import math
+
+import cv2 as cv
+import numpy as np
+
+
+def synthetic_panorama(width, height, seed=0):
+    """a deterministic, feature rich texture of random shapes"""
+    rng = np.random.default_rng(seed)
+    panorama = cv.resize(
+        rng.integers(0, 256, (height // 32 + 1, width // 32 + 1, 3), np.uint8),
+        (width, height),
+        interpolation=cv.INTER_CUBIC,
+    )
+    nr_shapes = width * height // 2000
+    for _ in range(nr_shapes):
+        color = tuple(int(c) for c in rng.integers(0, 256, 3))
+        x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+        size = int(rng.integers(4, 40))
+        if rng.random() < 0.5:
+            cv.rectangle(panorama, (x, y), (x + size, y + size // 2), color, -1)
+        else:
+            cv.circle(panorama, (x, y), size // 2, color, -1)
+    return panorama
+
+
+def synthetic_scene(
+    nr_images=4,
+    size=(1280, 960),
+    overlap=0.4,
+    fov=60,
+    exposure_jitter=0.1,
+    seed=0,
+    panorama=None,
+):
+    """nr_images views of size (width, height) with a horizontal field of view
+    of fov degrees, rotated so that neighbouring views overlap by the given
+    fraction. The views are rendered from the cylindrical panorama (generated
+    if not given) and their brightness varies by +- exposure_jitter"""
+    width, height = size
+    focal = width / 2 / math.tan(math.radians(fov) / 2)
+    step = math.radians(fov) * (1 - overlap)
+    yaws = [(idx - (nr_images - 1) / 2) * step for idx in range(nr_images)]
+
+    # the angle covered by the panorama, which wraps around if it is 360
+    span = min(abs(yaws[0]) * 2 + math.radians(fov) * 1.2, 2 * math.pi)
+    if panorama is None:
+        panorama = synthetic_panorama(int(focal * span), int(height * 1.6), seed)
+    pano_focal = panorama.shape[1] / span
+
+    rng = np.random.default_rng(seed)
+    views = []
+    for yaw in yaws:
+        map_x, map_y = view_maps(size, focal, yaw, panorama.shape, pano_focal)
+        view = cv.remap(panorama, map_x, map_y, cv.INTER_LINEAR, None, cv.BORDER_WRAP)
+        gain = 1 + rng.uniform(-exposure_jitter, exposure_jitter)
+        views.append(cv.convertScaleAbs(view, alpha=gain))
+    return views
+
+
+def view_maps(size, focal, yaw, panorama_shape, pano_focal):
+    width, height = size
+    x, y = np.meshgrid(
+        np.arange(width, dtype=np.float32) - width / 2,
+        np.arange(height, dtype=np.float32) - height / 2,
+    )
+    # rays of the view rotated about the vertical axis
+    rays_x = x * math.cos(yaw) + focal * math.sin(yaw)
+    rays_z = -x * math.sin(yaw) + focal * math.cos(yaw)
+    angle = np.arctan2(rays_x, rays_z)
+    elevation = y / np.hypot(rays_x, rays_z)
+    pano_height, pano_width = panorama_shape[:2]
+    map_x = (pano_focal * angle + pano_width / 2).astype(np.float32)
+    map_y = (pano_focal * elevation + pano_height / 2).astype(np.float32)
+    return map_x, map_y
@@ -22,23 +22,30 @@ class Blender:
 
     def prepare(self, corners, sizes):
         dst_sz = cv.detail.resultRoi(corners=corners, sizes=sizes)
+        self.blender = self.create_blender(dst_sz)
+        self.blender.prepare(dst_sz)
+
+    def create_blender(self, dst_sz):
         blend_width = np.sqrt(dst_sz[2] * dst_sz[3]) * self.blend_strength / 100
 
         if self.blender_type == "no" or blend_width < 1:
-            self.blender = cv.detail.Blender_createDefault(cv.detail.Blender_NO)
+            blender = cv.detail.Blender_createDefault(cv.detail.Blender_NO)
 
         elif self.blender_type == "multiband":
-            self.blender = cv.detail_MultiBandBlender()
-            self.blender.setNumBands(int((np.log(blend_width) / np.log(2.0) - 1.0)))
+            blender = cv.detail_MultiBandBlender()
+            blender.setNumBands(int((np.log(blend_width) / np.log(2.0) - 1.0)))
 
         elif self.blender_type == "feather":
-            self.blender = cv.detail_FeatherBlender()
-            self.blender.setSharpness(1.0 / blend_width)
+            blender = cv.detail_FeatherBlender()
+            blender.setSharpness(1.0 / blend_width)
 
-        self.blender.prepare(dst_sz)
+        return blender
 
     def feed(self, img, mask, corner):
-        self.blender.feed(cv.UMat(img.astype(np.int16)), mask, corner)
+        if not isinstance(self.blender, cv.detail_MultiBandBlender):
+            # only the multiband blender accepts 8 bit images directly
+            img = img.astype(np.int16)
+        self.blender.feed(cv.UMat(img), mask, corner)
 
     def blend(self):
         result = None
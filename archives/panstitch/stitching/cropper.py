@@ -48,7 +48,7 @@ class Cropper:
     def __init__(self, crop=DEFAULT_CROP):
         self.do_crop = crop
         self.overlapping_rectangles = []
-        self.cropping_rectangles = []
+        self.intersection_rectangles = []
 
     def prepare(self, imgs, masks, corners, sizes):
         if self.do_crop:
@@ -43,3 +43,10 @@ class ExposureErrorCompensator:
     def apply(self, *args):
         """https://docs.opencv.org/4.x/d2/d37/classcv_1_1detail_1_1ExposureCompensator.html#a473eaf1e585804c08d77c91e004f93aa"""  # noqa
         return self.compensator.apply(*args)
+
+    def get_gains(self):
+        return list(self.compensator.getMatGains())
+
+    def set_gains(self, gains):
+        if gains:
+            self.compensator.setMatGains(list(gains))
@@ -0,0 +1,172 @@
+import hashlib
+import os
+
+import cv2 as cv
+import numpy as np
+
+from .feature_detector import FeatureDetector
+from .feature_matcher import FeatureMatcher
+
+
+class FeatureCache:
+    """Features and pairwise matches stored as one .npz per image and per pair,
+    keyed by the image content hashes and the detector/matcher settings.
+
+    A pair entry only depends on its two images, so matches cached for one
+    image set are reused for any other set containing the pair. Which pairs
+    are matched (range width, pair selection, stop when connected) is decided
+    per stitch, pairs never matched are not stored."""
+
+    DEFAULT_CACHE_DIR = None
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.cache_dir is not None
+
+    def load_features(self, hashes, settings):
+        paths = [self._features_path(h, settings) for h in hashes]
+        if not all(os.path.isfile(path) for path in paths):
+            self.misses += 1
+            return None
+        self.hits += 1
+        features = []
+        for idx, path in enumerate(paths):
+            with np.load(path) as data:
+                features.append(FeatureCache.to_features(idx, data))
+        return features
+
+    def save_features(self, hashes, settings, features):
+        for img_hash, img_features in zip(hashes, features):
+            path = self._features_path(img_hash, settings)
+            np.savez(path, **FeatureCache.from_features(img_features))
+
+    def load_matches(self, hashes, settings, pairs):
+        """the cached matches of the pairs as flat MatchesInfo list and the
+        pairs which are not cached. Only matched pairs are stored, whether a
+        pair is matched at all depends on the image set"""
+        nr_imgs = len(hashes)
+        matches = FeatureMatcher.empty_matches_infos(nr_imgs)
+        missing = []
+        for i, j in pairs:
+            i, j = int(i), int(j)
+            # entries are stored from the image with the smaller hash
+            src, dst = (i, j) if hashes[i] <= hashes[j] else (j, i)
+            path = self._matches_path(hashes[src], hashes[dst], settings)
+            if not os.path.isfile(path):
+                missing.append((i, j))
+                continue
+            with np.load(path) as data:
+                FeatureCache.fill_matches_info(
+                    matches[src * nr_imgs + dst], src, dst, data, "forward"
+                )
+                FeatureCache.fill_matches_info(
+                    matches[dst * nr_imgs + src], dst, src, data, "backward"
+                )
+        if missing:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return matches, missing
+
+    def save_matches(self, hashes, settings, matches, pairs):
+        nr_imgs = len(hashes)
+        for i, j in pairs:
+            i, j = int(i), int(j)
+            if matches[i * nr_imgs + j].src_img_idx == -1:
+                continue
+            src, dst = (i, j) if hashes[i] <= hashes[j] else (j, i)
+            path = self._matches_path(hashes[src], hashes[dst], settings)
+            forward = FeatureCache.from_matches_info(matches[src * nr_imgs + dst])
+            backward = FeatureCache.from_matches_info(matches[dst * nr_imgs + src])
+            np.savez(
+                path,
+                **{f"forward_{k}": v for k, v in forward.items()},
+                **{f"backward_{k}": v for k, v in backward.items()},
+            )
+
+    def _features_path(self, img_hash, settings):
+        key = FeatureCache.get_key(img_hash, settings)
+        return os.path.join(self.cache_dir, f"features_{key}.npz")
+
+    def _matches_path(self, img_hash1, img_hash2, settings):
+        key = FeatureCache.get_key(img_hash1, img_hash2, settings)
+        return os.path.join(self.cache_dir, f"matches_{key}.npz")
+
+    @staticmethod
+    def get_key(*parts):
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    @staticmethod
+    def from_features(features):
+        keypoints = np.array(
+            [
+                (*kp.pt, kp.size, kp.angle, kp.response, kp.octave, kp.class_id)
+                for kp in features.getKeypoints()
+            ],
+            np.float32,
+        ).reshape(-1, 7)
+        descriptors = cv.UMat.get(features.descriptors)
+        if descriptors is None:
+            descriptors = np.zeros((0, 0), np.uint8)
+        return {
+            "img_size": np.array(features.img_size),
+            "keypoints": keypoints,
+            "descriptors": descriptors,
+        }
+
+    @staticmethod
+    def to_features(img_idx, data):
+        features = FeatureDetector.empty_features()
+        features.img_idx = img_idx
+        features.img_size = tuple(int(i) for i in data["img_size"])
+        features.keypoints = [
+            cv.KeyPoint(x, y, size, angle, response, int(octave), int(class_id))
+            for x, y, size, angle, response, octave, class_id in data["keypoints"]
+        ]
+        features.descriptors = cv.UMat(data["descriptors"])
+        return features
+
+    @staticmethod
+    def from_matches_info(matches_info):
+        matches = np.array(
+            [
+                (m.queryIdx, m.trainIdx, m.imgIdx, m.distance)
+                for m in matches_info.getMatches()
+            ],
+            np.float32,
+        ).reshape(-1, 4)
+        H = matches_info.H
+        return {
+            "matched": np.array(matches_info.src_img_idx != -1),
+            "matches": matches,
+            "inliers": np.array(matches_info.getInliers(), np.uint8),
+            "num_inliers": np.array(matches_info.num_inliers),
+            "H": np.zeros((0, 0)) if H is None else H,
+            "confidence": np.array(matches_info.confidence),
+        }
+
+    @staticmethod
+    def fill_matches_info(matches_info, src_img_idx, dst_img_idx, data, direction):
+        def get(name):
+            return data[f"{direction}_{name}"]
+
+        if not get("matched"):
+            return
+        matches_info.src_img_idx = src_img_idx
+        matches_info.dst_img_idx = dst_img_idx
+        matches_info.matches = [
+            cv.DMatch(int(query), int(train), int(img), float(distance))
+            for query, train, img, distance in get("matches")
+        ]
+        matches_info.inliers_mask = get("inliers")
+        matches_info.num_inliers = int(get("num_inliers"))
+        if get("H").size:
+            matches_info.H = get("H")
+        matches_info.confidence = float(get("confidence"))
@@ -1,4 +1,7 @@
+import os
+import threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import cv2 as cv
 import numpy as np
@@ -17,18 +20,39 @@ class FeatureDetector:
     DETECTOR_CHOICES["akaze"] = cv.AKAZE_create
 
     DEFAULT_DETECTOR = list(DETECTOR_CHOICES.keys())[0]
+    DEFAULT_WORKERS = 1
 
-    def __init__(self, detector=DEFAULT_DETECTOR, **kwargs):
-        self.detector = FeatureDetector.DETECTOR_CHOICES[detector](**kwargs)
+    def __init__(self, detector=DEFAULT_DETECTOR, workers=DEFAULT_WORKERS, **kwargs):
+        self.detector_type = detector
+        self.detector_kwargs = kwargs
+        self.workers = FeatureDetector.get_number_of_workers(workers)
+        self.detector = self.create_detector()
+        self._local = threading.local()
+        self._local.detector = self.detector
+
+    def create_detector(self):
+        return FeatureDetector.DETECTOR_CHOICES[self.detector_type](
+            **self.detector_kwargs
+        )
+
+    def get_detector(self):
+        # OpenCV releases the GIL while detecting, but a Feature2D instance
+        # is not guaranteed to be thread safe, so every worker gets its own
+        detector = getattr(self._local, "detector", None)
+        if detector is None:
+            detector = self.create_detector()
+            self._local.detector = detector
+        return detector
 
     def detect_features(self, img, *args, **kwargs):
-        return cv.detail.computeImageFeatures2(self.detector, img, *args, **kwargs)
+        return cv.detail.computeImageFeatures2(
+            self.get_detector(), img, *args, **kwargs
+        )
 
     def detect(self, imgs):
-        return [self.detect_features(img) for img in imgs]
+        return self.map(self.detect_features, imgs)
 
     def detect_with_masks(self, imgs, masks):
-        features = []
         for idx, (img, mask) in enumerate(zip(imgs, masks)):
             assert len(img.shape) == 3 and len(mask.shape) == 2
             if not len(imgs) == len(masks):
@@ -38,8 +62,28 @@ class FeatureDetector:
                     f"Resolution of mask {idx+1} {mask.shape} does not match"
                     f" the resolution of image {idx+1} {img.shape[:2]}."
                 )
-            features.append(self.detect_features(img, mask=mask))
-        return features
+        return self.map(
+            lambda img, mask: self.detect_features(img, mask=mask), imgs, masks
+        )
+
+    def map(self, func, *iterables):
+        if self.workers == 1:
+            return [func(*args) for args in zip(*iterables)]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return list(executor.map(func, *iterables))
+
+    @staticmethod
+    def get_number_of_workers(workers):
+        if workers is None or workers < 1:
+            return os.cpu_count() or 1
+        return workers
+
+    @staticmethod
+    def empty_features():
+        # cv.detail.ImageFeatures constructed from python crash opencv once
+        # the descriptors are used, so start from an empty detection result
+        blank = np.zeros((64, 64, 3), np.uint8)
+        return cv.detail.computeImageFeatures2(cv.ORB.create(), blank)
 
     @staticmethod
     def draw_keypoints(img, features, **kwargs):
@@ -1,8 +1,12 @@
 import math
+import queue
+import threading
 
 import cv2 as cv
 import numpy as np
 
+from .feature_detector import FeatureDetector
+
 
 class FeatureMatcher:
     """https://docs.opencv.org/4.x/da/d87/classcv_1_1detail_1_1FeaturesMatcher.html"""
@@ -10,9 +14,17 @@ class FeatureMatcher:
     MATCHER_CHOICES = ("homography", "affine")
     DEFAULT_MATCHER = "homography"
     DEFAULT_RANGE_WIDTH = -1
+    DEFAULT_WORKERS = 1
+    DEFAULT_STOP_WHEN_CONNECTED = False
 
     def __init__(
-        self, matcher_type=DEFAULT_MATCHER, range_width=DEFAULT_RANGE_WIDTH, **kwargs
+        self,
+        matcher_type=DEFAULT_MATCHER,
+        range_width=DEFAULT_RANGE_WIDTH,
+        workers=DEFAULT_WORKERS,
+        stop_when_connected=DEFAULT_STOP_WHEN_CONNECTED,
+        confidence_threshold=1,
+        **kwargs,
     ):
         if matcher_type == "affine":
             self.matcher = cv.detail_AffineBestOf2NearestMatcher(**kwargs)
@@ -20,12 +32,146 @@ class FeatureMatcher:
             self.matcher = cv.detail_BestOf2NearestMatcher(**kwargs)
         else:
             self.matcher = cv.detail_BestOf2NearestRangeMatcher(range_width, **kwargs)
+        self.range_width = range_width
+        self.workers = FeatureDetector.get_number_of_workers(workers)
+        self.stop_when_connected = stop_when_connected
+        self.confidence_threshold = confidence_threshold
 
     def match_features(self, features, *args, **kwargs):
-        pairwise_matches = self.matcher.apply2(features, *args, **kwargs)
+        """args are passed to apply2, e.g. a mask of the pairs to match"""
+        if self.workers == 1 or not self.matcher.isThreadSafe():
+            pairwise_matches = self.matcher.apply2(features, *args, **kwargs)
+        else:
+            pairs = self.get_pairs(features, *args, **kwargs)
+            pairwise_matches = self.match_pairs(features, pairs)
         self.matcher.collectGarbage()
         return pairwise_matches
 
+    def get_pairs(self, features, mask=None):
+        """the pairs apply2 would match, neighbouring images first"""
+        nr_imgs = len(features)
+        has_keypoints = [len(f.getKeypoints()) > 0 for f in features]
+        pairs = [
+            (i, j)
+            for i, j in FeatureMatcher.get_all_img_combinations(nr_imgs)
+            if (mask is None or mask[i, j])
+            and (self.range_width == -1 or j - i <= self.range_width)  # noqa: W503
+            and has_keypoints[i]  # noqa: W503
+            and has_keypoints[j]  # noqa: W503
+        ]
+        return sorted(pairs, key=lambda pair: (pair[1] - pair[0], pair[0]))
+
+    def match_pairs(self, features, pairs):
+        nr_imgs = len(features)
+        pairwise_matches = FeatureMatcher.empty_matches_infos(nr_imgs)
+        components = list(range(nr_imgs))
+        nr_components = nr_imgs
+        for i, j, matches_info in self.stream_matches(features, pairs):
+            FeatureMatcher.set_pair_matches(pairwise_matches, i, j, matches_info)
+            if matches_info.confidence < self.confidence_threshold:
+                continue
+            root_i = FeatureMatcher.find_root(components, i)
+            root_j = FeatureMatcher.find_root(components, j)
+            if root_i != root_j:
+                components[root_j] = root_i
+                nr_components -= 1
+            if self.stop_when_connected and nr_components == 1:
+                break
+        return pairwise_matches
+
+    def stream_matches(self, features, pairs):
+        """yield (i, j, MatchesInfo) as soon as a pair has been matched.
+
+        Worker threads pull the next pair from a shared queue (OpenCV releases
+        the GIL while matching), so slow pairs don't block the other workers.
+        Closing the generator stops the workers after their current pair.
+        """
+        pair_queue = queue.SimpleQueue()
+        for pair in pairs:
+            pair_queue.put(pair)
+        results = queue.SimpleQueue()
+        stop = threading.Event()
+
+        def work():
+            while not stop.is_set():
+                try:
+                    i, j = pair_queue.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results.put((i, j, self.matcher.apply(features[i], features[j])))
+                except Exception as e:
+                    results.put((i, j, e))
+
+        threads = [
+            threading.Thread(target=work, daemon=True)
+            for _ in range(min(self.workers, len(pairs)))
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(len(pairs)):
+                i, j, result = results.get()
+                if isinstance(result, Exception):
+                    raise result
+                yield i, j, result
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def set_pair_matches(pairwise_matches, i, j, matches_info):
+        # same as the dual pair handling of cv::detail::FeaturesMatcher
+        nr_imgs = int(math.sqrt(len(pairwise_matches)))
+        matches_info.src_img_idx = i
+        matches_info.dst_img_idx = j
+        pairwise_matches[i * nr_imgs + j] = matches_info
+
+        dual = pairwise_matches[j * nr_imgs + i]
+        dual.src_img_idx = j
+        dual.dst_img_idx = i
+        dual.matches = [
+            cv.DMatch(m.trainIdx, m.queryIdx, m.imgIdx, m.distance)
+            for m in matches_info.getMatches()
+        ]
+        dual.inliers_mask = np.array(matches_info.getInliers(), np.uint8)
+        dual.num_inliers = matches_info.num_inliers
+        if matches_info.H is not None:
+            dual.H = np.linalg.inv(matches_info.H)
+        dual.confidence = matches_info.confidence
+
+    def is_connected(self, pairwise_matches):
+        """whether the pairs above the confidence threshold connect all images"""
+        nr_imgs = int(math.sqrt(len(pairwise_matches)))
+        components = list(range(nr_imgs))
+        nr_components = nr_imgs
+        for i, j in FeatureMatcher.get_all_img_combinations(nr_imgs):
+            if pairwise_matches[i * nr_imgs + j].confidence < self.confidence_threshold:
+                continue
+            root_i = FeatureMatcher.find_root(components, i)
+            root_j = FeatureMatcher.find_root(components, j)
+            if root_i != root_j:
+                components[root_j] = root_i
+                nr_components -= 1
+        return nr_components <= 1
+
+    @staticmethod
+    def find_root(components, idx):
+        while components[idx] != idx:
+            components[idx] = components[components[idx]]
+            idx = components[idx]
+        return idx
+
+    @staticmethod
+    def empty_matches_infos(nr_imgs):
+        # cv.detail structs constructed from python crash opencv once their
+        # Mat members are used, so let the matcher create the unmatched infos
+        blank = FeatureDetector.empty_features()
+        mask = np.zeros((nr_imgs, nr_imgs), np.uint8)
+        matcher = cv.detail_BestOf2NearestMatcher()
+        return list(matcher.apply2([blank] * nr_imgs, mask))
+
     @staticmethod
     def draw_matches_matrix(
         imgs, features, matches, conf_thresh=1, inliers=False, **kwargs
@@ -0,0 +1,120 @@
+import struct
+
+JPEG_SOF_MARKERS = {
+    0xC0,
+    0xC1,
+    0xC2,
+    0xC3,
+    0xC5,
+    0xC6,
+    0xC7,
+    0xC9,
+    0xCA,
+    0xCB,
+    0xCD,
+    0xCE,
+    0xCF,
+}
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+EXIF_ORIENTATION_TAG = 0x0112
+TRANSPOSING_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def probe_size(filename):
+    """(width, height) as cv.imread would return it, None if not probeable"""
+    try:
+        with open(filename, "rb") as file:
+            signature = file.read(8)
+            file.seek(0)
+            if signature[:2] == b"\xff\xd8":
+                return probe_jpeg_size(file)
+            if signature == PNG_SIGNATURE:
+                return probe_png_size(file)
+    except (OSError, struct.error):
+        pass
+    return None
+
+
+def probe_jpeg_size(file):
+    file.read(2)
+    orientation = 1
+    while True:
+        byte = file.read(1)
+        if not byte:
+            return None
+        if byte != b"\xff":
+            continue
+        marker = file.read(1)
+        while marker == b"\xff":
+            marker = file.read(1)
+        if not marker:
+            return None
+        marker = ord(marker)
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        (length,) = struct.unpack(">H", file.read(2))
+        if length < 2:
+            # corrupt, the length includes its own two bytes
+            return None
+        if marker == 0xE1:
+            segment = file.read(length - 2)
+            orientation = get_exif_orientation(segment) or orientation
+        elif marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack(">BHH", file.read(5))
+            return oriented_size((width, height), orientation)
+        elif marker == 0xDA:
+            return None
+        else:
+            file.seek(length - 2, 1)
+
+
+def probe_png_size(file):
+    file.read(8)
+    size = None
+    orientation = 1
+    while True:
+        header = file.read(8)
+        if len(header) < 8:
+            break
+        length, chunk_type = struct.unpack(">I4s", header)
+        if chunk_type == b"IHDR":
+            size = struct.unpack(">II", file.read(8))
+            file.seek(length - 8 + 4, 1)
+        elif chunk_type == b"eXIf":
+            orientation = get_exif_orientation(b"Exif\0\0" + file.read(length))
+            orientation = orientation or 1
+            file.seek(4, 1)
+        elif chunk_type in (b"IDAT", b"IEND"):
+            break
+        else:
+            file.seek(length + 4, 1)
+    if size is None:
+        return None
+    return oriented_size(size, orientation)
+
+
+def get_exif_orientation(segment):
+    if not segment.startswith(b"Exif\0\0"):
+        return None
+    tiff = segment[6:]
+    if tiff[:2] == b"II":
+        endian = "<"
+    elif tiff[:2] == b"MM":
+        endian = ">"
+    else:
+        return None
+    (ifd_offset,) = struct.unpack(endian + "I", tiff[4:8])
+    (nr_entries,) = struct.unpack(endian + "H", tiff[ifd_offset : ifd_offset + 2])
+    for idx in range(nr_entries):
+        entry = ifd_offset + 2 + idx * 12
+        tag, _, _, value = struct.unpack(endian + "HHI4s", tiff[entry : entry + 12])
+        if tag == EXIF_ORIENTATION_TAG:
+            return struct.unpack(endian + "H", value[:2])[0]
+    return None
+
+
+def oriented_size(size, orientation):
+    if orientation in TRANSPOSING_ORIENTATIONS:
+        return (size[1], size[0])
+    return tuple(size)
@@ -0,0 +1,99 @@
+import cv2 as cv
+import numpy as np
+
+
+class ImageRetrieval:
+    """Bag of (binary) words over the already detected features. Every image
+    is described by a tf-idf weighted word histogram so that only the most
+    similar images need to be matched"""
+
+    DEFAULT_VOCABULARY_SIZE = 64
+    DEFAULT_MAX_SAMPLES = 20000
+    KMEANS_CRITERIA = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+
+    def __init__(
+        self,
+        vocabulary_size=DEFAULT_VOCABULARY_SIZE,
+        max_samples=DEFAULT_MAX_SAMPLES,
+    ):
+        self.vocabulary_size = vocabulary_size
+        self.max_samples = max_samples
+
+    def top_k_pairs(self, features, k):
+        descriptors = self.global_descriptors(features)
+        if descriptors.shape[1] == 0:
+            # no image has descriptors (e.g. blank frames), nothing to rank by
+            ii, jj = np.triu_indices(len(features), k=1)
+            return [(int(i), int(j)) for i, j in zip(ii, jj)]
+        similarities = descriptors @ descriptors.T
+        np.fill_diagonal(similarities, -np.inf)
+        k = min(k, len(features) - 1)
+        most_similar = np.argsort(-similarities, axis=1)[:, :k]
+        return sorted(
+            {
+                (min(i, int(j)), max(i, int(j)))
+                for i, row in enumerate(most_similar)
+                for j in row
+            }
+        )
+
+    def similarity_matrix(self, features):
+        descriptors = self.global_descriptors(features)
+        return descriptors @ descriptors.T
+
+    def global_descriptors(self, features):
+        descriptors = [ImageRetrieval.to_float(f.descriptors) for f in features]
+        vocabulary = self.build_vocabulary(descriptors)
+        histograms = np.zeros((len(descriptors), len(vocabulary)), np.float32)
+        for idx, img_descriptors in enumerate(descriptors):
+            if len(img_descriptors) == 0:
+                continue
+            words = ImageRetrieval.assign_words(img_descriptors, vocabulary)
+            histograms[idx] = np.bincount(words, minlength=len(vocabulary))
+
+        term_frequency = histograms / np.maximum(histograms.sum(1, keepdims=True), 1)
+        document_frequency = np.count_nonzero(histograms, axis=0)
+        idf = np.log((1 + len(descriptors)) / (1 + document_frequency)) + 1
+        weighted = term_frequency * idf
+        norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+        return weighted / np.maximum(norms, np.finfo(np.float32).eps)
+
+    def build_vocabulary(self, descriptors):
+        descriptors = [d for d in descriptors if len(d) > 0]
+        if not descriptors:
+            return np.zeros((0, 0), np.float32)
+        samples = np.concatenate(descriptors)
+        if len(samples) > self.max_samples:
+            rng = np.random.default_rng(0)
+            samples = samples[rng.choice(len(samples), self.max_samples, False)]
+        vocabulary_size = min(self.vocabulary_size, len(samples))
+        cv.setRNGSeed(0)
+        _, _, vocabulary = cv.kmeans(
+            samples,
+            vocabulary_size,
+            None,
+            ImageRetrieval.KMEANS_CRITERIA,
+            1,
+            cv.KMEANS_PP_CENTERS,
+        )
+        return vocabulary
+
+    @staticmethod
+    def assign_words(descriptors, vocabulary):
+        # squared euclidean distance, equal to the hamming distance for bits
+        distances = (
+            np.sum(descriptors**2, axis=1, keepdims=True)
+            - 2 * descriptors @ vocabulary.T  # noqa: W503
+            + np.sum(vocabulary**2, axis=1)  # noqa: W503
+        )
+        return np.argmin(distances, axis=1)
+
+    @staticmethod
+    def to_float(descriptors):
+        descriptors = cv.UMat.get(descriptors)
+        if descriptors is None:
+            return np.zeros((0, 0), np.float32)
+        if descriptors.dtype == np.uint8:
+            # binary descriptors (orb, brisk, akaze) are clustered bitwise
+            descriptors = np.unpackbits(descriptors, axis=1)
+        return descriptors.astype(np.float32)
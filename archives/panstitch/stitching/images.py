@@ -1,11 +1,19 @@
+import hashlib
+import math
 import os
+import shutil
+import tempfile
+import threading
+import weakref
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from enum import Enum
 from glob import glob
 
 import cv2 as cv
 import numpy as np
 
+from .image_header import probe_size
 from .megapix_scaler import MegapixDownscaler
 from .stitching_error import StitchingError
 
@@ -16,12 +24,18 @@ class Images(ABC):
         LOW = 0.1
         FINAL = -1
 
+    REDUCED_READ_FLAGS = OrderedDict()
+    REDUCED_READ_FLAGS[8] = cv.IMREAD_REDUCED_COLOR_8
+    REDUCED_READ_FLAGS[4] = cv.IMREAD_REDUCED_COLOR_4
+    REDUCED_READ_FLAGS[2] = cv.IMREAD_REDUCED_COLOR_2
+
     @staticmethod
     def of(
         images,
         medium_megapix=Resolution.MEDIUM.value,
         low_megapix=Resolution.LOW.value,
         final_megapix=Resolution.FINAL.value,
+        cache=None,
     ):
         if not isinstance(images, list):
             raise StitchingError("images must be a list of images or filenames")
@@ -31,7 +45,9 @@ class Images(ABC):
         if Images.check_list_element_types(images, np.ndarray):
             return _NumpyImages(images, medium_megapix, low_megapix, final_megapix)
         elif Images.check_list_element_types(images, str):
-            return _FilenameImages(images, medium_megapix, low_megapix, final_megapix)
+            return _FilenameImages(
+                images, medium_megapix, low_megapix, final_megapix, cache
+            )
         else:
             raise StitchingError(
                 """invalid images list:
@@ -61,6 +77,12 @@ class Images(ABC):
         assert self._sizes_set
         return self._sizes
 
+    @property
+    def sizes_known(self):
+        """False for image files which could not be probed until the first
+        pass over them"""
+        return self._sizes_set
+
     @property
     def names(self):
         assert self._names_set
@@ -78,6 +100,16 @@ class Images(ABC):
                 self._get_scaler(resolution), self._sizes[idx], img
             )
 
+    def decode(self, resolution):
+        """the images decoded for a resolution but not yet resized, see
+        resize_img"""
+        return self.__iter__()
+
+    def resize_img(self, resolution, idx, img):
+        return Images.resize_img_by_scaler(
+            self._get_scaler(resolution), self._sizes[idx], img
+        )
+
     @abstractmethod
     def __iter__(self):
         pass
@@ -101,6 +133,10 @@ class Images(ABC):
             / self._get_scaler(from_resolution).scale  # noqa: W503
         )
 
+    @abstractmethod
+    def get_hashes(self):
+        pass
+
     def get_scaled_img_sizes(self, resolution):
         assert self._scales_set and self._sizes_set
         Images.check_resolution(resolution)
@@ -109,12 +145,26 @@ class Images(ABC):
         ]
 
     @staticmethod
-    def read_image(img_name):
-        img = cv.imread(img_name)
+    def read_image(img_name, flag=cv.IMREAD_COLOR):
+        img = cv.imread(img_name, flag)
         if img is None:
             raise StitchingError("Cannot read image " + img_name)
         return img
 
+    @staticmethod
+    def hash_file(img_name):
+        sha1 = hashlib.sha1()
+        with open(img_name, "rb") as file:
+            for chunk in iter(lambda: file.read(1 << 20), b""):
+                sha1.update(chunk)
+        return sha1.hexdigest()
+
+    @staticmethod
+    def hash_image(img):
+        sha1 = hashlib.sha1(repr((img.shape, img.dtype.str)).encode())
+        sha1.update(np.ascontiguousarray(img).data)
+        return sha1.hexdigest()
+
     @staticmethod
     def get_image_size(img):
         """(width, height)"""
@@ -125,6 +175,30 @@ class Images(ABC):
         desired_size = scaler.get_scaled_img_size(size)
         return cv.resize(img, desired_size, interpolation=cv.INTER_LINEAR_EXACT)
 
+    @staticmethod
+    def get_read_flag(scaler, size):
+        """largest decoder reduction that still covers the scaled image size"""
+        desired_width, desired_height = scaler.get_scaled_img_size(size)
+        for factor, flag in Images.REDUCED_READ_FLAGS.items():
+            if (
+                math.ceil(size[0] / factor) >= desired_width
+                and math.ceil(size[1] / factor) >= desired_height  # noqa: W503
+            ):
+                return flag
+        return cv.IMREAD_COLOR
+
+    @staticmethod
+    def get_read_factor(flag):
+        for factor, reduced_flag in Images.REDUCED_READ_FLAGS.items():
+            if flag == reduced_flag:
+                return factor
+        return 1
+
+    @staticmethod
+    def get_decoded_nbytes(size, flag):
+        factor = Images.get_read_factor(flag)
+        return math.ceil(size[0] / factor) * math.ceil(size[1] / factor) * 3
+
     @staticmethod
     def check_resolution(resolution):
         assert isinstance(resolution, Enum) and resolution in Images.Resolution
@@ -163,26 +237,87 @@ class _NumpyImages(Images):
         super().subset(indices)
         self._images = [self._images[i] for i in indices]
 
+    def get_hashes(self):
+        return [Images.hash_image(img) for img in self._images]
+
     def __iter__(self):
         for img in self._images:
             yield img
 
 
 class _FilenameImages(Images):
-    def __init__(self, images, medium_megapix, low_megapix, final_megapix):
+    def __init__(self, images, medium_megapix, low_megapix, final_megapix, cache=None):
         super().__init__(images, medium_megapix, low_megapix, final_megapix)
         self._names = Images.resolve_wildcards(images)
         self._names_set = True
         if len(self.names) < 2:
             raise StitchingError("2 or more Images needed")
         self._sizes = []
+        self._cache = cache
+        self.probe_sizes()
 
     def subset(self, indices):
         super().subset(indices)
 
+    def get_hashes(self):
+        return [Images.hash_file(name) for name in self.names]
+
+    def probe_sizes(self):
+        # reads only the JPEG/PNG headers (incl. EXIF orientation) so that sizes
+        # and scales are known before any pixel is decoded. If any image cannot
+        # be probed, they are set as a side effect of the first full pass
+        sizes = [probe_size(name) for name in self.names]
+        if None in sizes:
+            return False
+        self._sizes = sizes
+        self._sizes_set = True
+        self._set_scales(sizes[0])
+        return True
+
+    def resize(self, resolution, imgs=None):
+        # once the original sizes are known, JPEGs can be decoded directly at
+        # 1/2, 1/4 or 1/8 scale and only need a small fix-up resize
+        if imgs is not None or not self._sizes_set:
+            yield from super().resize(resolution, imgs)
+            return
+        scaler = self._get_scaler(resolution)
+        for name, size in zip(self.names, self._sizes):
+            # no reference to the decoded image is kept while suspended
+            yield Images.resize_img_by_scaler(
+                scaler, size, self._read_scaled_image(name, resolution, size)
+            )
+
+    def decode(self, resolution):
+        if not self._sizes_set:
+            yield from self.__iter__()
+            return
+        for name, size in zip(self.names, self._sizes):
+            yield self._read_scaled_image(name, resolution, size)
+
+    def _read_scaled_image(self, name, resolution, size):
+        # with a cache, all passes decode at the largest resolution any of them
+        # needs, so that the image is decoded once and the other passes reuse
+        # (and downscale) the cached one. Reads with another flag would never
+        # be reused, so they bypass the cache
+        flag = Images.get_read_flag(self._get_scaler(resolution), size)
+        if self._cache is None or not self._cache.enabled:
+            return Images.read_image(name, flag)
+        cached_flag = self._get_cached_read_flag(size)
+        nbytes = sum(Images.get_decoded_nbytes(s, cached_flag) for s in self._sizes)
+        if not self._cache.can_hold(nbytes):
+            return Images.read_image(name, flag)
+        return self._read_image(name, cached_flag)
+
+    def _get_cached_read_flag(self, size):
+        flags = [
+            Images.get_read_flag(self._get_scaler(resolution), size)
+            for resolution in (Images.Resolution.MEDIUM, Images.Resolution.FINAL)
+        ]
+        return min(flags, key=Images.get_read_factor)
+
     def __iter__(self):
         for idx, name in enumerate(self.names):
-            img = Images.read_image(name)
+            img = self._read_image(name)
             size = Images.get_image_size(img)
 
             # ------
@@ -195,6 +330,133 @@ class _FilenameImages(Images):
                 self._sizes.append(size)
                 if idx + 1 == len(self.names):
                     self._sizes_set = True
+            elif size != self._sizes[idx]:
+                raise StitchingError(
+                    f"Size of image {name} {size} does not match"
+                    f" its probed size {self._sizes[idx]}."
+                )
             # ------
 
             yield img
+
+    def _read_image(self, name, flag=cv.IMREAD_COLOR):
+        if self._cache is None or not self._cache.enabled:
+            return Images.read_image(name, flag)
+        return self._cache.get_or_read(name, Images.read_image, flag)
+
+
+class ImageCache:
+    """Decoded images, LRU evicted to .npy files in cache_dir (if given).
+
+    The evicted images are spilled into a directory of their own in cache_dir,
+    which is removed by clear_spilled (at the end of each stitch) or with the
+    cache at the latest.
+    """
+
+    DEFAULT_MAX_MEGABYTES = 0
+    DEFAULT_CACHE_DIR = None
+
+    def __init__(
+        self, max_megabytes=DEFAULT_MAX_MEGABYTES, cache_dir=DEFAULT_CACHE_DIR
+    ):
+        self.max_bytes = int(max_megabytes * 1e6)
+        self.cache_dir = cache_dir
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._spilled = {}
+        self._spill_dir = None
+        self._finalizer = None
+        self._lock = threading.Lock()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 or self.cache_dir is not None
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_bytes": self.memory_bytes,
+            "memory_entries": len(self._entries),
+            "spilled_entries": len(self._spilled),
+        }
+
+    def can_hold(self, nbytes):
+        """whether images of nbytes in total are kept until they are reused"""
+        return nbytes <= self.max_bytes or self.cache_dir is not None
+
+    def get_or_read(self, name, read, *args):
+        if not os.path.isfile(name):
+            return read(name, *args)
+        key = ImageCache.get_key(name) + args
+        img = self.get(key)
+        if img is None:
+            img = read(name, *args)
+            self.put(key, img)
+            img = img.copy()
+        return img
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key].copy()
+            if key in self._spilled:
+                self.disk_hits += 1
+                return np.array(np.load(self._spilled[key], mmap_mode="r"))
+            self.misses += 1
+            return None
+
+    def put(self, key, img):
+        with self._lock:
+            if key in self._entries:
+                return
+            if img.nbytes > self.max_bytes:
+                self._spill(key, img)
+                return
+            self._entries[key] = img
+            self.memory_bytes += img.nbytes
+            while self.memory_bytes > self.max_bytes:
+                evicted_key, evicted_img = self._entries.popitem(last=False)
+                self.memory_bytes -= evicted_img.nbytes
+                self._spill(evicted_key, evicted_img)
+
+    def clear(self):
+        self.clear_spilled()
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+
+    def clear_spilled(self):
+        with self._lock:
+            self._spilled.clear()
+            if self._finalizer is not None:
+                self._finalizer()
+            self._spill_dir = None
+            self._finalizer = None
+
+    def _spill(self, key, img):
+        if self.cache_dir is None or key in self._spilled:
+            return
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="images_", dir=self.cache_dir)
+            self._finalizer = weakref.finalize(
+                self, shutil.rmtree, self._spill_dir, True
+            )
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        path = os.path.join(self._spill_dir, digest + ".npy")
+        np.save(path, img)
+        self._spilled[key] = path
+
+    @staticmethod
+    def get_key(name):
+        stat = os.stat(name)
+        return (os.path.abspath(name), stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,147 @@
+import os
+
+import numpy as np
+
+from .image_retrieval import ImageRetrieval
+from .stitching_error import StitchingError
+
+EARTH_RADIUS = 6_371_000  # metres
+
+
+class PairSelector:
+    """Candidate image pairs, passed as mask to the FeatureMatcher so that only
+    the selected pairs are matched.
+
+    This bounds the matching time, not the memory: the camera estimation of
+    OpenCV needs the pairwise matches as flat list of N * N MatchesInfo, so
+    an (empty) entry is still kept for every unselected pair."""
+
+    PAIR_SELECTION_CHOICES = ("all", "sequential", "gps", "list", "retrieval")
+    DEFAULT_PAIR_SELECTION = "all"
+    DEFAULT_WINDOW = 2
+    DEFAULT_NEIGHBORS = 4
+    DEFAULT_PAIRS = None
+
+    def __init__(
+        self,
+        pair_selection=DEFAULT_PAIR_SELECTION,
+        window=DEFAULT_WINDOW,
+        neighbors=DEFAULT_NEIGHBORS,
+        pairs=DEFAULT_PAIRS,
+    ):
+        if pair_selection not in PairSelector.PAIR_SELECTION_CHOICES:
+            raise StitchingError("Invalid pair selection: " + str(pair_selection))
+        if pair_selection == "list" and pairs is None:
+            raise StitchingError("pair selection 'list' needs explicit 'pairs'")
+        self.pair_selection = pair_selection
+        self.window = window
+        self.neighbors = neighbors
+        self.pairs = pairs
+        self.retrieval = ImageRetrieval()
+
+    def select(self, images, features=None):
+        """sorted list of (i, j) index pairs with i < j, None for all pairs"""
+        nr_imgs = len(images.names)
+        if self.pair_selection == "sequential":
+            return PairSelector.sequential_pairs(nr_imgs, self.window)
+        elif self.pair_selection == "gps":
+            coordinates = PairSelector.read_gps_coordinates(images.names)
+            return PairSelector.nearest_neighbor_pairs(coordinates, self.neighbors)
+        elif self.pair_selection == "list":
+            return PairSelector.explicit_pairs(images.names, self.pairs)
+        elif self.pair_selection == "retrieval":
+            if features is None:
+                raise StitchingError("pair selection 'retrieval' needs features")
+            return self.retrieval.top_k_pairs(features, self.neighbors)
+        return None
+
+    def get_mask(self, images, features=None):
+        pairs = self.select(images, features)
+        if pairs is None:
+            return None
+        return PairSelector.pairs_to_mask(len(images.names), pairs)
+
+    @staticmethod
+    def pairs_to_mask(nr_imgs, pairs):
+        mask = np.zeros((nr_imgs, nr_imgs), np.uint8)
+        for i, j in pairs:
+            mask[i, j] = mask[j, i] = 1
+        return mask
+
+    @staticmethod
+    def normalize_pairs(pairs):
+        return sorted({(min(i, j), max(i, j)) for i, j in pairs if i != j})
+
+    @staticmethod
+    def sequential_pairs(nr_imgs, window):
+        return PairSelector.normalize_pairs(
+            (i, j)
+            for i in range(nr_imgs)
+            for j in range(i + 1, min(i + window + 1, nr_imgs))
+        )
+
+    @staticmethod
+    def explicit_pairs(names, pairs):
+        indices = {name: idx for idx, name in enumerate(names)}
+        try:
+            pairs = [
+                tuple(indices[p] if isinstance(p, str) else int(p) for p in pair)
+                for pair in pairs
+            ]
+        except KeyError as e:
+            raise StitchingError(f"Image {e} of the pair list is not stitched")
+        if any(not 0 <= idx < len(names) for pair in pairs for idx in pair):
+            raise StitchingError("Image index of the pair list out of range")
+        return PairSelector.normalize_pairs(pairs)
+
+    @staticmethod
+    def nearest_neighbor_pairs(coordinates, neighbors):
+        """coordinates as (lat, lng, alt) rows in decimal degrees and metres"""
+        points = PairSelector.to_local_metres(coordinates)
+        distances = np.linalg.norm(points[:, None, :] - points[None, :, :], axis=-1)
+        np.fill_diagonal(distances, np.inf)
+        k = min(neighbors, len(points) - 1)
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        return PairSelector.normalize_pairs(
+            (i, int(j)) for i, row in enumerate(nearest) for j in row
+        )
+
+    @staticmethod
+    def to_local_metres(coordinates):
+        coordinates = np.asarray(coordinates, np.float64)
+        lat, lng = np.radians(coordinates[:, 0]), np.radians(coordinates[:, 1])
+        x = EARTH_RADIUS * (lng - lng[0]) * np.cos(lat.mean())
+        y = EARTH_RADIUS * (lat - lat[0])
+        z = coordinates[:, 2] - coordinates[0, 2]
+        return np.stack([x, y, z], axis=1)
+
+    @staticmethod
+    def read_gps_coordinates(names):
+        # piexif is only imported if gps pair selection is explicitly desired
+        import piexif
+
+        coordinates = []
+        for name in names:
+            if not os.path.isfile(name):
+                raise StitchingError("GPS pair selection needs image files")
+            gps = piexif.load(name).get("GPS", {})
+            try:
+                lat = PairSelector.dms_to_decimal(
+                    gps[piexif.GPSIFD.GPSLatitude], gps[piexif.GPSIFD.GPSLatitudeRef]
+                )
+                lng = PairSelector.dms_to_decimal(
+                    gps[piexif.GPSIFD.GPSLongitude], gps[piexif.GPSIFD.GPSLongitudeRef]
+                )
+            except KeyError:
+                raise StitchingError("No GPS coordinates in image " + name)
+            altitude = gps.get(piexif.GPSIFD.GPSAltitude, (0, 1))
+            coordinates.append((lat, lng, altitude[0] / altitude[1]))
+        return np.array(coordinates)
+
+    @staticmethod
+    def dms_to_decimal(dms, ref):
+        degrees, minutes, seconds = (n / d for n, d in dms)
+        decimal = degrees + minutes / 60 + seconds / 3600
+        if ref in (b"S", b"W", "S", "W"):
+            return -decimal
+        return decimal
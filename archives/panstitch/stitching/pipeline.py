@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class LatencyStats:
+    """durations (in s) of the last items passing a pipeline stage"""
+
+    DEFAULT_WINDOW = 1000
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.durations = deque(maxlen=window)
+        self.count = 0
+        self.dropped = 0
+        self.waited = 0.0
+
+    def add(self, duration):
+        self.durations.append(duration)
+        self.count += 1
+
+    @property
+    def summary(self):
+        durations = np.array(self.durations) * 1000
+        if len(durations) == 0:
+            durations = np.zeros(1)
+        return {
+            "count": self.count,
+            "dropped": self.dropped,
+            "mean_ms": float(durations.mean()),
+            "p95_ms": float(np.percentile(durations, 95)),
+            "max_ms": float(durations.max()),
+            "waited_s": self.waited,
+        }
+
+
+class Pipeline:
+    """Items flow through a chain of stages, each stage a function running in
+    its own thread. The stages are connected by bounded queues: a stage which
+    is ahead blocks until the next one takes its output (backpressure), so at
+    most about (queue_size + 1) items per stage are in flight. The order of
+    the items is kept.
+
+    The time each stage spends per item is recorded, as well as the time it
+    waited for a full queue (i.e. for a slower stage downstream).
+    """
+
+    DEFAULT_QUEUE_SIZE = 1
+    DEFAULT_SOURCE = "source"
+    DEFAULT_CONSUMER = "consumer"
+    POLL_INTERVAL = 0.1  # s, how often blocked stages check for a stop
+
+    def __init__(
+        self,
+        stages,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        source=DEFAULT_SOURCE,
+        consumer=DEFAULT_CONSUMER,
+    ):
+        """stages as list of (name, function) tuples, source and consumer are
+        the names under which the iteration of the items and the caller are
+        timed"""
+        self.stages = stages
+        self.queue_size = queue_size
+        self.source = source
+        self.consumer = consumer
+        self.reset_stats()
+
+    def reset_stats(self):
+        names = [self.source] + [name for name, _ in self.stages] + [self.consumer]
+        self.stats = {name: LatencyStats() for name in names}
+        self.wall_time = 0.0
+
+    def summary(self):
+        summary = {name: stats.summary for name, stats in self.stats.items()}
+        summary["wall_time_s"] = self.wall_time
+        return summary
+
+    def run(self, items):
+        """yield the items processed by all stages. The iteration of items
+        itself runs in a thread as first stage"""
+        self.reset_stats()
+        done = object()
+        stop = threading.Event()
+        queues = [queue.Queue(self.queue_size) for _ in range(len(self.stages) + 1)]
+
+        def put(q, item, stats):
+            start = time.perf_counter()
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=Pipeline.POLL_INTERVAL)
+                    break
+                except queue.Full:
+                    pass
+            stats.waited += time.perf_counter() - start
+
+        def get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=Pipeline.POLL_INTERVAL)
+                except queue.Empty:
+                    pass
+            return done
+
+        def produce(output):
+            stats = self.stats[self.source]
+            iterator = iter(items)
+            try:
+                while not stop.is_set():
+                    start = time.perf_counter()
+                    item = next(iterator, done)
+                    if item is done:
+                        break
+                    stats.add(time.perf_counter() - start)
+                    put(output, item, stats)
+                    del item
+                put(output, done, stats)
+            except Exception as e:
+                put(output, e, stats)
+
+        def process(name, function, input, output):
+            stats = self.stats[name]
+            while not stop.is_set():
+                item = get(input)
+                if item is done or isinstance(item, Exception):
+                    put(output, item, stats)
+                    return
+                try:
+                    start = time.perf_counter()
+                    result = function(item)
+                    stats.add(time.perf_counter() - start)
+                except Exception as e:
+                    put(output, e, stats)
+                    return
+                del item
+                put(output, result, stats)
+                del result
+
+        threads = [threading.Thread(target=produce, args=(queues[0],), daemon=True)]
+        for idx, (name, function) in enumerate(self.stages):
+            threads.append(
+                threading.Thread(
+                    target=process,
+                    args=(name, function, queues[idx], queues[idx + 1]),
+                    daemon=True,
+                )
+            )
+        start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            stats = self.stats[self.consumer]
+            while True:
+                item = get(queues[-1])
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                start = time.perf_counter()
+                try:
+                    yield item
+                finally:
+                    stats.add(time.perf_counter() - start)
+                del item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+            self.wall_time = time.perf_counter() - start_time
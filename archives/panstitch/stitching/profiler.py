@@ -0,0 +1,269 @@
+import functools
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+
+
+class Profiler:
+    """Wall time, cpu time, RSS peak growth, traced memory and the number of
+    images and pixels (in and out) of every profiled method call of an object.
+
+    The RSS peak is only known for the whole process (ru_maxrss), so a call
+    records how much it raised that peak (rss_peak_growth_mb), and the peak
+    of the process when it returned (process_rss_peak_mb).
+
+    Only if enabled, the methods are replaced by timed wrappers on the
+    instance, so a disabled profiler costs nothing. Generators (the lazily
+    composed final resolution frames) are timed per produced item, in the
+    thread which consumes them. The records can be saved as JSON or as
+    Chrome trace (chrome://tracing, https://ui.perfetto.dev).
+    """
+
+    DEFAULT_PROFILE = False
+    DEFAULT_PROFILE_MEMORY = False
+    SUMMED = (
+        "wall_s",
+        "cpu_s",
+        "images_in",
+        "pixels_in",
+        "images_out",
+        "pixels_out",
+        "memory_delta_mb",
+        "rss_peak_growth_mb",
+    )
+
+    def __init__(self, enabled=DEFAULT_PROFILE, trace_memory=DEFAULT_PROFILE_MEMORY):
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.records = []
+        self._local = threading.local()
+        self._started_tracing = False
+        self.origin = time.perf_counter()
+
+    def reset(self):
+        self.records = []
+
+    def instrument(self, obj, entry, names):
+        """profile the methods names of obj, each call of the entry method
+        starts a new profile"""
+        # the methods are always wrapped from the class, never twice
+        for name in (entry, *names):
+            obj.__dict__.pop(name, None)
+        if not self.enabled:
+            return
+        for name in names:
+            setattr(obj, name, self.wrap(name, getattr(obj, name)))
+        method = self.wrap(entry, getattr(obj, entry))
+
+        @functools.wraps(method)
+        def entry_wrapper(*args, **kwargs):
+            self.start()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.stop()
+
+        setattr(obj, entry, entry_wrapper)
+
+    def start(self):
+        self.reset()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def wrap(self, name, method):
+        if inspect.isgeneratorfunction(method):
+
+            @functools.wraps(method)
+            def generator_wrapper(*args, **kwargs):
+                done = object()
+                inputs = Profiler.count_images((args, kwargs))
+                iterator = method(*args, **kwargs)
+                try:
+                    while True:
+                        with self.measure(name, inputs) as record:
+                            item = next(iterator, done)
+                            if item is done:
+                                # only the produced items are recorded
+                                record["discard"] = True
+                            else:
+                                record.update(Profiler.count_images(item, "out"))
+                        if item is done:
+                            return
+                        inputs = {}
+                        yield item
+                        del item
+                finally:
+                    iterator.close()
+
+            return generator_wrapper
+
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with self.measure(name, Profiler.count_images((args, kwargs))) as record:
+                result = method(*args, **kwargs)
+                record.update(Profiler.count_images(result, "out"))
+            return result
+
+        return wrapper
+
+    def measure(self, name, inputs):
+        return _Measurement(self, name, inputs)
+
+    def summary(self):
+        """totals per profiled method, in the order of the first call"""
+        summary = OrderedDict()
+        for record in sorted(self.records, key=lambda r: r["start_s"]):
+            stage = summary.setdefault(
+                record["name"],
+                {
+                    "calls": 0,
+                    "wall_s": 0.0,
+                    "cpu_s": 0.0,
+                    "images_in": 0,
+                    "pixels_in": 0,
+                    "images_out": 0,
+                    "pixels_out": 0,
+                    "memory_delta_mb": 0.0,
+                    "memory_peak_mb": 0.0,
+                    "rss_peak_growth_mb": 0.0,
+                    "process_rss_peak_mb": 0.0,
+                },
+            )
+            stage["calls"] += 1
+            for key in Profiler.SUMMED:
+                stage[key] += record[key]
+            for key in ("memory_peak_mb", "process_rss_peak_mb"):
+                stage[key] = max(stage[key], record[key])
+        return summary
+
+    def save_json(self, path):
+        report = {"summary": self.summary(), "records": self.records}
+        with open(path, "w") as file:
+            json.dump(report, file, indent=2)
+
+    def save_chrome_trace(self, path):
+        pid = os.getpid()
+        events = [
+            {
+                "name": record["name"],
+                "cat": "stitching",
+                "ph": "X",
+                "ts": record["start_s"] * 1e6,
+                "dur": record["wall_s"] * 1e6,
+                "pid": pid,
+                "tid": record["thread"],
+                "args": {
+                    key: value
+                    for key, value in record.items()
+                    if key not in ("name", "start_s", "wall_s", "thread")
+                },
+            }
+            for record in self.records
+        ]
+        with open(path, "w") as file:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+    @staticmethod
+    def count_images(value, direction="in", depth=3):
+        """number and pixels of the images (numpy arrays with 2 or more
+        dimensions) in value and its lists, tuples and dicts"""
+        counts = {f"images_{direction}": 0, f"pixels_{direction}": 0}
+
+        def count(value, depth):
+            if isinstance(value, np.ndarray) and value.ndim >= 2:
+                counts[f"images_{direction}"] += 1
+                counts[f"pixels_{direction}"] += value.shape[0] * value.shape[1]
+            elif depth > 0 and isinstance(value, (list, tuple)):
+                for element in value:
+                    count(element, depth - 1)
+            elif depth > 0 and isinstance(value, dict):
+                for element in value.values():
+                    count(element, depth - 1)
+
+        count(value, depth)
+        return counts
+
+    @staticmethod
+    def get_peak_rss_mb():
+        # resource is only available on unix
+        try:
+            import resource
+        except ImportError:
+            return 0.0
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes on linux
+        if sys.platform == "darwin":
+            return max_rss / 1024**2
+        return max_rss / 1024
+
+
+class _Measurement:
+    def __init__(self, profiler, name, inputs):
+        self.profiler = profiler
+        self.record = {"name": name, **inputs}
+        self.memory_peak = 0
+
+    def __enter__(self):
+        local = self.profiler._local
+        if not hasattr(local, "stack"):
+            local.stack = []
+        self.stack = local.stack
+        if tracemalloc.is_tracing():
+            # the peak is reset for this call, the enclosing calls keep theirs
+            self.update_memory_peaks(self.stack)
+            tracemalloc.reset_peak()
+            self.memory_start = tracemalloc.get_traced_memory()[0]
+        self.stack.append(self)
+        self.rss_peak_start = Profiler.get_peak_rss_mb()
+        self.cpu_start = time.process_time()
+        self.start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        cpu = time.process_time() - self.cpu_start
+        self.stack.pop()
+        rss_peak = Profiler.get_peak_rss_mb()
+        record = {
+            "start_s": self.start - self.profiler.origin,
+            "wall_s": end - self.start,
+            "cpu_s": cpu,
+            "thread": threading.get_ident(),
+            "depth": len(self.stack),
+            "images_in": 0,
+            "pixels_in": 0,
+            "images_out": 0,
+            "pixels_out": 0,
+            "memory_delta_mb": 0.0,
+            "memory_peak_mb": 0.0,
+            "rss_peak_growth_mb": rss_peak - self.rss_peak_start,
+            "process_rss_peak_mb": rss_peak,
+        }
+        if tracemalloc.is_tracing() and hasattr(self, "memory_start"):
+            self.update_memory_peaks(self.stack + [self])
+            current = tracemalloc.get_traced_memory()[0]
+            record["memory_delta_mb"] = (current - self.memory_start) / 10**6
+            record["memory_peak_mb"] = (self.memory_peak - self.memory_start) / 10**6
+        record.update(self.record)
+        if not record.pop("discard", False):
+            self.profiler.records.append(record)
+        return False
+
+    @staticmethod
+    def update_memory_peaks(measurements):
+        peak = tracemalloc.get_traced_memory()[1]
+        for measurement in measurements:
+            measurement.memory_peak = max(measurement.memory_peak, peak)
@@ -0,0 +1,166 @@
+import json
+
+import cv2 as cv
+import numpy as np
+
+from .cropper import Rectangle
+from .stitching_error import StitchingError
+
+
+class RigModel:
+    """Everything estimated for a fixed camera rig (cameras, warper scale, crop
+    rectangles, seam masks and exposure gains), so that later image sets of
+    the same rig only need to be warped and blended"""
+
+    DEFAULT_RIG_MODEL = None
+    DEFAULT_DRIFT_THRESHOLD = None
+
+    # settings which must not change between calibration and reuse
+    SETTINGS = (
+        "medium_megapix",
+        "low_megapix",
+        "final_megapix",
+        "warper_type",
+        "crop",
+        "compensator",
+        "nr_feeds",
+        "block_size",
+    )
+
+    def __init__(
+        self,
+        settings,
+        nr_imgs,
+        indices,
+        img_sizes,
+        cameras,
+        scale,
+        overlapping_rectangles,
+        intersection_rectangles,
+        seam_masks,
+        gains,
+        pairs,
+    ):
+        self.settings = settings
+        self.nr_imgs = nr_imgs
+        self.indices = list(indices)
+        self.img_sizes = [tuple(size) for size in img_sizes]
+        self.cameras = cameras
+        self.scale = scale
+        self.overlapping_rectangles = overlapping_rectangles
+        self.intersection_rectangles = intersection_rectangles
+        self.seam_masks = seam_masks
+        self.gains = gains
+        self.pairs = pairs
+
+    def check(self, settings, img_sizes):
+        changed = [s for s in RigModel.SETTINGS if settings[s] != self.settings[s]]
+        if changed:
+            raise StitchingError(
+                "The rig model was created with other settings: " + ", ".join(changed)
+            )
+        if len(img_sizes) != self.nr_imgs:
+            raise StitchingError(
+                f"The rig model needs {self.nr_imgs} images, got {len(img_sizes)}"
+            )
+        if [img_sizes[i] for i in self.indices] != self.img_sizes:
+            raise StitchingError("The image sizes do not match the rig model")
+
+    def reprojection_error(self, features, matches, confidence_threshold=1):
+        """median distance (in px of the features) between the matched inlier
+        keypoints and their projection with the cameras of the model"""
+        errors = []
+        for matches_info in matches:
+            i, j = matches_info.src_img_idx, matches_info.dst_img_idx
+            if i == -1 or i > j or matches_info.confidence < confidence_threshold:
+                continue
+            H = RigModel.get_homography(self.cameras[i], self.cameras[j])
+            inliers = np.array(matches_info.getInliers(), bool)
+            dmatches = [
+                m for m, inlier in zip(matches_info.getMatches(), inliers) if inlier
+            ]
+            keypoints_i = features[i].getKeypoints()
+            keypoints_j = features[j].getKeypoints()
+            points_i = np.float32([keypoints_i[m.queryIdx].pt for m in dmatches])
+            points_j = np.float32([keypoints_j[m.trainIdx].pt for m in dmatches])
+            projected = cv.perspectiveTransform(points_i.reshape(-1, 1, 2), H)
+            errors.append(np.linalg.norm(projected[:, 0] - points_j, axis=1))
+        if not errors:
+            return np.inf
+        return float(np.median(np.concatenate(errors)))
+
+    def save(self, path):
+        data = {
+            "settings": np.array(json.dumps(self.settings)),
+            "nr_imgs": np.array(self.nr_imgs),
+            "indices": np.array(self.indices),
+            "img_sizes": np.array(self.img_sizes),
+            "scale": np.array(self.scale),
+            "overlapping_rectangles": np.array(self.overlapping_rectangles).reshape(
+                -1, 4
+            ),
+            "intersection_rectangles": np.array(self.intersection_rectangles).reshape(
+                -1, 4
+            ),
+            "pairs": np.array(self.pairs).reshape(-1, 2),
+            **RigModel.from_cameras(self.cameras),
+        }
+        for idx, seam_mask in enumerate(self.seam_masks):
+            data[f"seam_mask_{idx}"] = seam_mask
+        for idx, gains in enumerate(self.gains):
+            data[f"gains_{idx}"] = gains
+        np.savez_compressed(path, **data)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            nr_cameras = len(data["indices"])
+            nr_gains = len([name for name in data.files if name.startswith("gains_")])
+            return cls(
+                json.loads(str(data["settings"])),
+                int(data["nr_imgs"]),
+                [int(i) for i in data["indices"]],
+                [tuple(int(i) for i in size) for size in data["img_sizes"]],
+                RigModel.to_cameras(data),
+                float(data["scale"]),
+                [Rectangle(*r) for r in data["overlapping_rectangles"].tolist()],
+                [Rectangle(*r) for r in data["intersection_rectangles"].tolist()],
+                [data[f"seam_mask_{idx}"] for idx in range(nr_cameras)],
+                [data[f"gains_{idx}"] for idx in range(nr_gains)],
+                [tuple(pair) for pair in data["pairs"].tolist()],
+            )
+
+    @staticmethod
+    def get_homography(camera1, camera2):
+        """maps points of camera1 to camera2 (rotation about the same center)"""
+        return (
+            camera2.K()
+            @ np.linalg.inv(camera2.R)  # noqa: W503
+            @ camera1.R  # noqa: W503
+            @ np.linalg.inv(camera1.K())  # noqa: W503
+        )
+
+    @staticmethod
+    def from_cameras(cameras):
+        return {
+            "focal": np.array([c.focal for c in cameras]),
+            "aspect": np.array([c.aspect for c in cameras]),
+            "ppx": np.array([c.ppx for c in cameras]),
+            "ppy": np.array([c.ppy for c in cameras]),
+            "R": np.array([c.R for c in cameras], np.float32),
+            "t": np.array([c.t for c in cameras], np.float64),
+        }
+
+    @staticmethod
+    def to_cameras(data):
+        cameras = []
+        for idx in range(len(data["focal"])):
+            camera = cv.detail.CameraParams()
+            camera.focal = float(data["focal"][idx])
+            camera.aspect = float(data["aspect"][idx])
+            camera.ppx = float(data["ppx"][idx])
+            camera.ppy = float(data["ppy"][idx])
+            camera.R = data["R"][idx]
+            camera.t = data["t"][idx]
+            cameras.append(camera)
+        return cameras
@@ -1,29 +1,50 @@
+import queue
+import threading
+import warnings
 from types import SimpleNamespace
 
+import cv2 as cv
+
 from .blender import Blender
 from .camera_adjuster import CameraAdjuster
 from .camera_estimator import CameraEstimator
 from .camera_wave_corrector import WaveCorrector
 from .cropper import Cropper
 from .exposure_error_compensator import ExposureErrorCompensator
+from .feature_cache import FeatureCache
 from .feature_detector import FeatureDetector
 from .feature_matcher import FeatureMatcher
-from .images import Images
+from .images import ImageCache, Images
+from .pair_selector import PairSelector
+from .pipeline import Pipeline
+from .profiler import Profiler
+from .rig_model import RigModel
 from .seam_finder import SeamFinder
-from .stitching_error import StitchingError
+from .stitching_error import StitchingError, StitchingWarning
 from .subsetter import Subsetter
+from .tiled_blender import TiledBlender
 from .timelapser import Timelapser
 from .verbose import verbose_stitching
-from .warper import Warper
+from .warper import WarpMapCache, Warper
 
 
 class Stitcher:
     DEFAULT_SETTINGS = {
         "medium_megapix": Images.Resolution.MEDIUM.value,
+        "cache_megabytes": ImageCache.DEFAULT_MAX_MEGABYTES,
+        "cache_dir": ImageCache.DEFAULT_CACHE_DIR,
         "detector": FeatureDetector.DEFAULT_DETECTOR,
         "nfeatures": 500,
+        "detection_workers": FeatureDetector.DEFAULT_WORKERS,
+        "feature_cache_dir": FeatureCache.DEFAULT_CACHE_DIR,
         "matcher_type": FeatureMatcher.DEFAULT_MATCHER,
         "range_width": FeatureMatcher.DEFAULT_RANGE_WIDTH,
+        "matching_workers": FeatureMatcher.DEFAULT_WORKERS,
+        "stop_matching_when_connected": FeatureMatcher.DEFAULT_STOP_WHEN_CONNECTED,
+        "pair_selection": PairSelector.DEFAULT_PAIR_SELECTION,
+        "pair_window": PairSelector.DEFAULT_WINDOW,
+        "pair_neighbors": PairSelector.DEFAULT_NEIGHBORS,
+        "pairs": PairSelector.DEFAULT_PAIRS,
         "try_use_gpu": False,
         "match_conf": None,
         "confidence_threshold": Subsetter.DEFAULT_CONFIDENCE_THRESHOLD,
@@ -33,6 +54,8 @@ class Stitcher:
         "refinement_mask": CameraAdjuster.DEFAULT_REFINEMENT_MASK,
         "wave_correct_kind": WaveCorrector.DEFAULT_WAVE_CORRECTION,
         "warper_type": Warper.DEFAULT_WARP_TYPE,
+        "warp_map_cache_megabytes": WarpMapCache.DEFAULT_MAX_MEGABYTES,
+        "warp_map_cache_dir": WarpMapCache.DEFAULT_CACHE_DIR,
         "low_megapix": Images.Resolution.LOW.value,
         "crop": Cropper.DEFAULT_CROP,
         "compensator": ExposureErrorCompensator.DEFAULT_COMPENSATOR,
@@ -42,10 +65,53 @@ class Stitcher:
         "final_megapix": Images.Resolution.FINAL.value,
         "blender_type": Blender.DEFAULT_BLENDER,
         "blend_strength": Blender.DEFAULT_BLEND_STRENGTH,
+        "blend_tile_size": None,
+        "blend_output": TiledBlender.DEFAULT_OUTPUT,
+        "blend_spill_dir": TiledBlender.DEFAULT_SPILL_DIR,
+        "composition_frames": 1,
+        "pipelined_composition": False,
+        "pipeline_queue_size": Pipeline.DEFAULT_QUEUE_SIZE,
+        "rig_model": RigModel.DEFAULT_RIG_MODEL,
+        "rig_drift_threshold": RigModel.DEFAULT_DRIFT_THRESHOLD,
+        "profile": Profiler.DEFAULT_PROFILE,
+        "profile_memory": Profiler.DEFAULT_PROFILE_MEMORY,
         "timelapse": Timelapser.DEFAULT_TIMELAPSE,
         "timelapse_prefix": Timelapser.DEFAULT_TIMELAPSE_PREFIX,
     }
 
+    # the methods timed by the profiler (if enabled) within each stitch call
+    PROFILED_STAGES = (
+        "resize_medium_resolution",
+        "find_features",
+        "load_cached_features",
+        "cache_features",
+        "load_cached_matches",
+        "match_features",
+        "cache_matches",
+        "has_rig_drifted",
+        "subset",
+        "estimate_camera_parameters",
+        "refine_camera_parameters",
+        "perform_wave_correction",
+        "estimate_scale",
+        "resize_low_resolution",
+        "warp_low_resolution",
+        "prepare_cropper",
+        "crop_low_resolution",
+        "estimate_exposure_errors",
+        "find_seam_masks",
+        "create_rig_model",
+        "compose_panorama",
+        "get_final_resolution_rois",
+        "initialize_composition",
+        "compose_final_resolution",
+        "resize_final_resolution",
+        "prepare_final_resolution_frames",
+        "pipeline_final_resolution_frames",
+        "blend_images",
+        "create_final_panorama",
+    )
+
     def __init__(self, **kwargs):
         self.initialize_stitcher(**kwargs)
 
@@ -58,17 +124,31 @@ class Stitcher:
         self.medium_megapix = args.medium_megapix
         self.low_megapix = args.low_megapix
         self.final_megapix = args.final_megapix
+        self.composition_frames = args.composition_frames
+        self.pipelined_composition = args.pipelined_composition
+        self.pipeline_queue_size = args.pipeline_queue_size
+        self.composition_pipeline = None
+        self.image_cache = ImageCache(args.cache_megabytes, args.cache_dir)
         if args.detector in ("orb", "sift"):
-            self.detector = FeatureDetector(args.detector, nfeatures=args.nfeatures)
+            self.detector = FeatureDetector(
+                args.detector, args.detection_workers, nfeatures=args.nfeatures
+            )
         else:
-            self.detector = FeatureDetector(args.detector)
+            self.detector = FeatureDetector(args.detector, args.detection_workers)
         match_conf = FeatureMatcher.get_match_conf(args.match_conf, args.detector)
+        self.feature_cache = FeatureCache(args.feature_cache_dir)
         self.matcher = FeatureMatcher(
             args.matcher_type,
             args.range_width,
+            args.matching_workers,
+            args.stop_matching_when_connected,
+            args.confidence_threshold,
             try_use_gpu=args.try_use_gpu,
             match_conf=match_conf,
         )
+        self.pair_selector = PairSelector(
+            args.pair_selection, args.pair_window, args.pair_neighbors, args.pairs
+        )
         self.subsetter = Subsetter(
             args.confidence_threshold, args.matches_graph_dot_file
         )
@@ -77,25 +157,65 @@ class Stitcher:
             args.adjuster, args.refinement_mask, args.confidence_threshold
         )
         self.wave_corrector = WaveCorrector(args.wave_correct_kind)
-        self.warper = Warper(args.warper_type)
+        self.warper = Warper(
+            args.warper_type, args.warp_map_cache_megabytes, args.warp_map_cache_dir
+        )
         self.cropper = Cropper(args.crop)
         self.compensator = ExposureErrorCompensator(
             args.compensator, args.nr_feeds, args.block_size
         )
         self.seam_finder = SeamFinder(args.finder)
-        self.blender = Blender(args.blender_type, args.blend_strength)
+        if args.blend_tile_size is None:
+            self.blender = Blender(args.blender_type, args.blend_strength)
+        else:
+            self.blender = TiledBlender(
+                args.blender_type,
+                args.blend_strength,
+                args.blend_tile_size,
+                args.blend_output,
+                args.blend_spill_dir,
+            )
         self.timelapser = Timelapser(args.timelapse, args.timelapse_prefix)
+        if isinstance(args.rig_model, str):
+            self.rig_model = RigModel.load(args.rig_model)
+        else:
+            self.rig_model = args.rig_model
+        self.rig_drift_threshold = args.rig_drift_threshold
+        self.profiler = Profiler(args.profile, args.profile_memory)
+        self.profiler.instrument(self, "stitch", self.PROFILED_STAGES)
 
     def stitch_verbose(self, images, feature_masks=[], verbose_dir=None):
         return verbose_stitching(self, images, feature_masks, verbose_dir)
 
     def stitch(self, images, feature_masks=[]):
         self.images = Images.of(
-            images, self.medium_megapix, self.low_megapix, self.final_megapix
+            images,
+            self.medium_megapix,
+            self.low_megapix,
+            self.final_megapix,
+            self.image_cache,
         )
 
-        imgs = self.resize_medium_resolution()
-        features = self.find_features(imgs, feature_masks)
+        imgs = None
+        if self.rig_model is not None:
+            if not self.images.sizes_known or self.rig_drift_threshold is not None:
+                # the first pass sets the sizes of images which can't be probed
+                imgs = self.resize_medium_resolution()
+            self.rig_model.check(self.settings, self.images.sizes)
+            if not self.has_rig_drifted(imgs, feature_masks):
+                return self.stitch_with_rig_model()
+            warnings.warn(
+                "The rig has drifted, the cameras are estimated again.",
+                StitchingWarning,
+            )
+
+        self.set_cache_keys(feature_masks)
+        features = self.load_cached_features()
+        if features is None:
+            if imgs is None:
+                imgs = self.resize_medium_resolution()
+            features = self.find_features(imgs, feature_masks)
+            self.cache_features(features)
         matches = self.match_features(features)
         imgs, features, matches = self.subset(imgs, features, matches)
         cameras = self.estimate_camera_parameters(features, matches)
@@ -111,18 +231,65 @@ class Stitcher:
         )
         self.estimate_exposure_errors(corners, imgs, masks)
         seam_masks = self.find_seam_masks(imgs, corners, masks)
-
-        imgs = self.resize_final_resolution()
-        imgs, masks, corners, sizes = self.warp_final_resolution(imgs, cameras)
-        imgs, masks, corners, sizes = self.crop_final_resolution(
-            imgs, masks, corners, sizes
+        self.calibration = self.create_rig_model(cameras, seam_masks, matches)
+        if self.rig_model is not None:
+            self.rig_model = self.calibration
+
+        return self.compose_panorama(cameras, seam_masks)
+
+    def stitch_with_rig_model(self):
+        self.images.subset(self.rig_model.indices)
+        self.apply_rig_model(self.rig_model)
+        return self.compose_panorama(self.rig_model.cameras, self.rig_model.seam_masks)
+
+    def apply_rig_model(self, model):
+        self.warper.scale = model.scale
+        self.cropper.overlapping_rectangles = model.overlapping_rectangles
+        self.cropper.intersection_rectangles = model.intersection_rectangles
+        self.compensator.set_gains(model.gains)
+
+    def has_rig_drifted(self, imgs, feature_masks=[]):
+        if self.rig_drift_threshold is None:
+            return False
+        model = self.rig_model
+        features = self.find_features(imgs, feature_masks)
+        features = Subsetter.subset_list(features, model.indices)
+        mask = PairSelector.pairs_to_mask(len(features), model.pairs)
+        matches = self.matcher.match_features(features, mask)
+        error = model.reprojection_error(
+            features, matches, self.subsetter.confidence_threshold
+        )
+        return error > self.rig_drift_threshold
+
+    def create_rig_model(self, cameras, seam_masks, matches):
+        pairs = [
+            (m.src_img_idx, m.dst_img_idx)
+            for m in matches
+            if -1 < m.src_img_idx < m.dst_img_idx
+            and m.confidence >= self.subsetter.confidence_threshold  # noqa: W503
+        ]
+        return RigModel(
+            {s: self.settings[s] for s in RigModel.SETTINGS},
+            self.nr_input_imgs,
+            self.subset_indices,
+            self.images.sizes,
+            cameras,
+            self.warper.scale,
+            self.cropper.overlapping_rectangles,
+            self.cropper.intersection_rectangles,
+            [cv.UMat.get(m) if isinstance(m, cv.UMat) else m for m in seam_masks],
+            self.compensator.get_gains(),
+            pairs,
         )
-        self.set_masks(masks)
-        imgs = self.compensate_exposure_errors(corners, imgs)
-        seam_masks = self.resize_seam_masks(seam_masks)
 
+    def compose_panorama(self, cameras, seam_masks):
+        corners, sizes = self.get_final_resolution_rois(cameras)
         self.initialize_composition(corners, sizes)
-        self.blend_images(imgs, seam_masks, corners)
+        frames = self.compose_final_resolution(cameras, seam_masks, corners)
+        self.blend_images(frames)
+        frames.close()
+        # no image is read after the final resolution pass
+        self.image_cache.clear_spilled()
         return self.create_final_panorama()
 
     def resize_medium_resolution(self):
@@ -140,11 +307,65 @@ class Stitcher:
             return self.detector.detect_with_masks(imgs, feature_masks)
 
     def match_features(self, features):
-        return self.matcher.match_features(features)
+        mask = self.pair_selector.get_mask(self.images, features)
+        if not self.feature_cache.enabled:
+            return self.matcher.match_features(features, mask)
+        nr_imgs = len(features)
+        pairs = self.matcher.get_pairs(features, mask)
+        matches, missing = self.load_cached_matches(pairs)
+        if self.matcher.stop_when_connected and self.matcher.is_connected(matches):
+            missing = []
+        if missing:
+            mask = PairSelector.pairs_to_mask(nr_imgs, missing)
+            new_matches = self.matcher.match_features(features, mask)
+            for i, j in missing:
+                matches[i * nr_imgs + j] = new_matches[i * nr_imgs + j]
+                matches[j * nr_imgs + i] = new_matches[j * nr_imgs + i]
+            self.cache_matches(matches, missing)
+        return matches
+
+    def set_cache_keys(self, feature_masks=[]):
+        if not self.feature_cache.enabled:
+            return
+        self.img_hashes = self.images.get_hashes()
+        mask_hashes = []
+        if len(feature_masks) > 0:
+            mask_hashes = Images.of(feature_masks).get_hashes()
+        detector_settings = ("detector", "nfeatures", "medium_megapix")
+        # the settings the result of matching one pair depends on, which pairs
+        # are matched is decided in match_features
+        matcher_settings = ("matcher_type", "try_use_gpu", "match_conf")
+        self.features_key = tuple(self.settings[s] for s in detector_settings) + (
+            tuple(mask_hashes),
+        )
+        self.matches_key = self.features_key + tuple(
+            repr(self.settings[s]) for s in matcher_settings
+        )
+
+    def load_cached_features(self):
+        if self.feature_cache.enabled:
+            return self.feature_cache.load_features(self.img_hashes, self.features_key)
+
+    def cache_features(self, features):
+        if self.feature_cache.enabled:
+            self.feature_cache.save_features(
+                self.img_hashes, self.features_key, features
+            )
+
+    def load_cached_matches(self, pairs):
+        return self.feature_cache.load_matches(self.img_hashes, self.matches_key, pairs)
+
+    def cache_matches(self, matches, pairs):
+        self.feature_cache.save_matches(
+            self.img_hashes, self.matches_key, matches, pairs
+        )
 
     def subset(self, imgs, features, matches):
         indices = self.subsetter.subset(self.images.names, features, matches)
-        imgs = Subsetter.subset_list(imgs, indices)
+        self.nr_input_imgs = len(self.images.names)
+        self.subset_indices = indices
+        if imgs is not None:
+            imgs = Subsetter.subset_list(imgs, indices)
         features = Subsetter.subset_list(features, indices)
         matches = Subsetter.subset_matches(matches, indices)
         self.images.subset(indices)
@@ -174,6 +395,7 @@ class Stitcher:
         return list(imgs), list(masks), corners, sizes
 
     def warp_final_resolution(self, imgs, cameras):
+        Stitcher.warn_deprecated("warp_final_resolution")
         sizes = self.images.get_scaled_img_sizes(Images.Resolution.FINAL)
         camera_aspect = self.images.get_ratio(
             Images.Resolution.MEDIUM, Images.Resolution.FINAL
@@ -194,6 +416,7 @@ class Stitcher:
         return list(imgs), list(masks), corners, sizes
 
     def crop_final_resolution(self, imgs, masks, corners, sizes):
+        Stitcher.warn_deprecated("crop_final_resolution")
         lir_aspect = self.images.get_ratio(
             Images.Resolution.LOW, Images.Resolution.FINAL
         )
@@ -212,17 +435,21 @@ class Stitcher:
         return self.seam_finder.find(imgs, corners, masks)
 
     def resize_final_resolution(self):
-        return self.images.resize(Images.Resolution.FINAL)
+        # a generator itself, so that the profiler times the decoding frame by frame
+        yield from self.images.resize(Images.Resolution.FINAL)
 
     def compensate_exposure_errors(self, corners, imgs):
+        Stitcher.warn_deprecated("compensate_exposure_errors")
         for idx, (corner, img) in enumerate(zip(corners, imgs)):
             yield self.compensator.apply(idx, corner, img, self.get_mask(idx))
 
     def resize_seam_masks(self, seam_masks):
+        Stitcher.warn_deprecated("resize_seam_masks")
         for idx, seam_mask in enumerate(seam_masks):
             yield SeamFinder.resize(seam_mask, self.get_mask(idx))
 
     def set_masks(self, mask_generator):
+        Stitcher.warn_deprecated("set_masks")
         self.masks = mask_generator
         self.mask_index = -1
 
@@ -236,20 +463,170 @@ class Stitcher:
         else:
             raise StitchingError("Invalid Mask Index!")
 
+    @staticmethod
+    def warn_deprecated(name):
+        warnings.warn(
+            f"Stitcher.{name} is deprecated, the final resolution is composed "
+            "frame by frame with prepare_final_resolution_frames.",
+            DeprecationWarning,
+            stacklevel=3,
+        )
+
+    def get_final_resolution_rois(self, cameras):
+        sizes = self.images.get_scaled_img_sizes(Images.Resolution.FINAL)
+        camera_aspect = self.images.get_ratio(
+            Images.Resolution.MEDIUM, Images.Resolution.FINAL
+        )
+        lir_aspect = self.images.get_ratio(
+            Images.Resolution.LOW, Images.Resolution.FINAL
+        )
+        corners, sizes = self.warper.warp_rois(sizes, cameras, camera_aspect)
+        return self.cropper.crop_rois(corners, sizes, lir_aspect)
+
+    def compose_final_resolution(self, cameras, seam_masks, corners):
+        # a generator itself, so that the profiler times it frame by frame
+        if self.pipelined_composition:
+            frames = self.pipeline_final_resolution_frames(cameras, seam_masks, corners)
+        else:
+            frames = self.prepare_final_resolution_frames(cameras, seam_masks, corners)
+            frames = Stitcher.read_ahead(frames, self.composition_frames)
+        yield from frames
+
+    def pipeline_final_resolution_frames(self, cameras, seam_masks, corners):
+        """the same frames as prepare_final_resolution_frames, but decoding,
+        resizing, warping, cropping and compensating overlap in a Pipeline"""
+        camera_aspect = self.images.get_ratio(
+            Images.Resolution.MEDIUM, Images.Resolution.FINAL
+        )
+        lir_aspect = self.images.get_ratio(
+            Images.Resolution.LOW, Images.Resolution.FINAL
+        )
+
+        def resize(item):
+            idx, img = item
+            return idx, self.images.resize_img(Images.Resolution.FINAL, idx, img)
+
+        def warp(item):
+            idx, img = item
+            return idx, *self.warper.warp_image_and_mask(
+                img, cameras[idx], camera_aspect
+            )
+
+        def crop(item):
+            idx, img, mask = item
+            img = self.cropper.crop_img(img, idx, lir_aspect)
+            mask = self.cropper.crop_img(mask, idx, lir_aspect)
+            return idx, img, mask
+
+        def compensate(item):
+            idx, img, mask = item
+            img = self.compensator.apply(idx, corners[idx], img, mask)
+            return img, SeamFinder.resize(seam_masks[idx], mask), corners[idx]
+
+        self.composition_pipeline = Pipeline(
+            [
+                ("resize", resize),
+                ("warp", warp),
+                ("crop", crop),
+                ("compensate", compensate),
+            ],
+            self.pipeline_queue_size,
+            source="decode",
+            consumer="feed",
+        )
+        imgs = enumerate(self.images.decode(Images.Resolution.FINAL))
+        yield from self.composition_pipeline.run(imgs)
+
+    def prepare_final_resolution_frames(self, cameras, seam_masks, corners):
+        """yield the final resolution (img, seam_mask, corner) to blend one by
+        one, so that only the frame in progress is held in memory"""
+        camera_aspect = self.images.get_ratio(
+            Images.Resolution.MEDIUM, Images.Resolution.FINAL
+        )
+        lir_aspect = self.images.get_ratio(
+            Images.Resolution.LOW, Images.Resolution.FINAL
+        )
+        # the images are not zipped, zip and enumerate would keep a reference
+        # to the previous image while the next one is read
+        imgs = self.resize_final_resolution()
+        for idx, (camera, seam_mask) in enumerate(zip(cameras, seam_masks)):
+            img, mask = self.warper.warp_image_and_mask(
+                next(imgs), camera, camera_aspect
+            )
+            img = self.cropper.crop_img(img, idx, lir_aspect)
+            mask = self.cropper.crop_img(mask, idx, lir_aspect)
+            img = self.compensator.apply(idx, corners[idx], img, mask)
+            seam_mask = SeamFinder.resize(seam_mask, mask)
+            del mask
+            yield img, seam_mask, corners[idx]
+            del img, seam_mask
+
+    @staticmethod
+    def read_ahead(frames, max_frames=1):
+        """iterate frames, producing the next ones in a background thread while
+        the current one is consumed. At most max_frames frames exist at a time,
+        including the one being consumed"""
+        if max_frames <= 1:
+            yield from frames
+            return
+
+        frames = iter(frames)
+        done = object()
+        slots = threading.Semaphore(max_frames)
+        results = queue.SimpleQueue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                while True:
+                    slots.acquire()
+                    if stop.is_set():
+                        return
+                    frame = next(frames, done)
+                    results.put(frame)
+                    if frame is done:
+                        return
+                    del frame
+            except Exception as e:
+                results.put(e)
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                frame = results.get()
+                if frame is done:
+                    return
+                if isinstance(frame, Exception):
+                    raise frame
+                yield frame
+                del frame
+                slots.release()
+        finally:
+            stop.set()
+            slots.release()
+            producer.join()
+
     def initialize_composition(self, corners, sizes):
         if self.timelapser.do_timelapse:
             self.timelapser.initialize(corners, sizes)
         else:
             self.blender.prepare(corners, sizes)
 
-    def blend_images(self, imgs, masks, corners):
-        for idx, (img, mask, corner) in enumerate(zip(imgs, masks, corners)):
+    def blend_images(self, frames, masks=None, corners=None):
+        """blend the (img, mask, corner) frames. The former separate imgs,
+        masks and corners arguments are deprecated"""
+        if masks is not None:
+            Stitcher.warn_deprecated("blend_images(imgs, masks, corners)")
+            frames = zip(frames, masks, corners)
+        for name in self.images.names:
+            img, mask, corner = next(frames)
             if self.timelapser.do_timelapse:
-                self.timelapser.process_and_save_frame(
-                    self.images.names[idx], img, corner
-                )
+                self.timelapser.process_and_save_frame(name, img, corner)
             else:
                 self.blender.feed(img, mask, corner)
+            # release the frame before the next one is read
+            del img, mask
 
     def create_final_panorama(self):
         if not self.timelapser.do_timelapse:
@@ -1,10 +1,8 @@
+import math
 import warnings
-from itertools import chain
 
 import cv2 as cv
-import numpy as np
 
-from .feature_matcher import FeatureMatcher
 from .stitching_error import StitchingError, StitchingWarning
 
 
@@ -79,7 +77,6 @@ class Subsetter:
 
     @staticmethod
     def subset_matches(pairwise_matches, indices):
-        matches_matrix = FeatureMatcher.get_matches_matrix(pairwise_matches)
-        matches_matrix_subset = matches_matrix[np.ix_(indices, indices)]
-        matches_subset_list = list(chain.from_iterable(matches_matrix_subset.tolist()))
-        return matches_subset_list
+        # index arithmetic on the flat (row major) list, no dense N x N matrix
+        nr_imgs = int(math.sqrt(len(pairwise_matches)))
+        return [pairwise_matches[i * nr_imgs + j] for i in indices for j in indices]
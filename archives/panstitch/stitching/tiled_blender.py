@@ -0,0 +1,207 @@
+import math
+import os
+import shutil
+import tempfile
+import weakref
+
+import cv2 as cv
+import numpy as np
+
+from .blender import Blender
+from .stitching_error import StitchingError
+
+
+class TiledBlender(Blender):
+    """Out-of-core blending in tiles of the panorama.
+
+    Fed images are spilled to disk as memory mapped .npy files. The panorama is
+    then blended tile by tile, each tile only from the images intersecting it
+    (enlarged by the margin the blender needs, e.g. the pyramid of the
+    multiband blender). Peak memory is therefore bound by the tile size
+    instead of the panorama size. Tiles are written to a (Big)TIFF or .npy
+    output file if given, otherwise assembled in memory.
+
+    The multiband blender aligns its pyramids to 2 ** bands pixels from the
+    blended area, so the tile size is rounded up to a multiple of that.
+    """
+
+    DEFAULT_TILE_SIZE = 1024
+    DEFAULT_OUTPUT = None
+    DEFAULT_SPILL_DIR = None
+
+    def __init__(
+        self,
+        blender_type=Blender.DEFAULT_BLENDER,
+        blend_strength=Blender.DEFAULT_BLEND_STRENGTH,
+        tile_size=DEFAULT_TILE_SIZE,
+        output=DEFAULT_OUTPUT,
+        spill_dir=DEFAULT_SPILL_DIR,
+    ):
+        super().__init__(blender_type, blend_strength)
+        if tile_size % 16 != 0:
+            raise StitchingError("Tile size must be a multiple of 16")
+        self.tile_size = tile_size
+        self.output = output
+        self.spill_dir = spill_dir
+        self.spilled = []
+        self.finalizer = None
+
+    def prepare(self, corners, sizes):
+        self.dst_sz = cv.detail.resultRoi(corners=corners, sizes=sizes)
+        self.margin = self.get_margin()
+        self.tile_step = self.get_tile_step()
+        self.cleanup()
+        self.tmp_dir = tempfile.mkdtemp(prefix="tiles_", dir=self.spill_dir)
+        # the spilled images are removed even if blend is never called
+        self.finalizer = weakref.finalize(self, shutil.rmtree, self.tmp_dir, True)
+        self.spilled = []
+
+    def get_margin(self):
+        blender = self.create_blender(self.dst_sz)
+        if isinstance(blender, cv.detail_MultiBandBlender):
+            # the area around each image the multiband blender feeds
+            # (3 * 2 ** bands), its alignment and the reach of the pyramid filters
+            return 5 * 2 ** blender.numBands()
+        elif isinstance(blender, cv.detail_FeatherBlender):
+            return math.ceil(1 / blender.sharpness())
+        return 0
+
+    def get_tile_step(self):
+        blender = self.create_blender(self.dst_sz)
+        if isinstance(blender, cv.detail_MultiBandBlender):
+            alignment = 2 ** blender.numBands()
+            return math.ceil(self.tile_size / alignment) * alignment
+        return self.tile_size
+
+    def feed(self, img, mask, corner):
+        idx = len(self.spilled)
+        img = TiledBlender.spill(self.tmp_dir, f"img_{idx}", img)
+        mask = TiledBlender.spill(self.tmp_dir, f"mask_{idx}", mask)
+        x, y = corner
+        roi = (x, y, x + img.shape[1], y + img.shape[0])
+        self.spilled.append((img, mask, roi))
+
+    def blend(self):
+        try:
+            if self.output is None:
+                return self.blend_to_memory()
+            self.blend_to_file(self.output)
+            return None, None
+        finally:
+            self.cleanup()
+
+    def cleanup(self):
+        self.spilled = []
+        if self.finalizer is not None:
+            self.finalizer()
+
+    def blend_to_memory(self):
+        _, _, width, height = self.dst_sz
+        result = np.zeros((height, width, 3), np.uint8)
+        result_mask = np.zeros((height, width), np.uint8)
+        for (x, y), tile, tile_mask in self.blend_tiles():
+            h, w = tile_mask.shape
+            result[y : y + h, x : x + w] = tile
+            result_mask[y : y + h, x : x + w] = tile_mask
+        return result, result_mask
+
+    def blend_to_file(self, path):
+        _, _, width, height = self.dst_sz
+        if path.lower().endswith((".tif", ".tiff")):
+            TiledBlender.write_tiff(
+                path, self.blend_tiles(), (height, width), self.tile_step
+            )
+        else:
+            result = np.lib.format.open_memmap(path, "w+", np.uint8, (height, width, 3))
+            for (x, y), tile, tile_mask in self.blend_tiles():
+                h, w = tile_mask.shape
+                result[y : y + h, x : x + w] = tile
+            result.flush()
+            del result
+
+    def blend_tiles(self):
+        """yield (x, y), tile, tile_mask in row major order, (x, y) relative to
+        the top left corner of the panorama"""
+        dst_x, dst_y, width, height = self.dst_sz
+        for y in range(0, height, self.tile_step):
+            for x in range(0, width, self.tile_step):
+                tile_roi = (
+                    dst_x + x,
+                    dst_y + y,
+                    dst_x + min(x + self.tile_step, width),
+                    dst_y + min(y + self.tile_step, height),
+                )
+                yield (x, y), *self.blend_tile(tile_roi)
+
+    def blend_tile(self, tile_roi):
+        x0, y0, x1, y1 = tile_roi
+        blend_roi = TiledBlender.intersect(
+            TiledBlender.enlarge(tile_roi, self.margin), self.get_dst_roi()
+        )
+        tile = np.zeros((y1 - y0, x1 - x0, 3), np.uint8)
+        tile_mask = np.zeros((y1 - y0, x1 - x0), np.uint8)
+        feeds = [
+            (img, mask, roi, TiledBlender.intersect(roi, blend_roi))
+            for img, mask, roi in self.spilled
+        ]
+        feeds = [feed for feed in feeds if feed[3] is not None]
+        if not feeds:
+            return tile, tile_mask
+
+        bx0, by0, bx1, by1 = blend_roi
+        self.blender = self.create_blender(self.dst_sz)
+        self.blender.prepare((bx0, by0, bx1 - bx0, by1 - by0))
+        for img, mask, (ix0, iy0, _, _), (cx0, cy0, cx1, cy1) in feeds:
+            crop = np.s_[cy0 - iy0 : cy1 - iy0, cx0 - ix0 : cx1 - ix0]
+            super().feed(img[crop], np.ascontiguousarray(mask[crop]), (cx0, cy0))
+        blended, blended_mask = super().blend()
+        inner = np.s_[y0 - by0 : y1 - by0, x0 - bx0 : x1 - bx0]
+        tile[:] = blended[inner]
+        tile_mask[:] = blended_mask[inner]
+        self.blender = None
+        return tile, tile_mask
+
+    def get_dst_roi(self):
+        x, y, width, height = self.dst_sz
+        return (x, y, x + width, y + height)
+
+    @staticmethod
+    def enlarge(roi, margin):
+        x0, y0, x1, y1 = roi
+        return (x0 - margin, y0 - margin, x1 + margin, y1 + margin)
+
+    @staticmethod
+    def intersect(roi1, roi2):
+        x0, y0 = max(roi1[0], roi2[0]), max(roi1[1], roi2[1])
+        x1, y1 = min(roi1[2], roi2[2]), min(roi1[3], roi2[3])
+        if x0 >= x1 or y0 >= y1:
+            return None
+        return (x0, y0, x1, y1)
+
+    @staticmethod
+    def spill(directory, name, array):
+        array = cv.UMat.get(array) if isinstance(array, cv.UMat) else array
+        path = os.path.join(directory, name + ".npy")
+        np.save(path, array)
+        return np.load(path, mmap_mode="r")
+
+    @staticmethod
+    def write_tiff(path, tiles, shape, tile_size):
+        # tifffile is only imported if a tiff output is explicitly desired
+        import tifffile
+
+        def padded_rgb_tiles():
+            for _, tile, _ in tiles:
+                padded = np.zeros((tile_size, tile_size, 3), np.uint8)
+                h, w = tile.shape[:2]
+                padded[:h, :w] = cv.cvtColor(tile, cv.COLOR_BGR2RGB)
+                yield padded
+
+        with tifffile.TiffWriter(path, bigtiff=True) as tiff:
+            tiff.write(
+                padded_rgb_tiles(),
+                shape=(*shape, 3),
+                dtype=np.uint8,
+                tile=(tile_size, tile_size),
+                photometric="rgb",
+            )
@@ -11,7 +11,11 @@ def verbose_stitching(stitcher, images, feature_masks=[], verbose_dir=None):
     _dir = "." if verbose_dir is None else verbose_dir
 
     images = Images.of(
-        images, stitcher.medium_megapix, stitcher.low_megapix, stitcher.final_megapix
+        images,
+        stitcher.medium_megapix,
+        stitcher.low_megapix,
+        stitcher.final_megapix,
+        stitcher.image_cache,
     )
 
     # Resize Images
@@ -26,7 +30,8 @@ def verbose_stitching(stitcher, images, feature_masks=[], verbose_dir=None):
 
     # Match Features
     matcher = stitcher.matcher
-    matches = matcher.match_features(features)
+    mask = stitcher.pair_selector.get_mask(images, features)
+    matches = matcher.match_features(features, mask)
 
     # Subset
     subsetter = stitcher.subsetter
@@ -0,0 +1,291 @@
+import queue
+import threading
+import time
+
+import cv2 as cv
+
+from .images import Images
+from .pipeline import LatencyStats
+from .seam_finder import SeamFinder
+from .stitcher import Stitcher
+from .stitching_error import StitchingError
+
+
+class VideoStitcher:
+    """Stitch synchronised frames of several video sources (camera indices as
+    for cv.VideoCapture, or recorded video files) into a panorama stream.
+
+    The rig is calibrated once, from a RigModel or from the first frames.
+    Afterwards each frame set is only remapped with the precomputed warp maps,
+    compensated with the fixed exposure gains and blended along the fixed seam
+    masks (or put on the fixed canvas of the Timelapser).
+
+    Capturing, warping and blending run as a pipeline in separate threads,
+    connected by bounded queues. If a stage falls behind, the "drop_oldest"
+    policy drops the oldest waiting frame set so that the output stays
+    current, "block" waits instead and never drops (e.g. for video files).
+    """
+
+    DROP_POLICY_CHOICES = ("drop_oldest", "block")
+    DEFAULT_DROP_POLICY = "drop_oldest"
+    DEFAULT_TARGET_FPS = None
+    DEFAULT_QUEUE_SIZE = 2
+    STAGES = ("capture", "warp", "blend", "latency")
+    POLL_INTERVAL = 0.1  # s, how often blocked stages check for a stop
+
+    def __init__(
+        self,
+        sources,
+        stitcher=None,
+        target_fps=DEFAULT_TARGET_FPS,
+        drop_policy=DEFAULT_DROP_POLICY,
+        queue_size=DEFAULT_QUEUE_SIZE,
+    ):
+        if len(sources) < 2:
+            raise StitchingError("2 or more video sources needed")
+        if drop_policy not in VideoStitcher.DROP_POLICY_CHOICES:
+            raise StitchingError("Invalid drop policy: " + str(drop_policy))
+        self.sources = sources
+        self.stitcher = Stitcher() if stitcher is None else stitcher
+        self.target_fps = target_fps
+        self.drop_policy = drop_policy
+        self.queue_size = queue_size
+        self.captures = []
+        self.model = None
+        self.stop = threading.Event()
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {stage: LatencyStats() for stage in VideoStitcher.STAGES}
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def fps(self):
+        if self.start_time is None:
+            return 0.0
+        end_time = time.perf_counter() if self.end_time is None else self.end_time
+        return self.stats["blend"].count / max(end_time - self.start_time, 1e-9)
+
+    def summary(self):
+        summary = {stage: self.stats[stage].summary for stage in VideoStitcher.STAGES}
+        summary["fps"] = self.fps
+        return summary
+
+    def open(self):
+        self.captures = []
+        for source in self.sources:
+            capture = cv.VideoCapture(source)
+            if not capture.isOpened():
+                self.release()
+                raise StitchingError("Cannot open video source " + str(source))
+            self.captures.append(capture)
+
+    def release(self):
+        for capture in self.captures:
+            capture.release()
+        self.captures = []
+
+    def read(self):
+        """the next synchronised frame set, None at the end of any source"""
+        # grab all sources first, the slow decoding comes afterwards
+        if not all([capture.grab() for capture in self.captures]):
+            return None
+        frames = []
+        for capture in self.captures:
+            retrieved, frame = capture.retrieve()
+            if not retrieved:
+                return None
+            frames.append(frame)
+        return frames
+
+    def calibrate(self, frames):
+        if self.stitcher.rig_model is None:
+            # the calibration panorama is blended, not written as timelapse
+            timelapser = self.stitcher.timelapser
+            do_timelapse, timelapser.do_timelapse = timelapser.do_timelapse, False
+            try:
+                self.stitcher.stitch(frames)
+            finally:
+                timelapser.do_timelapse = do_timelapse
+            model = self.stitcher.calibration
+        else:
+            model = self.stitcher.rig_model
+        self.prepare(model, frames)
+
+    def prepare(self, model, frames):
+        stitcher = self.stitcher
+        images = Images.of(
+            list(frames),
+            stitcher.medium_megapix,
+            stitcher.low_megapix,
+            stitcher.final_megapix,
+        )
+        model.check(stitcher.settings, images.sizes)
+        images.subset(model.indices)
+        stitcher.images = images
+        stitcher.apply_rig_model(model)
+        self.model = model
+
+        self.final_sizes = images.get_scaled_img_sizes(Images.Resolution.FINAL)
+        self.needs_resize = self.final_sizes != images.sizes
+        camera_aspect = images.get_ratio(
+            Images.Resolution.MEDIUM, Images.Resolution.FINAL
+        )
+        self.lir_aspect = images.get_ratio(
+            Images.Resolution.LOW, Images.Resolution.FINAL
+        )
+        self.corners, self.sizes = stitcher.get_final_resolution_rois(model.cameras)
+        self.maps, self.masks, self.seam_masks = [], [], []
+        for idx, (size, camera) in enumerate(zip(self.final_sizes, model.cameras)):
+            maps = stitcher.warper.get_maps(size, camera, camera_aspect)
+            mask = stitcher.cropper.crop_img(maps.mask, idx, self.lir_aspect)
+            self.maps.append(maps)
+            self.masks.append(mask)
+            self.seam_masks.append(SeamFinder.resize(model.seam_masks[idx], mask))
+        if stitcher.timelapser.do_timelapse:
+            stitcher.timelapser.initialize(self.corners, self.sizes)
+
+    def warp_frames(self, frames):
+        stitcher = self.stitcher
+        imgs = [frames[i] for i in self.model.indices]
+        if self.needs_resize:
+            imgs = stitcher.images.resize(Images.Resolution.FINAL, imgs)
+        warped = []
+        for idx, img in enumerate(imgs):
+            img = stitcher.warper.remap(img, self.maps[idx])
+            img = stitcher.cropper.crop_img(img, idx, self.lir_aspect)
+            img = stitcher.compensator.apply(
+                idx, self.corners[idx], img, self.masks[idx]
+            )
+            warped.append(img)
+        return warped
+
+    def blend_frames(self, imgs):
+        stitcher = self.stitcher
+        if stitcher.timelapser.do_timelapse:
+            for img, corner in zip(imgs, self.corners):
+                stitcher.timelapser.process_frame(img, corner)
+            return stitcher.timelapser.get_frame()
+        stitcher.blender.prepare(self.corners, self.sizes)
+        for img, seam_mask, corner in zip(imgs, self.seam_masks, self.corners):
+            stitcher.blender.feed(img, seam_mask, corner)
+        panorama, _ = stitcher.blender.blend()
+        return panorama
+
+    def stitch_frames(self, frames):
+        """stitch one frame set, synchronously"""
+        return self.blend_frames(self.warp_frames(frames))
+
+    def stream(self, max_frames=None):
+        """yield the stitched panoramas of the sources until one of them ends
+        (or after max_frames panoramas)"""
+        self.open()
+        try:
+            frames = self.read()
+            if frames is None:
+                raise StitchingError("No frames to calibrate the rig")
+            if self.model is None:
+                self.calibrate(frames)
+            yield from self.run_pipeline(frames, max_frames)
+        finally:
+            self.release()
+
+    def run_pipeline(self, first_frames, max_frames=None):
+        done = object()
+        self.stop = threading.Event()
+        captured = queue.Queue(self.queue_size)
+        warped = queue.Queue(self.queue_size)
+
+        def capture():
+            frames = first_frames
+            period = None if not self.target_fps else 1 / self.target_fps
+            next_tick = time.perf_counter()
+            try:
+                while frames is not None and not self.stop.is_set():
+                    timestamp = time.perf_counter()
+                    self.put(captured, (timestamp, frames), self.stats["capture"])
+                    del frames
+                    if period is not None:
+                        next_tick += period
+                        time.sleep(max(0, next_tick - time.perf_counter()))
+                    start = time.perf_counter()
+                    frames = self.read()
+                    self.stats["capture"].add(time.perf_counter() - start)
+                self.put(captured, done)
+            except Exception as e:
+                self.put(captured, e)
+
+        def warp():
+            try:
+                while not self.stop.is_set():
+                    try:
+                        item = captured.get(timeout=VideoStitcher.POLL_INTERVAL)
+                    except queue.Empty:
+                        continue
+                    if item is done or isinstance(item, Exception):
+                        self.put(warped, item)
+                        return
+                    timestamp, frames = item
+                    del item
+                    start = time.perf_counter()
+                    imgs = self.warp_frames(frames)
+                    self.stats["warp"].add(time.perf_counter() - start)
+                    del frames
+                    self.put(warped, (timestamp, imgs), self.stats["warp"])
+                    del imgs
+            except Exception as e:
+                self.put(warped, e)
+
+        threads = [
+            threading.Thread(target=capture, daemon=True),
+            threading.Thread(target=warp, daemon=True),
+        ]
+        self.reset_stats()
+        self.start_time = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            while max_frames is None or self.stats["blend"].count < max_frames:
+                item = warped.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                timestamp, imgs = item
+                del item
+                start = time.perf_counter()
+                panorama = self.blend_frames(imgs)
+                end = time.perf_counter()
+                self.stats["blend"].add(end - start)
+                self.stats["latency"].add(end - timestamp)
+                del imgs
+                yield panorama
+                del panorama
+        finally:
+            self.end_time = time.perf_counter()
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+
+    def put(self, q, item, stats=None):
+        """put an item into a bounded queue according to the drop policy. Only
+        frames are dropped, never the end of the stream (or an exception)"""
+        if self.drop_policy == "block" or stats is None:
+            while not self.stop.is_set():
+                try:
+                    q.put(item, timeout=VideoStitcher.POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+            return
+        while True:
+            try:
+                q.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    stats.dropped += 1
+                except queue.Empty:
+                    pass
@@ -1,9 +1,105 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
 from statistics import median
 
 import cv2 as cv
 import numpy as np
 
 
+class WarpMaps(namedtuple("WarpMaps", "corner map1 map2 mask")):
+    """Fixed point (int16) remap tables and the warped mask of one camera"""
+
+    __slots__ = ()
+
+    @property
+    def size(self):
+        return (self.map1.shape[1], self.map1.shape[0])
+
+    @property
+    def nbytes(self):
+        return self.map1.nbytes + self.map2.nbytes + self.mask.nbytes
+
+
+class WarpMapCache:
+    """WarpMaps LRU cached in memory and, if a cache_dir is given, persisted
+    as .npz files so that a fixed camera rig can reuse them across runs"""
+
+    DEFAULT_MAX_MEGABYTES = 50
+    DEFAULT_CACHE_DIR = None
+
+    def __init__(
+        self, max_megabytes=DEFAULT_MAX_MEGABYTES, cache_dir=DEFAULT_CACHE_DIR
+    ):
+        self.max_bytes = int(max_megabytes * 1e6)
+        self.cache_dir = cache_dir
+        self.memory_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_bytes": self.memory_bytes,
+            "memory_entries": len(self._entries),
+        }
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        path = self._get_path(key)
+        if path is not None and os.path.isfile(path):
+            with np.load(path) as data:
+                maps = WarpMaps(
+                    tuple(int(i) for i in data["corner"]),
+                    *(data[name] for name in WarpMaps._fields[1:]),
+                )
+            self.disk_hits += 1
+            self._remember(key, maps)
+            return maps
+        self.misses += 1
+        return None
+
+    def put(self, key, maps):
+        path = self._get_path(key)
+        if path is not None:
+            np.savez(path, **maps._asdict())
+        self._remember(key, maps)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.memory_bytes = 0
+
+    def _remember(self, key, maps):
+        with self._lock:
+            if key in self._entries or maps.nbytes > self.max_bytes:
+                return
+            self._entries[key] = maps
+            self.memory_bytes += maps.nbytes
+            while self.memory_bytes > self.max_bytes:
+                _, evicted_maps = self._entries.popitem(last=False)
+                self.memory_bytes -= evicted_maps.nbytes
+
+    def _get_path(self, key):
+        if self.cache_dir is None:
+            return None
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"maps_{digest}.npz")
+
+
 class Warper:
     """https://docs.opencv.org/4.x/da/db8/classcv_1_1detail_1_1RotationWarper.html"""
 
@@ -28,9 +124,15 @@ class Warper:
 
     DEFAULT_WARP_TYPE = "spherical"
 
-    def __init__(self, warper_type=DEFAULT_WARP_TYPE):
+    def __init__(
+        self,
+        warper_type=DEFAULT_WARP_TYPE,
+        map_cache_megabytes=WarpMapCache.DEFAULT_MAX_MEGABYTES,
+        map_cache_dir=WarpMapCache.DEFAULT_CACHE_DIR,
+    ):
         self.warper_type = warper_type
         self.scale = None
+        self.map_cache = WarpMapCache(map_cache_megabytes, map_cache_dir)
 
     def set_scale(self, cameras):
         focals = [cam.focal for cam in cameras]
@@ -41,31 +143,21 @@ class Warper:
             yield self.warp_image(img, camera, aspect)
 
     def warp_image(self, img, camera, aspect=1):
-        warper = cv.PyRotationWarper(self.warper_type, self.scale * aspect)
-        _, warped_image = warper.warp(
-            img,
-            Warper.get_K(camera, aspect),
-            camera.R,
-            cv.INTER_LINEAR,
-            cv.BORDER_REFLECT,
-        )
-        return warped_image
+        size = (img.shape[1], img.shape[0])
+        return Warper.remap(img, self.get_maps(size, camera, aspect))
+
+    def warp_image_and_mask(self, img, camera, aspect=1):
+        """the warped image and mask, both from the same warp maps"""
+        size = (img.shape[1], img.shape[0])
+        maps = self.get_maps(size, camera, aspect)
+        return Warper.remap(img, maps), np.copy(maps.mask)
 
     def create_and_warp_masks(self, sizes, cameras, aspect=1):
         for size, camera in zip(sizes, cameras):
             yield self.create_and_warp_mask(size, camera, aspect)
 
     def create_and_warp_mask(self, size, camera, aspect=1):
-        warper = cv.PyRotationWarper(self.warper_type, self.scale * aspect)
-        mask = 255 * np.ones((size[1], size[0]), np.uint8)
-        _, warped_mask = warper.warp(
-            mask,
-            Warper.get_K(camera, aspect),
-            camera.R,
-            cv.INTER_NEAREST,
-            cv.BORDER_CONSTANT,
-        )
-        return warped_mask
+        return np.copy(self.get_maps(size, camera, aspect).mask)
 
     def warp_rois(self, sizes, cameras, aspect=1):
         roi_corners = []
@@ -77,10 +169,49 @@ class Warper:
         return roi_corners, roi_sizes
 
     def warp_roi(self, size, camera, aspect=1):
+        maps = self.map_cache.get(self.get_map_key(size, camera, aspect))
+        if maps is not None:
+            return (*maps.corner, *maps.size)
         warper = cv.PyRotationWarper(self.warper_type, self.scale * aspect)
         K = Warper.get_K(camera, aspect)
         return warper.warpRoi(size, K, camera.R)
 
+    def get_maps(self, size, camera, aspect=1):
+        key = self.get_map_key(size, camera, aspect)
+        maps = self.map_cache.get(key)
+        if maps is None:
+            maps = self.build_maps(size, camera, aspect)
+            self.map_cache.put(key, maps)
+        return maps
+
+    def build_maps(self, size, camera, aspect=1):
+        warper = cv.PyRotationWarper(self.warper_type, self.scale * aspect)
+        K = Warper.get_K(camera, aspect)
+        roi, xmap, ymap = warper.buildMaps(size, K, camera.R)
+        # the mask is derived from the same maps (as warping it would do)
+        mask = np.full((size[1], size[0]), 255, np.uint8)
+        mask = cv.remap(
+            mask, xmap, ymap, cv.INTER_NEAREST, borderMode=cv.BORDER_CONSTANT
+        )
+        map1, map2 = cv.convertMaps(xmap, ymap, cv.CV_16SC2)
+        del xmap, ymap
+        return WarpMaps(roi[:2], map1, map2, mask)
+
+    def get_map_key(self, size, camera, aspect=1):
+        return (
+            self.warper_type,
+            float(self.scale * aspect),
+            tuple(size),
+            Warper.get_K(camera, aspect).tobytes(),
+            np.asarray(camera.R, np.float32).tobytes(),
+        )
+
+    @staticmethod
+    def remap(img, maps):
+        return cv.remap(
+            img, maps.map1, maps.map2, cv.INTER_LINEAR, borderMode=cv.BORDER_REFLECT
+        )
+
     @staticmethod
     def get_K(camera, aspect=1):
         K = camera.K().astype(np.float32)
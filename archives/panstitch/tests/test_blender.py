@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from .context import Blender, TiledBlender
+
+
+class TestBlender(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.corners = [(0, 0), (150, 20), (320, -10)]
+        self.sizes = [(200, 180), (220, 160), (180, 200)]
+        self.imgs = [rng.integers(0, 256, (h, w, 3), np.uint8) for w, h in self.sizes]
+        self.masks = [np.full((h, w), 255, np.uint8) for w, h in self.sizes]
+
+    def blend(self, blender):
+        blender.prepare(self.corners, self.sizes)
+        for img, mask, corner in zip(self.imgs, self.masks, self.corners):
+            blender.feed(img, mask, corner)
+        return blender.blend()
+
+    def test_tiled_blender(self):
+        for blender_type in Blender.BLENDER_CHOICES:
+            expected, expected_mask = self.blend(Blender(blender_type))
+            result, result_mask = self.blend(TiledBlender(blender_type, tile_size=64))
+            np.testing.assert_array_equal(result, expected)
+            np.testing.assert_array_equal(result_mask, expected_mask)
+
+    def test_tiled_blender_unaligned_tiles(self):
+        # 5 bands, the multiband pyramids are aligned to 32 pixels
+        expected, _ = self.blend(Blender("multiband", 25))
+        for tile_size in (48, 80):
+            blender = TiledBlender("multiband", 25, tile_size=tile_size)
+            result, _ = self.blend(blender)
+            self.assertEqual(blender.tile_step, tile_size + 16)
+            np.testing.assert_array_equal(result, expected)
+
+    def test_tiled_blender_cleanup(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            blender = TiledBlender(tile_size=64, spill_dir=tmp_dir)
+            blender.prepare(self.corners, self.sizes)
+            blender.feed(self.imgs[0], self.masks[0], self.corners[0])
+            self.assertEqual(len(os.listdir(tmp_dir)), 1)
+            del blender
+            self.assertEqual(os.listdir(tmp_dir), [])
+
+    def test_tiled_blender_output(self):
+        expected, _ = self.blend(Blender())
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output = os.path.join(tmp_dir, "panorama.npy")
+            blender = TiledBlender(tile_size=64, output=output, spill_dir=tmp_dir)
+
+            self.assertEqual(self.blend(blender), (None, None))
+            np.testing.assert_array_equal(np.load(output), expected)
+            self.assertEqual(os.listdir(tmp_dir), ["panorama.npy"])
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
@@ -19,6 +19,22 @@ class TestFeatureDetector(unittest.TestCase):
         features = detector.detect_features(img1)
         self.assertEqual(len(features.getKeypoints()), other_keypoints)
 
+    def test_parallel_detection(self):
+        imgs = [load_test_img("s1.jpg"), load_test_img("s2.jpg")]
+
+        serial_features = FeatureDetector("orb", workers=1).detect(imgs)
+        parallel_features = FeatureDetector("orb", workers=2).detect(imgs)
+
+        self.assertEqual(len(parallel_features), len(serial_features))
+        for serial, parallel in zip(serial_features, parallel_features):
+            np.testing.assert_array_equal(
+                [kp.pt for kp in serial.getKeypoints()],
+                [kp.pt for kp in parallel.getKeypoints()],
+            )
+            np.testing.assert_array_equal(
+                serial.descriptors.get(), parallel.descriptors.get()
+            )
+
     def test_feature_masking(self):
         img1 = load_test_img("s1.jpg")
 
@@ -1,8 +1,19 @@
+import os
+import tempfile
 import unittest
 
+import cv2 as cv
 import numpy as np
 
-from .context import Images, _FilenameImages, _NumpyImages, load_test_img, test_input
+from .context import (
+    ImageCache,
+    Images,
+    _FilenameImages,
+    _NumpyImages,
+    load_test_img,
+    probe_size,
+    test_input,
+)
 
 
 class TestImages(unittest.TestCase):
@@ -41,6 +52,72 @@ class TestImages(unittest.TestCase):
         ratio = images.get_ratio(Images.Resolution.MEDIUM, Images.Resolution.LOW)
         self.assertEqual(ratio, 0.408248290463863)
 
+    def test_probed_sizes(self):
+        images = Images.of([test_input("s1.jpg"), test_input("s2.jpg")])
+        # known before any image was decoded
+        self.assertEqual(images.sizes, [(1246, 700), (1385, 700)])
+        low_sizes = images.get_scaled_img_sizes(Images.Resolution.LOW)
+        self.assertEqual(low_sizes, [(422, 237), (469, 237)])
+
+        for name in ("s1.jpg", "boat1.jpg", "barcode1.png", "mask1.png"):
+            img = load_test_img(name)
+            self.assertEqual(probe_size(test_input(name)), Images.get_image_size(img))
+
+    def test_probe_truncated_jpeg(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            filename = os.path.join(tmp_dir, "truncated.jpg")
+            with open(filename, "wb") as file:
+                file.write(b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00")
+                file.write(b"\x00\x01\x00\x01\x00\x00\xff")
+            self.assertIsNone(probe_size(filename))
+
+            # a segment length below its own two bytes
+            for marker in (b"\xe1", b"\xe2"):
+                with open(filename, "wb") as file:
+                    file.write(b"\xff\xd8\xff" + marker + b"\x00\x01")
+                    file.write(b"\xff\xc0\x00\x11\x08\x00\x10\x00\x20")
+                self.assertIsNone(probe_size(filename))
+
+    def test_reduced_read_flag(self):
+        images = Images.of([load_test_img("s1.jpg"), load_test_img("s2.jpg")])
+        flags = [
+            Images.get_read_flag(images._get_scaler(resolution), images.sizes[0])
+            for resolution in Images.Resolution
+        ]
+
+        self.assertEqual(
+            flags, [cv.IMREAD_COLOR, cv.IMREAD_REDUCED_COLOR_2, cv.IMREAD_COLOR]
+        )
+
+    def test_image_cache(self):
+        cache = ImageCache(max_megabytes=100)
+        images = Images.of([test_input("s1.jpg"), test_input("s2.jpg")], cache=cache)
+
+        first_pass = list(images)
+        second_pass = list(images)
+        self.assertEqual((cache.misses, cache.hits), (2, 2))
+        for img1, img2 in zip(first_pass, second_pass):
+            np.testing.assert_array_equal(img1, img2)
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = ImageCache(max_megabytes=0, cache_dir=cache_dir)
+            images = Images.of(
+                [test_input("s1.jpg"), test_input("s2.jpg")], cache=cache
+            )
+            first_pass = list(images)
+            second_pass = list(images)
+            self.assertEqual((cache.misses, cache.disk_hits), (2, 2))
+            self.assertEqual(cache.memory_bytes, 0)
+            for img1, img2 in zip(first_pass, second_pass):
+                np.testing.assert_array_equal(img1, img2)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            cache.clear()
+            self.assertEqual(os.listdir(cache_dir), [])
+
+            list(images)
+            del cache, images
+            self.assertEqual(os.listdir(cache_dir), [])
+
     def test_images(self):
         self.assertEqual(Images.Resolution.LOW.name, "LOW")
         self.assertEqual(Images.Resolution.LOW.value, 0.1)
@@ -2,7 +2,15 @@ import unittest
 
 import numpy as np
 
-from .context import FeatureMatcher
+from .context import (
+    FeatureDetector,
+    FeatureMatcher,
+    ImageRetrieval,
+    PairSelector,
+    StitchingError,
+    Subsetter,
+    load_test_img,
+)
 
 
 class TestMatcher(unittest.TestCase):
@@ -31,6 +39,97 @@ class TestMatcher(unittest.TestCase):
         self.assertEqual(implicit_match_conf_orb, 0.3)
         self.assertEqual(implicit_match_conf_other, 0.65)
 
+    def test_sequential_pairs(self):
+        pairs = PairSelector.sequential_pairs(4, 2)
+
+        self.assertEqual(pairs, [(0, 1), (0, 2), (1, 2), (1, 3), (2, 3)])
+
+    def test_explicit_pairs(self):
+        names = ["a.jpg", "b.jpg", "c.jpg"]
+
+        pairs = PairSelector.explicit_pairs(names, [("c.jpg", "a.jpg"), (1, 2)])
+        self.assertEqual(pairs, [(0, 2), (1, 2)])
+
+        with self.assertRaises(StitchingError):
+            PairSelector.explicit_pairs(names, [("a.jpg", "d.jpg")])
+        with self.assertRaises(StitchingError):
+            PairSelector.explicit_pairs(names, [(0, 3)])
+
+    def test_nearest_neighbor_pairs(self):
+        # three images ~11 m apart along a line, one ~11 km away
+        coordinates = [
+            (47.6500, -122.3000, 10),
+            (47.6501, -122.3000, 10),
+            (47.6502, -122.3000, 10),
+            (47.7500, -122.3000, 10),
+        ]
+
+        pairs = PairSelector.nearest_neighbor_pairs(coordinates, 1)
+
+        self.assertEqual(pairs, [(0, 1), (1, 2), (2, 3)])
+
+    def test_pairs_to_mask(self):
+        mask = PairSelector.pairs_to_mask(3, [(0, 2)])
+
+        np.testing.assert_array_equal(mask, [[0, 0, 1], [0, 0, 0], [1, 0, 0]])
+
+    def test_image_retrieval(self):
+        imgs = [load_test_img(name) for name in ("s1.jpg", "s2.jpg", "boat1.jpg")]
+        features = FeatureDetector().detect(imgs)
+        retrieval = ImageRetrieval(vocabulary_size=16)
+
+        descriptors = retrieval.global_descriptors(features)
+        self.assertEqual(descriptors.shape, (3, 16))
+        np.testing.assert_allclose(np.linalg.norm(descriptors, axis=1), 1, rtol=1e-5)
+
+        self.assertIn(len(retrieval.top_k_pairs(features, 1)), (2, 3))
+        self.assertEqual(retrieval.top_k_pairs(features, 2), [(0, 1), (0, 2), (1, 2)])
+
+    def test_image_retrieval_without_descriptors(self):
+        blank = np.zeros((200, 300, 3), np.uint8)
+        features = FeatureDetector().detect([blank, blank, blank])
+        retrieval = ImageRetrieval()
+
+        self.assertEqual(retrieval.global_descriptors(features).shape, (3, 0))
+        self.assertEqual(retrieval.top_k_pairs(features, 1), [(0, 1), (0, 2), (1, 2)])
+
+    def test_parallel_matching(self):
+        imgs = [load_test_img(name) for name in ("s1.jpg", "s2.jpg", "boat1.jpg")]
+        features = FeatureDetector().detect(imgs)
+
+        reference = FeatureMatcher().match_features(features)
+        matches = FeatureMatcher(workers=2).match_features(features)
+
+        self.assertEqual(len(matches), 9)
+        for expected, actual in zip(reference, matches):
+            self.assertEqual(expected.src_img_idx, actual.src_img_idx)
+            self.assertEqual(expected.dst_img_idx, actual.dst_img_idx)
+        self.assertGreater(matches[1].confidence, 1)
+        self.assertEqual(matches[1].confidence, matches[3].confidence)
+        self.assertEqual(
+            [m.queryIdx for m in matches[1].getMatches()],
+            [m.trainIdx for m in matches[3].getMatches()],
+        )
+
+    def test_stop_matching_when_connected(self):
+        imgs = [load_test_img(name) for name in ("s1.jpg", "s2.jpg", "boat1.jpg")]
+        features = FeatureDetector().detect(imgs)
+        matcher = FeatureMatcher(workers=2, stop_when_connected=True)
+
+        self.assertEqual(matcher.get_pairs(features), [(0, 1), (1, 2), (0, 2)])
+        mask = PairSelector.pairs_to_mask(3, [(0, 1)])
+        matches = matcher.match_features(features, mask)
+        self.assertEqual(
+            [m.src_img_idx for m in matches], [-1, 0, -1, 1, -1, -1, -1, -1, -1]
+        )
+
+    def test_subset_matches(self):
+        matches = list(range(9))
+
+        subset = Subsetter.subset_matches(matches, [0, 2])
+
+        self.assertEqual(subset, [0, 2, 6, 8])
+
 
 def start_test():
     unittest.main()
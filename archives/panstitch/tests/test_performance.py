@@ -99,6 +99,43 @@ class TestStitcher(unittest.TestCase):
         allowed_deviation = time_needed / 100 * allowed_deviation_in_percent
         self.assertLessEqual(time_needed - allowed_deviation, time_needed_detailed)
 
+    def test_streaming_composition_memory(self):
+        class MeasuringStitcher(Stitcher):
+            def initialize_composition(self, corners, sizes):
+                super().initialize_composition(corners, sizes)
+                tracemalloc.reset_peak()
+                self.memory_before_composition, _ = tracemalloc.get_traced_memory()
+
+            def create_final_panorama(self):
+                _, peak_memory = tracemalloc.get_traced_memory()
+                self.composition_memory = peak_memory - self.memory_before_composition
+                return super().create_final_panorama()
+
+        test_imgs = [
+            test_input("boat5.jpg"),
+            test_input("boat2.jpg"),
+            test_input("boat3.jpg"),
+            test_input("boat4.jpg"),
+            test_input("boat1.jpg"),
+            test_input("boat6.jpg"),
+        ]
+
+        composition_memory = {}
+        for nr_imgs in (3, 6):
+            tracemalloc.start()
+            stitcher = MeasuringStitcher(crop=False, composition_frames=1)
+            stitcher.stitch(test_imgs[:nr_imgs])
+            tracemalloc.stop()
+            composition_memory[nr_imgs] = stitcher.composition_memory
+
+        # the frames are composed one by one, so twice the images must not
+        # need (much) more memory while blending
+        allowed_deviation_in_percent = 10
+        allowed_deviation = composition_memory[3] / 100 * allowed_deviation_in_percent
+        self.assertLessEqual(
+            composition_memory[6], composition_memory[3] + allowed_deviation
+        )
+
 
 def starttest():
     unittest.main()
@@ -0,0 +1,59 @@
+import threading
+import time
+import unittest
+
+from .context import Pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_order_and_stats(self):
+        pipeline = Pipeline([("double", lambda x: 2 * x), ("inc", lambda x: x + 1)])
+        self.assertEqual(list(pipeline.run(range(10))), [2 * x + 1 for x in range(10)])
+        summary = pipeline.summary()
+        for stage in ("source", "double", "inc", "consumer"):
+            self.assertEqual(summary[stage]["count"], 10)
+
+    def test_backpressure(self):
+        produced = []
+        lock = threading.Lock()
+
+        def items():
+            for i in range(20):
+                with lock:
+                    produced.append(i)
+                yield i
+
+        pipeline = Pipeline([("a", lambda x: x), ("b", lambda x: x)], queue_size=1)
+        for i in pipeline.run(items()):
+            time.sleep(0.01)
+            with lock:
+                # source, 2 stages and 3 queues hold at most 6 items
+                self.assertLessEqual(len(produced) - i, 7)
+
+    def test_exception(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError("stage failed")
+            return x
+
+        pipeline = Pipeline([("fail", fail)])
+        results = []
+        with self.assertRaises(ValueError):
+            for x in pipeline.run(range(10)):
+                results.append(x)
+        self.assertEqual(results, [0, 1, 2])
+
+    def test_early_close(self):
+        pipeline = Pipeline([("identity", lambda x: x)])
+        results = pipeline.run(iter(range(1000)))
+        self.assertEqual(next(results), 0)
+        results.close()
+        self.assertLess(pipeline.stats["source"].count, 10)
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
@@ -0,0 +1,81 @@
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from .context import Profiler
+
+
+class Composer:
+    def run(self, n):
+        imgs = [np.zeros((10, 20, 3), np.uint8) for _ in range(n)]
+        return sum(img.shape[0] for img in self.frames(self.double(imgs)))
+
+    def double(self, imgs):
+        return imgs + imgs
+
+    def frames(self, imgs):
+        for img in imgs:
+            yield img
+
+
+class TestProfiler(unittest.TestCase):
+    def test_disabled(self):
+        composer = Composer()
+        Profiler().instrument(composer, "run", ["double", "frames"])
+        self.assertEqual(vars(composer), {})
+
+    def test_profile(self):
+        composer = Composer()
+        profiler = Profiler(enabled=True, trace_memory=True)
+        profiler.instrument(composer, "run", ["double", "frames"])
+        # instrumenting again must not wrap the wrappers
+        profiler.instrument(composer, "run", ["double", "frames"])
+        self.assertEqual(composer.run(2), 40)
+
+        summary = profiler.summary()
+        self.assertEqual(list(summary), ["run", "double", "frames"])
+        self.assertEqual(summary["run"]["calls"], 1)
+        self.assertEqual(summary["double"]["images_in"], 2)
+        self.assertEqual(summary["double"]["images_out"], 4)
+        self.assertEqual(summary["frames"]["calls"], 4)
+        self.assertEqual(summary["frames"]["pixels_out"], 4 * 200)
+        self.assertGreater(summary["run"]["memory_peak_mb"], 0)
+        self.assertEqual({r["depth"] for r in profiler.records}, {0, 1})
+        # the process peak only grows, each call records its share
+        for record in profiler.records:
+            self.assertGreaterEqual(record["rss_peak_growth_mb"], 0)
+        self.assertGreaterEqual(
+            summary["run"]["process_rss_peak_mb"], summary["run"]["rss_peak_growth_mb"]
+        )
+
+        composer.run(1)
+        self.assertEqual(profiler.summary()["frames"]["calls"], 2)
+
+    def test_export(self):
+        composer = Composer()
+        profiler = Profiler(enabled=True)
+        profiler.instrument(composer, "run", ["double", "frames"])
+        composer.run(1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            report = os.path.join(tmp_dir, "profile.json")
+            profiler.save_json(report)
+            with open(report) as file:
+                self.assertEqual(len(json.load(file)["records"]), 4)
+
+            trace = os.path.join(tmp_dir, "trace.json")
+            profiler.save_chrome_trace(trace)
+            with open(trace) as file:
+                events = json.load(file)["traceEvents"]
+            self.assertEqual({e["name"] for e in events}, {"run", "double", "frames"})
+            self.assertTrue(all(e["ph"] == "X" for e in events))
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from .context import SeamFinder
+
+
+class TestSeamFinder(unittest.TestCase):
+    def test_extract_seam_lines(self):
+        blended_seam_masks = np.zeros((60, 80, 3), np.uint8)
+        blended_seam_masks[10:50, 5:40] = (255, 0, 0)
+        blended_seam_masks[10:50, 40:75] = (0, 0, 255)
+
+        seam_lines = SeamFinder.extract_seam_lines(blended_seam_masks)
+
+        # only the line between the two masks, not their outer edges
+        rows, cols = seam_lines.nonzero()
+        self.assertTrue(set(cols) <= {39, 40})
+        self.assertEqual((rows.min(), rows.max()), (11, 48))
+
+    def test_extract_seam_lines_at_the_border(self):
+        # as before the vectorization: the image border does not count as
+        # black below and right of the panorama, the wrapped around last
+        # row and column do above and left of it
+        blended_seam_masks = np.zeros((40, 40, 3), np.uint8)
+        blended_seam_masks[:, :20] = (255, 0, 0)
+        blended_seam_masks[:, 20:] = (0, 0, 255)
+
+        rows, _ = SeamFinder.extract_seam_lines(blended_seam_masks).nonzero()
+        self.assertEqual((rows.min(), rows.max()), (0, 39))
+
+        blended_seam_masks[-1] = 0
+        rows, _ = SeamFinder.extract_seam_lines(blended_seam_masks).nonzero()
+        self.assertEqual((rows.min(), rows.max()), (1, 37))
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
@@ -1,12 +1,15 @@
 import os
+import tempfile
 import unittest
 from datetime import datetime
 
+import cv2 as cv
 import numpy as np
 
 from .context import (
     VERBOSE_DIR,
     AffineStitcher,
+    Images,
     Stitcher,
     StitchingError,
     StitchingWarning,
@@ -271,6 +274,189 @@ class TestStitcher(unittest.TestCase):
             )
         self.assertTrue(str(cm.exception).startswith(expected_error_message))
 
+    def test_image_cache_dir(self):
+        imgs = [test_input("s1.jpg"), test_input("s2.jpg")]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stitcher = Stitcher(cache_dir=cache_dir, crop=False)
+            cv.setRNGSeed(0)
+            result = stitcher.stitch(imgs)
+            self.assertGreater(stitcher.image_cache.disk_hits, 0)
+            # the spilled images are removed after each stitch
+            self.assertEqual(os.listdir(cache_dir), [])
+        cv.setRNGSeed(0)
+        np.testing.assert_array_equal(result, Stitcher(crop=False).stitch(imgs))
+
+    def test_image_cache_of_reduced_decoding(self):
+        # the medium pass alone would decode these JPEGs reduced, with a cache
+        # it decodes them once for the final pass as well
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            imgs = []
+            for name in ("s1", "s2"):
+                imgs.append(os.path.join(tmp_dir, name + ".jpg"))
+                img = load_test_img(name + ".jpg")
+                cv.imwrite(imgs[-1], cv.resize(img, None, fx=3, fy=3))
+            stitcher = Stitcher(cache_megabytes=500, crop=False)
+            stitcher.stitch(imgs)
+            self.assertEqual(stitcher.image_cache.misses, 2)
+            self.assertEqual(stitcher.image_cache.hits, 2)
+
+            # a cache too small to keep them until the final pass is bypassed
+            stitcher = Stitcher(cache_megabytes=1, crop=False)
+            stitcher.stitch(imgs)
+            self.assertEqual(stitcher.image_cache.misses, 0)
+            self.assertEqual(stitcher.image_cache.memory_bytes, 0)
+
+    def test_feature_cache(self):
+        imgs = [test_input("s?.jpg")]
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stitcher = Stitcher(feature_cache_dir=cache_dir, crop=False)
+            stitcher.stitch(imgs)
+            self.assertEqual(stitcher.feature_cache.misses, 2)
+
+            stitcher = Stitcher(
+                feature_cache_dir=cache_dir, warper_type="cylindrical", crop=False
+            )
+            stitcher.stitch(imgs)
+            self.assertEqual(stitcher.feature_cache.hits, 2)
+            self.assertEqual(stitcher.feature_cache.misses, 0)
+
+            # other matcher settings reuse the features but not the matches
+            stitcher = Stitcher(feature_cache_dir=cache_dir, match_conf=0.5, crop=False)
+            stitcher.stitch(imgs)
+            self.assertEqual(stitcher.feature_cache.hits, 1)
+            self.assertEqual(stitcher.feature_cache.misses, 1)
+
+    def test_match_cache_of_other_image_set(self):
+        # whether a pair is matched depends on the image set, the pairs cached
+        # for a superset must not leave a pair of a subset unmatched
+        settings = {"pair_selection": "sequential", "pair_window": 1}
+        imgs = [test_input("weir_1.jpg"), test_input("weir_2.jpg")]
+        imgs.append(test_input("weir_3.jpg"))
+        subset = [imgs[0], imgs[2]]
+
+        def get_matches(stitcher, imgs):
+            stitcher.images = Images.of(imgs)
+            stitcher.set_cache_keys()
+            features = stitcher.find_features(stitcher.resize_medium_resolution())
+            # the matcher draws random numbers, every pair is matched alike
+            cv.setRNGSeed(0)
+            return stitcher.match_features(features)
+
+        expected = get_matches(Stitcher(**settings), subset)
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stitcher = Stitcher(feature_cache_dir=cache_dir, **settings)
+            get_matches(stitcher, imgs)
+            matches = get_matches(stitcher, subset)
+            self.assertEqual(stitcher.feature_cache.misses, 2)
+            matches_from_cache = get_matches(stitcher, subset)
+            self.assertEqual(stitcher.feature_cache.hits, 1)
+
+        for result in (matches, matches_from_cache):
+            self.assertEqual(
+                [(m.src_img_idx, m.dst_img_idx) for m in result],
+                [(m.src_img_idx, m.dst_img_idx) for m in expected],
+            )
+            np.testing.assert_allclose(
+                [m.confidence for m in result], [m.confidence for m in expected]
+            )
+            self.assertEqual(
+                [m.num_inliers for m in result], [m.num_inliers for m in expected]
+            )
+
+    def test_deprecated_final_resolution_methods(self):
+        imgs = [test_input("s1.jpg"), test_input("s2.jpg")]
+        stitcher = Stitcher(crop=False)
+        expected = stitcher.stitch(imgs)
+        model = stitcher.calibration
+
+        # the final resolution composition before it was streamed
+        stitcher.images = Images.of(imgs)
+        stitcher.images.subset(model.indices)
+        with self.assertWarns(DeprecationWarning):
+            imgs = stitcher.resize_final_resolution()
+            imgs, masks, corners, sizes = stitcher.warp_final_resolution(
+                imgs, model.cameras
+            )
+            imgs, masks, corners, sizes = stitcher.crop_final_resolution(
+                imgs, masks, corners, sizes
+            )
+            stitcher.set_masks(masks)
+            imgs = stitcher.compensate_exposure_errors(corners, imgs)
+            seam_masks = stitcher.resize_seam_masks(model.seam_masks)
+            stitcher.initialize_composition(corners, sizes)
+            stitcher.blend_images(imgs, seam_masks, corners)
+        np.testing.assert_array_equal(stitcher.create_final_panorama(), expected)
+
+    def test_rig_model(self):
+        imgs = [test_input("s1.jpg"), test_input("s2.jpg")]
+        stitcher = Stitcher(crop=False)
+        result = stitcher.stitch(imgs)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            rig_model = os.path.join(tmp_dir, "rig.npz")
+            stitcher.calibration.save(rig_model)
+
+            stitcher = Stitcher(crop=False, rig_model=rig_model)
+            np.testing.assert_array_equal(stitcher.stitch(imgs), result)
+
+            stitcher = Stitcher(crop=False, rig_model=rig_model, rig_drift_threshold=5)
+            np.testing.assert_array_equal(stitcher.stitch(imgs), result)
+
+            stitcher = Stitcher(rig_model=rig_model)
+            with self.assertRaisesRegex(StitchingError, "other settings: crop"):
+                stitcher.stitch(imgs)
+
+    def test_rig_model_of_unprobed_images(self):
+        # the sizes of TIFFs are not probed from their header
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            imgs = []
+            for name in ("s1", "s2"):
+                imgs.append(os.path.join(tmp_dir, name + ".tif"))
+                cv.imwrite(imgs[-1], load_test_img(name + ".jpg"))
+            stitcher = Stitcher(crop=False)
+            result = stitcher.stitch(imgs)
+            model = stitcher.calibration
+
+            for threshold in (None, 5):
+                stitcher = Stitcher(
+                    crop=False, rig_model=model, rig_drift_threshold=threshold
+                )
+                np.testing.assert_array_equal(stitcher.stitch(imgs), result)
+
+    def test_pipelined_composition(self):
+        imgs = [test_input("s1.jpg"), test_input("s2.jpg")]
+        stitcher = Stitcher()
+        result = stitcher.stitch(imgs)
+
+        stitcher = Stitcher(pipelined_composition=True, rig_model=stitcher.calibration)
+        np.testing.assert_array_equal(stitcher.stitch(imgs), result)
+        summary = stitcher.composition_pipeline.summary()
+        for stage in ("decode", "resize", "warp", "crop", "compensate", "feed"):
+            self.assertEqual(summary[stage]["count"], 2)
+
+    def test_profiler(self):
+        stitcher = Stitcher(profile=True)
+        stitcher.stitch([test_input("s1.jpg"), test_input("s2.jpg")])
+
+        summary = stitcher.profiler.summary()
+        self.assertEqual(summary["stitch"]["calls"], 1)
+        self.assertEqual(summary["find_features"]["images_in"], 2)
+        # the lazily composed frames are recorded one by one
+        self.assertEqual(summary["prepare_final_resolution_frames"]["calls"], 2)
+        self.assertEqual(summary["resize_final_resolution"]["calls"], 2)
+        self.assertEqual(summary["resize_final_resolution"]["images_out"], 2)
+        self.assertGreater(summary["blend_images"]["wall_s"], 0)
+
+        stitcher = Stitcher(profile=True, pipelined_composition=True)
+        stitcher.stitch([test_input("s1.jpg"), test_input("s2.jpg")])
+        summary = stitcher.profiler.summary()
+        self.assertEqual(summary["compose_final_resolution"]["calls"], 2)
+        self.assertEqual(summary["pipeline_final_resolution_frames"]["calls"], 2)
+        self.assertNotIn("prepare_final_resolution_frames", summary)
+
+        stitcher = Stitcher()
+        self.assertNotIn("stitch", vars(stitcher))
+
     def test_use_of_a_stitcher_for_multiple_image_sets(self):
         # the scale should not be fixed by the first run but set dynamically
         # based on every input image set.
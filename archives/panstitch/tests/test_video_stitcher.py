@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+import cv2 as cv
+import numpy as np
+
+from .context import Stitcher, StitchingError, VideoStitcher, load_test_img
+
+
+class TestVideoStitcher(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.nr_frames = 6
+        cls.videos = []
+        for name in ("s1.jpg", "s2.jpg"):
+            img = load_test_img(name)
+            path = os.path.join(cls.tmp_dir.name, name.replace(".jpg", ".avi"))
+            size = (img.shape[1], img.shape[0])
+            writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*"MJPG"), 10, size)
+            for frame in range(cls.nr_frames):
+                writer.write(cv.add(img, frame))
+            writer.release()
+            cls.videos.append(path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def test_video_stitcher(self):
+        stitcher = Stitcher(crop=False, final_megapix=0.2)
+        video_stitcher = VideoStitcher(self.videos, stitcher, drop_policy="block")
+        panoramas = list(video_stitcher.stream())
+
+        self.assertEqual(len(panoramas), self.nr_frames)
+        self.assertTrue(all(p.shape == panoramas[0].shape for p in panoramas))
+        summary = video_stitcher.summary()
+        self.assertEqual(summary["blend"]["count"], self.nr_frames)
+        self.assertEqual(summary["capture"]["dropped"], 0)
+        self.assertGreater(summary["fps"], 0)
+
+        # the pipeline stitches like the stitcher itself, with the same calibration
+        frames = [load_test_img("s1.jpg"), load_test_img("s2.jpg")]
+        stitcher = Stitcher(
+            crop=False, final_megapix=0.2, rig_model=stitcher.calibration
+        )
+        expected = stitcher.stitch(frames)
+        video_stitcher.release()
+        np.testing.assert_allclose(
+            video_stitcher.stitch_frames(frames), expected, atol=1
+        )
+
+    def test_dropping_frames(self):
+        stitcher = Stitcher(crop=False, final_megapix=0.2)
+        video_stitcher = VideoStitcher(self.videos, stitcher, queue_size=1)
+        panoramas = list(video_stitcher.stream())
+
+        summary = video_stitcher.summary()
+        dropped = summary["capture"]["dropped"] + summary["warp"]["dropped"]
+        self.assertEqual(len(panoramas) + dropped, self.nr_frames)
+
+    def test_invalid_source(self):
+        video_stitcher = VideoStitcher(["missing1.avi", "missing2.avi"])
+        with self.assertRaises(StitchingError):
+            next(video_stitcher.stream())
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+
+import cv2 as cv
+import numpy as np
+
+from .context import Warper
+
+
+class TestWarper(unittest.TestCase):
+    def setUp(self):
+        self.camera = cv.detail.CameraParams()
+        self.camera.focal = 500.0
+        self.camera.aspect = 1.0
+        self.camera.ppx, self.camera.ppy = 160.0, 120.0
+        self.camera.R = cv.Rodrigues(np.array([0.05, 0.2, 0.01]))[0].astype(np.float32)
+        self.img = np.random.default_rng(0).integers(0, 256, (240, 320, 3), np.uint8)
+        self.size = (320, 240)
+
+    def warp_without_maps(self, img, interpolation, border_mode):
+        warper = cv.PyRotationWarper("spherical", 500.0)
+        K = Warper.get_K(self.camera)
+        return warper.warp(img, K, self.camera.R, interpolation, border_mode)[1]
+
+    def test_warp_maps(self):
+        warper = Warper()
+        warper.scale = 500.0
+
+        expected = self.warp_without_maps(self.img, cv.INTER_LINEAR, cv.BORDER_REFLECT)
+        np.testing.assert_array_equal(
+            warper.warp_image(self.img, self.camera), expected
+        )
+
+        mask = np.full((240, 320), 255, np.uint8)
+        expected = self.warp_without_maps(mask, cv.INTER_NEAREST, cv.BORDER_CONSTANT)
+        np.testing.assert_array_equal(
+            warper.create_and_warp_mask(self.size, self.camera), expected
+        )
+        self.assertEqual(warper.warp_roi(self.size, self.camera), (-54, 643, 312, 236))
+        self.assertEqual((warper.map_cache.misses, warper.map_cache.hits), (1, 2))
+
+    def test_persisted_warp_maps(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            warper = Warper(map_cache_megabytes=0, map_cache_dir=cache_dir)
+            warper.scale = 500.0
+            expected = warper.warp_image(self.img, self.camera)
+
+            warper = Warper(map_cache_dir=cache_dir)
+            warper.scale = 500.0
+            np.testing.assert_array_equal(
+                warper.warp_image(self.img, self.camera), expected
+            )
+            self.assertEqual(warper.map_cache.disk_hits, 1)
+
+
+def starttest():
+    unittest.main()
+
+
+if __name__ == "__main__":
+    starttest()
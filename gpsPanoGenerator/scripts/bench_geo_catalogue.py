@@ -0,0 +1,97 @@
+# bench_geo_catalogue.py
+# Perry Chien, Husky Robotics, PY 2024
+# Scans a folder of geotagged images into a GeoCatalogue and times radius,
+# nearest neighbour and bounding box queries, checking them against a brute
+# force haversine search over all positions.
+#
+# Usage: python scripts/bench_geo_catalogue.py [nr_images] [nr_queries]
+
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.gps.geo_catalogue import EARTH_RADIUS, GeoCatalogue
+from src.image_processing.imgdata import get_gps_location, tag_gps_locations
+
+def haversine(lat, lng, lats, lngs):
+    lat, lng, lats, lngs = (np.deg2rad(v) for v in (lat, lng, lats, lngs))
+    a = np.sin((lats - lat) / 2) ** 2 + np.cos(lat) * np.cos(lats) * np.sin((lngs - lng) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+def timed(function, queries):
+    start = time.perf_counter()
+    results = [function(*query) for query in queries]
+    return results, (time.perf_counter() - start) * 1e6 / len(queries)
+
+def main():
+    nr_images = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    nr_queries = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = np.random.default_rng(0)
+    # a field day: images scattered over a few km around the site
+    lats = 51.45 + rng.normal(0, 0.01, nr_images)
+    lngs = -112.71 + rng.normal(0, 0.015, nr_images)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        img = rng.integers(0, 256, (120, 160, 3), np.uint8)
+        files = [os.path.join(tmp_dir, f'{idx}.jpg') for idx in range(nr_images)]
+        for f in files:
+            cv2.imwrite(f, img)
+        tag_gps_locations([(f, lat, lng, 700.0, None) for f, lat, lng in zip(files, lats, lngs)],
+                          fsync_batch=0)
+
+        start = time.perf_counter()
+        for f in files:
+            get_gps_location(f)
+        print(f"get_gps_location per file:  {(time.perf_counter() - start) * 1000:8.1f} ms")
+        catalogue = GeoCatalogue()
+        start = time.perf_counter()
+        catalogue.scan(tmp_dir)
+        catalogue.build()
+        print(f"GeoCatalogue.scan + build:  {(time.perf_counter() - start) * 1000:8.1f} ms, {len(catalogue)} images")
+
+        start = time.perf_counter()
+        rescanned = catalogue.scan(tmp_dir)
+        print(f"rescan, nothing changed:    {(time.perf_counter() - start) * 1000:8.1f} ms, {rescanned} added")
+
+        positions = np.column_stack((lats, lngs))
+        queries = positions[rng.integers(0, nr_images, nr_queries)] + rng.normal(0, 0.002, (nr_queries, 2))
+        index = {f: idx for idx, f in enumerate(files)}
+
+        results, us = timed(lambda lat, lng: catalogue.within(lat, lng, 250), queries)
+        mismatches = sum(sorted(index[p] for p, _ in result)
+                         != sorted(np.flatnonzero(haversine(lat, lng, lats, lngs) <= 250))
+                         for result, (lat, lng) in zip(results, queries))
+        print(f"within 250 m:               {us:8.1f} us/query, "
+              f"{np.mean([len(r) for r in results]):.1f} images, {mismatches} mismatches")
+
+        results, us = timed(lambda lat, lng: catalogue.nearest(lat, lng, 8), queries)
+        mismatches = sum([index[p] for p, _ in result] != list(np.argsort(haversine(lat, lng, lats, lngs))[:8])
+                         for result, (lat, lng) in zip(results, queries))
+        print(f"8 nearest:                  {us:8.1f} us/query, {mismatches} mismatches")
+
+        boxes = [(lat - 0.003, lng - 0.005, lat + 0.003, lng + 0.005) for lat, lng in queries]
+        results, us = timed(catalogue.in_bbox, boxes)
+        mismatches = sum(sorted(index[p] for p in result)
+                         != list(np.flatnonzero((lats >= s) & (lats <= n) & (lngs >= w) & (lngs <= e)))
+                         for result, (s, w, n, e) in zip(results, boxes))
+        print(f"bounding box:               {us:8.1f} us/query, {mismatches} mismatches")
+
+        start = time.perf_counter()
+        for idx in range(200):
+            catalogue.add(f'new-{idx}.jpg', lats[idx] + 1e-4, lngs[idx])
+        print(f"incremental add:            {(time.perf_counter() - start) * 1e6 / 200:8.1f} us/image")
+        _, us = timed(lambda lat, lng: catalogue.within(lat, lng, 250), queries)
+        print(f"within 250 m, after adds:   {us:8.1f} us/query")
+
+        start = time.perf_counter()
+        groups = catalogue.stitch_candidates(30)
+        print(f"stitch candidates (30 m):   {(time.perf_counter() - start) * 1000:8.1f} ms, {len(groups)} groups")
+
+if __name__ == '__main__':
+    main()
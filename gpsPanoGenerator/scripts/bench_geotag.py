@@ -0,0 +1,114 @@
+# bench_geotag.py
+# Perry Chien, Husky Robotics, PY 2024
+# Records a synthetic drive replayed by the fake gpsd (from a generated NMEA
+# log) with the GPSRecorder, then geotags a folder of images by their capture
+# times in one pass. Compares against one gpsd connection and query per shot,
+# and checks the interpolated positions against the true ones.
+#
+# Usage: python scripts/bench_geotag.py [nr_images]
+
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import piexif
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from fake_gpsd import FakeGPSD
+from src.gps.gps_track import GPSRecorder, GPSTrack, geotag_images
+from src.image_processing.imgdata import load_exif
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'scratched-cam',
+                      'WIN_20241002_19_15_25_Pro.jpg')
+START = datetime(2024, 6, 1, 15, 0, 0, tzinfo=timezone.utc).timestamp()
+
+def drive(t):
+    # true position of the rover at POSIX time t: 1 m/s north-east, slowly climbing
+    seconds = np.asarray(t) - START
+    return 51.4 + seconds * 6.4e-6, -112.7 + seconds * 1.0e-5, 700 + seconds * 0.01
+
+def nmea_sentence(body):
+    checksum = 0
+    for char in body:
+        checksum ^= ord(char)
+    return f"${body}*{checksum:02X}"
+
+def nmea_log(nr_fixes):
+    lines = []
+    for idx in range(nr_fixes):
+        t = START + idx
+        lat, lng, alt = drive(t)
+        utc = datetime.fromtimestamp(t, timezone.utc)
+        hhmmss = utc.strftime('%H%M%S.00')
+        lat_field = f"{int(abs(lat)):02d}{abs(lat) % 1 * 60:07.4f},{'N' if lat >= 0 else 'S'}"
+        lng_field = f"{int(abs(lng)):03d}{abs(lng) % 1 * 60:07.4f},{'E' if lng >= 0 else 'W'}"
+        lines.append(nmea_sentence(f"GPGGA,{hhmmss},{lat_field},{lng_field},1,08,0.9,{alt:.1f},M,0.0,M,,"))
+        lines.append(nmea_sentence(f"GPRMC,{hhmmss},A,{lat_field},{lng_field},0.0,0.0,{utc:%d%m%y},,,A"))
+    return lines
+
+def query_per_shot(port, nr_images):
+    # what get_real_time_gps does: connect to gpsd and ask for the current fix for every image
+    for _ in range(nr_images):
+        with socket.create_connection(('127.0.0.1', port)) as sock:
+            f = sock.makefile('rwb')
+            f.readline()
+            f.write(b'?POLL;\n')
+            f.flush()
+            json.loads(f.readline())
+
+def main():
+    nr_images = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    nr_fixes = 600
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        log = os.path.join(tmp_dir, 'drive.nmea')
+        with open(log, 'w') as f:
+            f.write('\n'.join(nmea_log(nr_fixes)))
+        with open(log) as f:
+            fixes = list(GPSTrack.from_nmea(f).fixes())
+
+        with FakeGPSD(fixes) as gpsd:
+            start = time.perf_counter()
+            query_per_shot(gpsd.port, nr_images)
+            print(f"gpsd connection + query per shot: {(time.perf_counter() - start) * 1000 / nr_images:.2f} ms/image")
+
+        with FakeGPSD(fixes, rate=None) as gpsd:
+            recorder = GPSRecorder(GPSTrack(nr_fixes), port=gpsd.port)
+            with recorder:
+                while len(recorder.track) < nr_fixes or recorder.latest()[0] < fixes[-1][0]:
+                    time.sleep(0.01)
+            print(f"recorded {len(recorder.track)} fixes")
+
+        rng = np.random.default_rng(0)
+        times = np.sort(rng.uniform(START, START + nr_fixes - 1, nr_images))
+        files = []
+        for idx, t in enumerate(times):
+            files.append(os.path.join(tmp_dir, f'{idx}.jpg'))
+            shutil.copy(SOURCE, files[-1])
+            taken = datetime.fromtimestamp(t, timezone.utc)
+            exif = {'Exif': {piexif.ExifIFD.DateTimeOriginal: taken.strftime('%Y:%m:%d %H:%M:%S'),
+                             piexif.ExifIFD.SubSecTimeOriginal: f"{taken.microsecond // 1000:03d}"}}
+            piexif.insert(piexif.dump(exif), files[-1])
+
+        stats = geotag_images(files, recorder.track)
+        print(f"geotag_images: {stats['seconds'] * 1000 / nr_images:.2f} ms/image "
+              f"({stats['images_per_s']:.1f} images/s), {len(stats['untagged'])} untagged")
+
+        errors = []
+        for f, t in zip(files, times):
+            gps = load_exif(f)['GPS']
+            lat = sum(n / d / 60 ** i for i, (n, d) in enumerate(gps[piexif.GPSIFD.GPSLatitude]))
+            lng = -sum(n / d / 60 ** i for i, (n, d) in enumerate(gps[piexif.GPSIFD.GPSLongitude]))
+            true_lat, true_lng, _ = drive(t)
+            errors.append(max(abs(lat - true_lat), abs(lng - true_lng)))
+        print(f"max position error: {max(errors) * 111e3:.3f} m")
+
+if __name__ == '__main__':
+    main()
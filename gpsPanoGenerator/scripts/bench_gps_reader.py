@@ -0,0 +1,65 @@
+# bench_gps_reader.py
+# Perry Chien, Husky Robotics, PY 2024
+# Compares reading the GPS positions of a large folder of camera images with
+# piexif.load (what get_gps_location does) against read_gps and the cached
+# GPSReader.read_many, cold and warm, and checks that they agree.
+#
+# Usage: python scripts/bench_gps_reader.py [nr_images] [source jpg]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import piexif
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.image_processing.gps_reader import GPSReader, read_gps
+from src.image_processing.imgdata import gps_to_decimal, tag_gps_locations
+
+# a phone image, with the full camera EXIF data and a thumbnail
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'chalkboard',
+                      '20240113_143849.jpg')
+
+def report(name, seconds, nr_images):
+    print(f"{name:32} {seconds * 1e6 / nr_images:8.1f} us/image {nr_images / seconds:10.0f} images/s")
+
+def main():
+    nr_images = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    source = sys.argv[2] if len(sys.argv) > 2 else SOURCE
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = [os.path.join(tmp_dir, f'{idx}.jpg') for idx in range(nr_images)]
+        for f in files:
+            # hard links, the folder would otherwise take nr_images times the image size
+            try:
+                os.link(source, f)
+            except OSError:
+                shutil.copy(source, f)
+        # tagging rewrites each file, so they become independent copies
+        tag_gps_locations([(f, *rng.uniform((-60, -180, -100), (60, 180, 3000)), None) for f in files],
+                          fsync_batch=0)
+
+        start = time.perf_counter()
+        expected = [gps_to_decimal(piexif.load(f)['GPS']) for f in files]
+        report("piexif.load + gps_to_decimal", time.perf_counter() - start, nr_images)
+
+        start = time.perf_counter()
+        positions = [read_gps(f) for f in files]
+        report("read_gps", time.perf_counter() - start, nr_images)
+        assert positions == expected
+
+        reader = GPSReader()
+        for name in ("GPSReader.read_many, cold", "GPSReader.read_many, cached"):
+            start = time.perf_counter()
+            positions = reader.read_many(files)
+            report(name, time.perf_counter() - start, nr_images)
+            assert np.array_equal(positions, np.array(expected))
+        print(f"cache: {reader.hits} hits, {reader.misses} misses")
+
+if __name__ == '__main__':
+    main()
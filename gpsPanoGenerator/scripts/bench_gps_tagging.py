@@ -0,0 +1,56 @@
+# bench_gps_tagging.py
+# Perry Chien, Husky Robotics, PY 2024
+# Compares tagging a folder of images one by one as GPSHandler.write_gps does
+# (set_gps_location rewriting every file, then reading it back) against the batch
+# tag_gps_locations, on the first pass (APP1 rewritten with spare room) and on a
+# re-tag (APP1 edited in place).
+#
+# Usage: python scripts/bench_gps_tagging.py [nr_images] [source jpg]
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.image_processing.imgdata import get_gps_location, set_gps_location, tag_gps_locations
+
+SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'chalkboard',
+                      '20240113_143849.jpg')
+
+def copy_images(source, tmp_dir, nr_images):
+    files = []
+    for idx in range(nr_images):
+        files.append(os.path.join(tmp_dir, f'{idx}.jpg'))
+        shutil.copy(source, files[-1])
+    return files
+
+def report(name, seconds, nr_images):
+    print(f"{name:36} {seconds:7.2f} s {nr_images / seconds:8.1f} images/s")
+
+def main():
+    nr_images = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    source = sys.argv[2] if len(sys.argv) > 2 else SOURCE
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = copy_images(source, tmp_dir, nr_images)
+        start = time.perf_counter()
+        for idx, f in enumerate(files):
+            set_gps_location(f, 47.6062 + idx * 1e-5, -122.3321, 15.0)
+            get_gps_location(f)
+        report("set_gps_location per image", time.perf_counter() - start, nr_images)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = copy_images(source, tmp_dir, nr_images)
+        records = [(f, 47.6062 + idx * 1e-5, -122.3321, 15.0, 1700000000 + idx)
+                   for idx, f in enumerate(files)]
+        for name in ("tag_gps_locations, first pass", "tag_gps_locations, re-tag"):
+            stats = tag_gps_locations(records)
+            report(name, stats['seconds'], nr_images)
+            print(f"{'':36} {stats['in_place']} in place, {stats['rewritten']} rewritten, "
+                  f"{len(stats['failed'])} failed")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+# bench_overlay.py
+# Perry Chien, Husky Robotics, PY 2024
+# Times rendering the GPS text overlay the way create_text_image used to
+# (font loaded from disk and text rasterised on every call) against the font,
+# text image and glyph caches, and checks that the images are identical.
+#
+# Usage: python scripts/bench_overlay.py [nr_stamps]
+
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.image_processing import overlay
+
+def create_text_image_uncached(inputtext, width, color):
+    # create_text_image before the caches
+    fontsize = int(width * 1 / 10)
+    numlines = 1
+    if len(inputtext) * fontsize >= width:
+        text = ""
+        count = 0
+        for word in inputtext.split():
+            count += len(word) + 1
+            if -1 + count * fontsize * 0.5 > width:
+                text += '\n'
+                count = len(word) + 1
+                numlines += 1
+            text += word + " "
+    else:
+        text = inputtext
+    height = int((numlines + 0.5) * fontsize)
+    img = Image.new('RGBA', (width, height), (255, 255, 255, 0))
+    font = ImageFont.truetype(overlay.BUNDLED_FONT, fontsize)
+    draw = ImageDraw.Draw(img)
+
+    draw.text((0, 0), text, font=font, fill=color)
+    return img
+
+def timed(name, function, texts, width):
+    start = time.perf_counter()
+    for text in texts:
+        function(text, width, overlay.WHITE)
+    seconds = time.perf_counter() - start
+    print(f"{name:40} {seconds * 1e6 / len(texts):8.1f} us/stamp")
+
+def check(texts, width):
+    for text in texts:
+        expected = create_text_image_uncached(text, width, overlay.WHITE)
+        image = overlay.create_text_image(text, width, overlay.WHITE)
+        assert np.array_equal(np.asarray(expected), np.asarray(image)), text
+
+def main():
+    nr_stamps = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    width = int(overlay.RELATIVE_TEXT_SIZE * 4000)  # a 4000 px wide panorama
+    rng = np.random.default_rng(0)
+    # a rover track: each coordinate string repeats for the frames taken at one spot
+    lats = 51.45 + np.repeat(rng.normal(0, 0.01, nr_stamps // 10), 10)
+    lngs = -112.71 + np.repeat(rng.normal(0, 0.01, nr_stamps // 10), 10)
+    texts = [f"{lat:.2f}° N, {-lng:.2f}° W" for lat, lng in zip(lats, lngs)]
+    unique = [f"{51 + i * 1e-4:.4f}° N, {112 + i * 1e-4:.4f}° W" for i in range(nr_stamps)]
+
+    timed("font from disk + rasterise", create_text_image_uncached, texts, width)
+    # overlayText uses the cached image directly, create_text_image returns a copy
+    timed("render_text_image, repeated coordinates", overlay.render_text_image, texts, width)
+    timed("create_text_image, repeated coordinates", overlay.create_text_image, texts, width)
+    print(overlay.render_text_image.cache_info())
+
+    overlay.render_text_image.cache_clear()
+    timed("font from disk + rasterise, unique", create_text_image_uncached, unique, width)
+    timed("glyphs, unique coordinates", overlay.render_text_image, unique, width)
+
+    overlay.render_text_image.cache_clear()
+    check(texts[::10] + unique[:100], width)
+    print("cached and glyph images identical to rasterised ones")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+# bench_undistort.py
+# Perry Chien, Husky Robotics, PY 2024
+# Compares undistorting a folder of images the way script-calib.py used to
+# (getOptimalNewCameraMatrix + cv2.undistort per image) against the table
+# driven Undistorter, sequential and as parallel batch.
+#
+# Usage: python scripts/bench_undistort.py [nr_images] [WIDTHxHEIGHT]
+
+import os
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.calibration.undistortion import Undistorter
+
+def undistort_per_image(files, camera_matrix, dist_coeffs):
+    images = []
+    for f in files:
+        img = cv2.imread(f)
+        h, w = img.shape[:2]
+        new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (w, h), 1, (w, h))
+        undistorted_img = cv2.undistort(img, camera_matrix, dist_coeffs, None, new_camera_matrix)
+        x, y, w, h = roi
+        images.append(undistorted_img[y:y+h, x:x+w])
+    return images
+
+def report(name, seconds, nr_images):
+    print(f"{name:40} {seconds * 1000 / nr_images:8.1f} ms/image {nr_images / seconds:8.1f} images/s")
+
+def main():
+    nr_images = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    width, height = (int(i) for i in (sys.argv[2] if len(sys.argv) > 2 else '1920x1080').split('x'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rng = np.random.default_rng(0)
+        files = []
+        for idx in range(nr_images):
+            img = cv2.resize(rng.integers(0, 256, (height // 16, width // 16, 3), np.uint8),
+                             (width, height), interpolation=cv2.INTER_CUBIC)
+            files.append(os.path.join(tmp_dir, f'{idx}.jpg'))
+            cv2.imwrite(files[-1], img)
+        calibration = os.path.join(tmp_dir, 'camera_calib.npz')
+        camera_matrix = np.array([[width, 0, width / 2], [0, width, height / 2], [0, 0, 1]], np.float64)
+        dist_coeffs = np.array([[-0.2, 0.05, 0, 0, 0]])
+        np.savez(calibration, camera_matrix=camera_matrix, dist_coeffs=dist_coeffs)
+        cache_dir = os.path.join(tmp_dir, 'calib_cache')
+
+        start = time.perf_counter()
+        expected = undistort_per_image(files, camera_matrix, dist_coeffs)
+        report("getOptimalNewCameraMatrix + undistort", time.perf_counter() - start, nr_images)
+
+        start = time.perf_counter()
+        undistorter = Undistorter(calibration, cache_dir=cache_dir)
+        images = [undistorter.undistort(cv2.imread(f)) for f in files]
+        report("Undistorter, sequential", time.perf_counter() - start, nr_images)
+
+        undistorter = Undistorter(calibration, cache_dir=cache_dir)
+        start = time.perf_counter()
+        images = undistorter.undistort_files(files)
+        report("Undistorter, batch (tables from disk)", time.perf_counter() - start, nr_images)
+        stats = undistorter.last_batch
+        print(f"batch only: {stats['ms_per_image']:.1f} ms/image, {stats['images_per_s']:.1f} images/s "
+              f"on {os.cpu_count()} cpus")
+
+        difference = max(int(np.abs(a.astype(int) - b).max()) for a, b in zip(expected, images))
+        print(f"max pixel difference to cv2.undistort: {difference}")
+
+if __name__ == '__main__':
+    main()
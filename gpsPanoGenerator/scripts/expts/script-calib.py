@@ -8,7 +8,6 @@
 
 import sys
 import cv2
-import numpy as np
 import os
 import numba
 from PIL import Image
@@ -16,6 +15,7 @@ from src.image_processing.overlay import overlayText
 from src.image_processing.imgdata import set_gps_location, get_gps_location
 from matplotlib import pyplot as plt
 from src.gps.gps_handler import GPSHandler
+from src.calibration.undistortion import Undistorter
 
 # disable Numba JIT caching (resolved debugger issue), check back later
 numba.config.DISABLE_JIT = True
@@ -59,21 +59,15 @@ files = [os.path.join(path, f) for f in os.listdir(path) if f.endswith('.jpg')]
 
 
 # EXTRA CAMERA CALIBRATION STEP
-# load calibration data
-calibration_data = np.load('camera_calib.npz')
-camera_matrix = calibration_data['camera_matrix']
-dist_coeffs = calibration_data['dist_coeffs']
-
-# load each image and calibrate each one based on the data
-images = []
-for f in files:
-    img = cv2.imread(f)
-    h, w = img.shape[:2]
-    new_camera_matrix, roi = cv2.getOptimalNewCameraMatrix(camera_matrix, dist_coeffs, (w, h), 1, (w, h))
-    undistorted_img = cv2.undistort(img, camera_matrix, dist_coeffs, None, new_camera_matrix)
-    x, y, w, h = roi
-    undistorted_img = undistorted_img[y:y+h, x:x+w]
-    images.append(undistorted_img)
+# load calibration data once, the remap tables are built once per image resolution
+# (and cached in calib_cache/ for the next runs), each image is then a single remap
+undistorter = Undistorter('camera_calib.npz', alpha=1, crop=True, cache_dir='calib_cache')
+
+# load each image and undistort them in parallel
+images = undistorter.undistort_files(files)
+stats = undistorter.last_batch
+print(f"Undistorted {stats['images']} images in {stats['seconds']:.2f} s "
+      f"({stats['ms_per_image']:.1f} ms/image, {stats['images_per_s']:.1f} images/s)")
 
 
 
@@ -0,0 +1,103 @@
+# fake_gpsd.py
+# Perry Chien, Husky Robotics, PY 2024
+# Stand-in for gpsd to test GPS recording without a receiver: replays the fixes
+# of an NMEA log as gpsd JSON TPV reports to every client that sends a WATCH,
+# and answers ?POLL; with the current fix (what gpsd.get_current() asks for).
+#
+# Usage: python scripts/fake_gpsd.py <NMEA log> [--port 2947] [--rate 1]
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.gps.gps_track import parse_nmea
+
+def tpv_report(fix):
+    t, lat, lng, alt = fix
+    timestamp = datetime.fromtimestamp(t, timezone.utc).isoformat(timespec='milliseconds')
+    return {'class': 'TPV', 'mode': 3, 'time': timestamp.replace('+00:00', 'Z'),
+            'lat': lat, 'lon': lng, 'altHAE': alt}
+
+class FakeGPSD:
+    # Serves the fixes, rate fixes per second (None as fast as possible), in a
+    # background thread. port 0 picks a free port, see self.port.
+
+    def __init__(self, fixes, host='127.0.0.1', port=0, rate=1.0, loop=False):
+        self.fixes = [tuple(float(v) for v in fix) for fix in fixes]
+        self.rate = rate
+        self.loop = loop
+        self.current = self.fixes[0] if self.fixes else None  # the fix ?POLL; answers with
+        fake = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                self.wfile.write(b'{"class":"VERSION","release":"fake","proto_major":3,"proto_minor":14}\n')
+                for command in self.rfile:
+                    if command.startswith(b'?WATCH'):
+                        fake.stream(self.wfile)
+                        return
+                    if command.startswith(b'?POLL'):
+                        tpv = [tpv_report(fake.current)] if fake.current is not None else []
+                        self.wfile.write(json.dumps({'class': 'POLL', 'tpv': tpv}).encode() + b'\n')
+
+        self.server = socketserver.ThreadingTCPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = None
+
+    def stream(self, wfile):
+        period = 1 / self.rate if self.rate else None
+        next_tick = time.perf_counter()
+        try:
+            while True:
+                for fix in self.fixes:
+                    self.current = fix
+                    wfile.write(json.dumps(tpv_report(fix)).encode() + b'\n')
+                    if period is not None:
+                        next_tick += period
+                        time.sleep(max(0, next_tick - time.perf_counter()))
+                if not self.loop:
+                    return
+        except (BrokenPipeError, ConnectionResetError, socket.timeout):
+            return
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description='Replays an NMEA log as gpsd.')
+    parser.add_argument('nmea')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2947)
+    parser.add_argument('--rate', type=float, default=1.0, help='fixes per second, 0 for no pacing')
+    parser.add_argument('--loop', action='store_true')
+    args = parser.parse_args()
+
+    with open(args.nmea) as f:
+        fixes = list(parse_nmea(f))
+    print(f"Serving {len(fixes)} fixes on {args.host}:{args.port}")
+    FakeGPSD(fixes, args.host, args.port, args.rate, args.loop).server.serve_forever()
+
+if __name__ == '__main__':
+    main()
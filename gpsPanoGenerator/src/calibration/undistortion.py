@@ -0,0 +1,139 @@
+# undistortion.py
+# Perry Chien, Husky Robotics, PY 2024
+# Table driven undistortion of images with the params saved by calibration.py.
+# The distortion model is evaluated once per image resolution into remap tables
+# (optionally cached on disk), every image afterwards is a single cv.remap.
+
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2 as cv
+import numpy as np
+
+# key names of the camera matrix and distortion coefficients in the .npz files
+# of calibration.py (camera_calib.npz) and of makeshiftStereoCam (calibration_params.npz)
+CALIBRATION_KEYS = (('camera_matrix', 'dist_coeffs'), ('mtx', 'dist'))
+
+def load_calibration(path):
+    # Returns the camera matrix and distortion coefficients of a calibration file.
+    with np.load(path) as data:
+        for matrix_key, dist_key in CALIBRATION_KEYS:
+            if matrix_key in data and dist_key in data:
+                return data[matrix_key], data[dist_key]
+    raise KeyError(f"No camera matrix and distortion coefficients in {path}")
+
+class Undistorter:
+    # Undistorts images with remap tables built once per (width, height).
+    # Parameters:
+    # - calibration_params: File path to saved camera calibration parameters.
+    # - alpha: Free scaling of getOptimalNewCameraMatrix, 0 keeps only valid
+    #   pixels, 1 keeps all source pixels (with black borders).
+    # - crop: Crops the undistorted images to the valid region of interest.
+    # - cache_dir: Optional directory the remap tables are saved to and loaded
+    #   from, so that later runs skip building them.
+    # - interpolation: Interpolation of cv.remap.
+
+    def __init__(self, calibration_params='camera_calib.npz', alpha=1, crop=True,
+                 cache_dir=None, interpolation=cv.INTER_LINEAR):
+        self.camera_matrix, self.dist_coeffs = load_calibration(calibration_params)
+        self.alpha = alpha
+        self.crop = crop
+        self.cache_dir = cache_dir
+        self.interpolation = interpolation
+        self.tables = {}  # (map1, map2, roi) per (width, height)
+        self.lock = threading.Lock()
+        self.last_batch = None
+
+    def get_tables(self, size):
+        # The remap tables and the valid roi (x, y, w, h) for the image size.
+        tables = self.tables.get(size)
+        if tables is None:
+            # only one thread builds the tables of a new size
+            with self.lock:
+                tables = self.tables.get(size)
+                if tables is None:
+                    tables = self.load_tables(size)
+                    if tables is None:
+                        tables = self.build_tables(size)
+                        self.save_tables(size, tables)
+                    self.tables[size] = tables
+        return tables
+
+    def build_tables(self, size):
+        new_camera_matrix, roi = cv.getOptimalNewCameraMatrix(
+            self.camera_matrix, self.dist_coeffs, size, self.alpha, size)
+        # fixed point tables (CV_16SC2) take half the memory of float maps and
+        # are what cv.undistort uses internally
+        map1, map2 = cv.initUndistortRectifyMap(
+            self.camera_matrix, self.dist_coeffs, None, new_camera_matrix, size, cv.CV_16SC2)
+        return map1, map2, tuple(int(i) for i in roi)
+
+    def cache_path(self, size):
+        # the file name depends on everything the tables are built from
+        digest = hashlib.sha1()
+        for array in (self.camera_matrix, self.dist_coeffs):
+            digest.update(np.ascontiguousarray(array, np.float64).tobytes())
+        digest.update(repr(self.alpha).encode())
+        return os.path.join(self.cache_dir,
+                            f"undistort_{size[0]}x{size[1]}_{digest.hexdigest()[:16]}.npz")
+
+    def load_tables(self, size):
+        if self.cache_dir is None:
+            return None
+        path = self.cache_path(size)
+        if not os.path.isfile(path):
+            return None
+        with np.load(path) as data:
+            return data['map1'], data['map2'], tuple(int(i) for i in data['roi'])
+
+    def save_tables(self, size, tables):
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        map1, map2, roi = tables
+        path = self.cache_path(size)
+        # written under a temporary name, so that a concurrent run never loads a partial file
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, map1=map1, map2=map2, roi=np.array(roi))
+        os.replace(tmp_path, path)
+
+    def undistort(self, img):
+        # Undistorts one image, cropped to the valid roi if crop is set.
+        map1, map2, roi = self.get_tables((img.shape[1], img.shape[0]))
+        undistorted = cv.remap(img, map1, map2, self.interpolation)
+        if self.crop:
+            x, y, w, h = roi
+            undistorted = undistorted[y:y+h, x:x+w]
+        return undistorted
+
+    def undistort_many(self, imgs, workers=None):
+        # Undistorts a batch of images in parallel (cv.remap releases the GIL).
+        # Returns the undistorted images in the order of imgs.
+        return self._run_batch(self.undistort, imgs, workers)
+
+    def undistort_files(self, files, workers=None):
+        # Reads and undistorts a batch of image files in parallel, decoding
+        # overlaps with remapping. Returns the undistorted images in the order of files.
+        def read_and_undistort(file):
+            img = cv.imread(file)
+            if img is None:
+                raise IOError(f"Cannot read image {file}")
+            return self.undistort(img)
+        return self._run_batch(read_and_undistort, files, workers)
+
+    def _run_batch(self, function, items, workers):
+        items = list(items)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(function, items))
+        seconds = time.perf_counter() - start
+        self.last_batch = {
+            'images': len(items),
+            'seconds': seconds,
+            'ms_per_image': seconds * 1000 / len(items) if items else 0.0,
+            'images_per_s': len(items) / seconds if seconds > 0 else 0.0,
+        }
+        return results
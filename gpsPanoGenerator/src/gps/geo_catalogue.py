@@ -0,0 +1,323 @@
+# Perry Chien
+# GeoCatalogue of geotagged images for region and neighbour queries. A directory
+# of JPEGs is scanned once (EXIF headers only), the positions are kept in
+# columnar arrays and indexed by a k-d tree over their points on the earth
+# sphere, so that radius, nearest neighbour and bounding box queries don't
+# touch the files again.
+
+import math
+import os
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from ..image_processing.gps_reader import read_gps
+
+EARTH_RADIUS = 6371008.8  # m, mean radius
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+def to_xyz(lat, lng):
+    # points on the earth sphere (in m) of decimal degree positions
+    lat, lng = np.deg2rad(lat), np.deg2rad(lng)
+    cos_lat = np.cos(lat)
+    return EARTH_RADIUS * np.stack((cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)), axis=-1)
+
+def to_point(lat, lng):
+    # to_xyz of a single position, without the array overhead
+    lat, lng = math.radians(lat), math.radians(lng)
+    cos_lat = math.cos(lat)
+    return np.array((EARTH_RADIUS * cos_lat * math.cos(lng), EARTH_RADIUS * cos_lat * math.sin(lng),
+                     EARTH_RADIUS * math.sin(lat)))
+
+def chord(metres):
+    # straight line distance between two points the given great circle distance apart
+    return 2 * EARTH_RADIUS * np.sin(np.minimum(metres, np.pi * EARTH_RADIUS) / (2 * EARTH_RADIUS))
+
+def arc(chords):
+    # great circle distance of straight line distances
+    return 2 * EARTH_RADIUS * np.arcsin(np.minimum(chords / (2 * EARTH_RADIUS), 1.0))
+
+
+class KDTree:
+    """Static k-d tree over (n, 3) points. Leaves hold up to leaf_size points
+    and are searched vectorized, only the inner nodes are walked in python."""
+
+    def __init__(self, points, leaf_size=128):
+        self.points = np.asarray(points, np.float64)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.points))
+        # per node: start, end, split dimension (-1 for leaves), split value, children
+        self.nodes = []
+        if len(self.points):
+            self._build(0, len(self.points))
+        self.sorted_points = self.points[self.order]
+
+    def _build(self, start, end):
+        node = len(self.nodes)
+        self.nodes.append([start, end, -1, 0.0, -1, -1])
+        if end - start <= self.leaf_size:
+            return node
+        indices = self.order[start:end]
+        points = self.points[indices]
+        dim = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(points[:, dim], middle)
+        self.order[start:end] = indices[partition]
+        split = self.points[self.order[start + middle], dim]
+        left = self._build(start, start + middle)
+        right = self._build(start + middle, end)
+        self.nodes[node][2:] = [dim, split, left, right]
+        return node
+
+    def query_radius(self, point, radius):
+        # positions (into points) of the points within radius, unordered
+        if not self.nodes:
+            return np.zeros(0, np.int64)
+        found = []
+        stack = [0]
+        radius_sq = radius * radius
+        while stack:
+            start, end, dim, split, left, right = self.nodes[stack.pop()]
+            if dim < 0:
+                distances = ((self.sorted_points[start:end] - point) ** 2).sum(axis=1)
+                found.append(self.order[start:end][distances <= radius_sq])
+                continue
+            difference = point[dim] - split
+            near, far = (left, right) if difference < 0 else (right, left)
+            stack.append(near)
+            if difference * difference <= radius_sq:
+                stack.append(far)
+        return np.concatenate(found) if found else np.zeros(0, np.int64)
+
+    def query_nearest(self, point, k):
+        # positions and distances of the k nearest points, nearest first
+        best = np.zeros(0, np.int64)
+        best_sq = np.zeros(0)
+        if not self.nodes or k <= 0:
+            return best, best_sq
+        worst_sq = np.inf  # of the k best so far
+        stack = [(0, 0.0)]
+        while stack:
+            node, bound = stack.pop()
+            if bound > worst_sq:
+                continue
+            start, end, dim, split, left, right = self.nodes[node]
+            if dim < 0:
+                distances = ((self.sorted_points[start:end] - point) ** 2).sum(axis=1)
+                best = np.concatenate((best, self.order[start:end]))
+                best_sq = np.concatenate((best_sq, distances))
+                if len(best) > k:
+                    keep = np.argpartition(best_sq, k - 1)[:k]
+                    best, best_sq = best[keep], best_sq[keep]
+                if len(best) == k:
+                    worst_sq = best_sq.max()
+                continue
+            difference = point[dim] - split
+            near, far = (left, right) if difference < 0 else (right, left)
+            # the far side is pushed first, so the near side is searched first
+            stack.append((far, max(bound, difference * difference)))
+            stack.append((near, bound))
+        order = np.argsort(best_sq, kind="stable")
+        return best[order], np.sqrt(best_sq[order])
+
+
+class GeoCatalogue:
+    """Positions of geotagged images with spatial queries.
+
+    Images added after the last index build are searched by brute force until
+    there are rebuild_ratio times as many of them as indexed ones, so adding
+    images one by one as they arrive stays cheap.
+    """
+
+    def __init__(self, rebuild_ratio=0.25, min_rebuild=256):
+        self.paths = []
+        self.rows = {}  # path -> row
+        self.stamps = {}  # path -> (mtime, size) when it was read
+        self.lat = np.zeros(0)
+        self.lng = np.zeros(0)
+        self.alt = np.zeros(0)
+        self.xyz = np.zeros((0, 3))
+        self.valid = np.zeros(0, bool)
+        self.count = 0
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self.tree = KDTree(np.zeros((0, 3)))
+        self.indexed = 0  # the first indexed rows are in the tree
+        self.removed = 0  # indexed rows removed since
+        self.lat_order = np.zeros(0, np.int64)  # the indexed rows sorted by latitude
+        self.sorted_lat = np.zeros(0)
+
+    def __len__(self):
+        return int(self.valid[:self.count].sum())
+
+    def __contains__(self, path):
+        return path in self.rows
+
+    def add(self, path, lat, lng, alt=0.0):
+        # adds or moves an image
+        self.add_many([path], [lat], [lng], [alt])
+
+    def add_many(self, paths, lats, lngs, alts):
+        # adds or moves images, the positions as sequences of equal length
+        last = {path: idx for idx, path in enumerate(paths)}
+        if len(last) < len(paths):
+            # a path given more than once gets its last position
+            keep = sorted(last.values())
+            paths = [paths[idx] for idx in keep]
+            lats, lngs, alts = (np.asarray(values)[keep] for values in (lats, lngs, alts))
+        for path in paths:
+            if path in self.rows:
+                self.remove(path)
+        if self.count + len(paths) > len(self.lat):
+            self._grow(max(64, 2 * self.count, self.count + len(paths)))
+        rows = slice(self.count, self.count + len(paths))
+        self.lat[rows], self.lng[rows], self.alt[rows] = lats, lngs, alts
+        self.xyz[rows] = to_xyz(self.lat[rows], self.lng[rows])
+        self.valid[rows] = True
+        for path in paths:
+            self.rows[path] = self.count
+            self.paths.append(path)
+            self.count += 1
+        if self.count - self.indexed > max(self.min_rebuild, self.rebuild_ratio * self.indexed):
+            self.build()
+
+    def remove(self, path):
+        row = self.rows.pop(path)
+        self.stamps.pop(path, None)
+        self.valid[row] = False
+        if row < self.indexed:
+            self.removed += 1
+
+    def _grow(self, capacity):
+        for name in ("lat", "lng", "alt", "xyz", "valid"):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def build(self):
+        # indexes all images, dropping the removed ones
+        if self.count > len(self.rows):
+            keep = np.flatnonzero(self.valid[:self.count])
+            self.paths = [self.paths[row] for row in keep]
+            self.rows = {path: row for row, path in enumerate(self.paths)}
+            for name in ("lat", "lng", "alt", "xyz", "valid"):
+                array = getattr(self, name)
+                array[:len(keep)] = array[keep]
+            self.valid[len(keep):] = False
+            self.count = len(keep)
+        self.tree = KDTree(self.xyz[:self.count])
+        self.lat_order = np.argsort(self.lat[:self.count], kind="stable")
+        self.sorted_lat = self.lat[self.lat_order]
+        self.indexed = self.count
+        self.removed = 0
+
+    def scan(self, directory, workers=None):
+        """Adds the JPEGs of a directory which are new or changed since the last
+        scan, reading only their EXIF headers. Images without GPS position are skipped.
+
+        return: number of images added
+        """
+        to_read = []
+        for entry in os.scandir(directory):
+            if not entry.is_file() or not entry.name.lower().endswith(JPEG_EXTENSIONS):
+                continue
+            stat = entry.stat()
+            if self.stamps.get(entry.path) != (stat.st_mtime_ns, stat.st_size):
+                to_read.append((entry.path, (stat.st_mtime_ns, stat.st_size)))
+
+        def read_position(path):
+            try:
+                return read_gps(path)
+            except (OSError, ValueError, struct.error):
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            positions = list(executor.map(read_position, [path for path, _ in to_read]))
+        found = []
+        for (path, stamp), position in zip(to_read, positions):
+            if position is not None:
+                found.append((path, stamp, position))
+            elif path in self.rows:
+                self.remove(path)
+        if found:
+            self.add_many([path for path, _, _ in found], *zip(*[position for _, _, position in found]))
+            for path, stamp, _ in found:
+                self.stamps[path] = stamp
+        return len(found)
+
+    def _search_radius(self, point, radius):
+        rows = self.tree.query_radius(point, radius)
+        pending = np.arange(self.indexed, self.count)
+        distances = ((self.xyz[pending] - point) ** 2).sum(axis=1)
+        rows = np.concatenate((rows, pending[distances <= radius * radius]))
+        return rows[self.valid[rows]]
+
+    def within(self, lat, lng, radius):
+        """Images within radius metres (great circle) of a position.
+
+        return: list of (path, distance in m), nearest first
+        """
+        point = to_point(lat, lng)
+        rows = self._search_radius(point, chord(radius))
+        distances = arc(np.sqrt(((self.xyz[rows] - point) ** 2).sum(axis=1)))
+        order = np.argsort(distances)
+        return [(self.paths[rows[i]], float(distances[i])) for i in order]
+
+    def nearest(self, lat, lng, k=1):
+        """The k images nearest to a position.
+
+        return: list of (path, distance in m), nearest first
+        """
+        point = to_point(lat, lng)
+        # removed images are skipped, so ask the tree for enough extra ones
+        rows, chords = self.tree.query_nearest(point, k + self.removed)
+        pending = np.arange(self.indexed, self.count)
+        rows = np.concatenate((rows, pending))
+        chords = np.concatenate((chords, np.sqrt(((self.xyz[pending] - point) ** 2).sum(axis=1))))
+        valid = self.valid[rows]
+        rows, chords = rows[valid], chords[valid]
+        order = np.argsort(chords, kind="stable")[:k]
+        return [(self.paths[rows[i]], float(arc(chords[i]))) for i in order]
+
+    def in_bbox(self, south, west, north, east):
+        """Images inside a lat/lng box, which crosses the antimeridian if west > east.
+
+        return: list of paths
+        """
+        # the latitude range of the indexed rows by binary search, then the rest by comparison
+        first = np.searchsorted(self.sorted_lat, south, side="left")
+        last = np.searchsorted(self.sorted_lat, north, side="right")
+        rows = np.sort(np.concatenate((self.lat_order[first:last], np.arange(self.indexed, self.count))))
+        lat, lng = self.lat[rows], self.lng[rows]
+        inside = self.valid[rows] & (lat >= south) & (lat <= north)
+        if west <= east:
+            inside &= (lng >= west) & (lng <= east)
+        else:
+            inside &= (lng >= west) | (lng <= east)
+        return [self.paths[row] for row in rows[inside]]
+
+    def stitch_candidates(self, radius):
+        """Groups of images taken within radius metres of each other (chained),
+        as candidate image sets for stitching. Single images are left out.
+
+        return: list of path lists, each in the order the images were added
+        """
+        rows = np.flatnonzero(self.valid[:self.count])
+        group = {row: None for row in rows}
+        groups = []
+        limit = chord(radius)
+        for row in rows:
+            if group[row] is not None:
+                continue
+            members, stack = [row], [row]
+            group[row] = len(groups)
+            while stack:
+                for neighbour in self._search_radius(self.xyz[stack.pop()], limit):
+                    if group[neighbour] is None:
+                        group[neighbour] = len(groups)
+                        members.append(neighbour)
+                        stack.append(neighbour)
+            groups.append(sorted(members))
+        return [[self.paths[row] for row in members] for members in groups if len(members) > 1]
@@ -3,6 +3,7 @@
 # GPS coordinates on an image. 
 
 import platform
+import time
 from PIL import Image
 from ..image_processing.overlay import overlayText
 from ..image_processing.imgdata import set_gps_location, get_gps_location
@@ -47,11 +48,18 @@ class GPSHandler:
             print(f"Error overlaying GPS data: {e}")
             return None
 
-    def get_real_time_gps(self):
+    def get_real_time_gps(self, recorder=None, max_fix_age=2.0):
         """
+        If a running GPSRecorder is given, return its latest fix without querying gpsd,
+        unless the fix is more than max_fix_age seconds old (e.g. the receiver lost
+        its fix), then fall through to the gpsd query.
         If running on Windows, skip this function as gpsd is not available.
         If running on Unix-like OS (Linux/macOS), use gpsd for real-time GPS.
         """
+        fix = recorder.latest() if recorder is not None else None
+        if fix is not None and time.time() - fix[0] <= max_fix_age:
+            _, latitude, longitude, altitude = fix
+            return latitude, longitude, altitude
         if platform.system() == "Windows":
             print("Real-time GPS is not supported on Windows. Returning mock data.")
             # Return mock data or skip real-time GPS functionality
@@ -0,0 +1,301 @@
+# Perry Chien
+# GPS track recording and geotagging by time. A GPSRecorder keeps one gpsd
+# connection open in the background and buffers every fix into a GPSTrack,
+# images are geotagged afterwards in one pass by interpolating the track at
+# their capture times (EXIF DateTimeOriginal), instead of a gpsd query per shot.
+
+import json
+import socket
+import threading
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import piexif
+
+from ..image_processing.imgdata import load_exif, tag_gps_locations
+
+GPSD_HOST = "127.0.0.1"
+GPSD_PORT = 2947
+WATCH_COMMAND = b'?WATCH={"enable":true,"json":true};\n'
+
+class GPSTrack:
+    """Ring buffer of the last capacity fixes (time as POSIX seconds, lat, lng, alt)."""
+
+    def __init__(self, capacity=86400):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, 4), np.float64)
+        self.count = 0  # fixes added in total, the oldest ones are overwritten
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def add(self, t, lat, lng, alt=0.0):
+        with self.lock:
+            self.data[self.count % self.capacity] = (t, lat, lng, alt)
+            self.count += 1
+
+    def latest(self):
+        # the last fix as (t, lat, lng, alt), None if there is none
+        with self.lock:
+            if self.count == 0:
+                return None
+            return tuple(float(v) for v in self.data[(self.count - 1) % self.capacity])
+
+    def fixes(self):
+        # copy of the buffered fixes as (n, 4) array, sorted by time
+        with self.lock:
+            if self.count <= self.capacity:
+                fixes = self.data[:self.count].copy()
+            else:
+                start = self.count % self.capacity
+                fixes = np.concatenate((self.data[start:], self.data[:start]))
+        if len(fixes) > 1 and np.any(np.diff(fixes[:, 0]) < 0):
+            fixes = fixes[np.argsort(fixes[:, 0], kind="stable")]
+        return fixes
+
+    def save(self, path):
+        fixes = self.fixes()
+        np.savez_compressed(path, times=fixes[:, 0], lat=fixes[:, 1], lng=fixes[:, 2], alt=fixes[:, 3])
+
+    @classmethod
+    def load(cls, path, capacity=None):
+        with np.load(path) as data:
+            fixes = np.column_stack([data[key] for key in ("times", "lat", "lng", "alt")])
+        track = cls(capacity or max(len(fixes), 1))
+        for fix in fixes[-track.capacity:]:
+            track.add(*fix)
+        return track
+
+    @classmethod
+    def from_nmea(cls, lines, capacity=None):
+        fixes = list(parse_nmea(lines))
+        track = cls(capacity or max(len(fixes), 1))
+        for fix in fixes[-track.capacity:]:
+            track.add(*fix)
+        return track
+
+    def interpolate(self, times, max_gap=None):
+        """Positions at the given POSIX times, all at once.
+
+        Longitudes are interpolated across the antimeridian. Times outside the
+        track, or between two fixes more than max_gap seconds apart, get NaN.
+        return: (n, 3) array of lat, lng, alt
+        """
+        times = np.asarray(times, np.float64)
+        fixes = self.fixes()
+        positions = np.full((len(times), 3), np.nan)
+        if len(fixes) == 0:
+            return positions
+        fix_times = fixes[:, 0]
+        lng = np.rad2deg(np.unwrap(np.deg2rad(fixes[:, 2])))
+        positions[:, 0] = np.interp(times, fix_times, fixes[:, 1])
+        positions[:, 1] = (np.interp(times, fix_times, lng) + 180) % 360 - 180
+        positions[:, 2] = np.interp(times, fix_times, fixes[:, 3])
+
+        invalid = (times < fix_times[0]) | (times > fix_times[-1])
+        if max_gap is not None and len(fixes) > 1:
+            after = np.clip(np.searchsorted(fix_times, times), 1, len(fix_times) - 1)
+            invalid |= fix_times[after] - fix_times[after - 1] > max_gap
+        positions[invalid] = np.nan
+        return positions
+
+
+def parse_nmea(lines):
+    """Yields the fixes (t, lat, lng, alt) of NMEA 0183 sentences.
+
+    GGA sentences give the fixes, the date comes from the RMC sentences (GGA
+    only has the time of day). Sentences with a bad checksum or no fix are skipped.
+    """
+    date = None
+    pending = []  # GGA fixes before the first date
+    for line in lines:
+        line = line.strip()
+        if isinstance(line, bytes):
+            line = line.decode("ascii", "replace")
+        if not line.startswith("$") or not _valid_checksum(line):
+            continue
+        fields = line.split("*")[0].split(",")
+        kind = fields[0][3:]
+        try:
+            if kind == "RMC" and fields[2] == "A" and fields[9]:
+                date = datetime.strptime(fields[9], "%d%m%y").replace(tzinfo=timezone.utc)
+                for day_seconds, lat, lng, alt in pending:
+                    yield date.timestamp() + day_seconds, lat, lng, alt
+                pending = []
+            elif kind == "GGA" and fields[6] not in ("", "0"):
+                fix = (_nmea_seconds(fields[1]), _nmea_degrees(fields[2], fields[3]),
+                       _nmea_degrees(fields[4], fields[5]), float(fields[9] or 0))
+                if date is None:
+                    pending.append(fix)
+                else:
+                    yield (date.timestamp() + fix[0],) + fix[1:]
+        except (IndexError, ValueError):
+            continue
+
+def _valid_checksum(line):
+    if "*" not in line:
+        return True
+    body, checksum = line[1:].split("*", 1)
+    value = 0
+    for char in body:
+        value ^= ord(char)
+    try:
+        return value == int(checksum[:2], 16)
+    except ValueError:
+        return False
+
+def _nmea_seconds(hhmmss):
+    return int(hhmmss[0:2]) * 3600 + int(hhmmss[2:4]) * 60 + float(hhmmss[4:])
+
+def _nmea_degrees(value, hemisphere):
+    # ddmm.mmmm (dddmm.mmmm for longitudes) to signed decimal degrees
+    point = value.index(".") if "." in value else len(value)
+    degrees = int(value[:point - 2]) + float(value[point - 2:]) / 60
+    return -degrees if hemisphere in ("S", "W") else degrees
+
+
+class GPSRecorder:
+    """Records the fixes of gpsd into a GPSTrack in a background thread.
+
+    One connection is kept open with a WATCH on the JSON reports, every TPV
+    report with a 2D or 3D fix is added to the track. The connection is
+    reopened if gpsd goes away.
+    """
+
+    POLL_INTERVAL = 0.2  # s, how often the thread checks for a stop
+    RECONNECT_DELAY = 1.0
+
+    def __init__(self, track=None, host=GPSD_HOST, port=GPSD_PORT):
+        self.track = GPSTrack() if track is None else track
+        self.host = host
+        self.port = port
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.connected = threading.Event()
+        self.errors = 0
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def latest(self):
+        return self.track.latest()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=self.RECONNECT_DELAY) as sock:
+                    sock.settimeout(self.POLL_INTERVAL)
+                    sock.sendall(WATCH_COMMAND)
+                    self.connected.set()
+                    self.read_reports(sock)
+            except OSError:
+                self.errors += 1
+            finally:
+                self.connected.clear()
+            self.stop_event.wait(self.RECONNECT_DELAY)
+
+    def read_reports(self, sock):
+        buffer = b""
+        while not self.stop_event.is_set():
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                continue
+            if not chunk:
+                return
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                self.handle_report(line)
+
+    def handle_report(self, line):
+        try:
+            report = json.loads(line)
+        except ValueError:
+            return
+        if report.get("class") != "TPV" or report.get("mode", 0) < 2:
+            return
+        if "lat" not in report or "lon" not in report or "time" not in report:
+            return
+        try:
+            t = datetime.fromisoformat(report["time"].replace("Z", "+00:00")).timestamp()
+            alt = float(report.get("altHAE", report.get("alt", 0.0)))
+            self.track.add(t, float(report["lat"]), float(report["lon"]), alt)
+        except (TypeError, ValueError):
+            return
+
+
+def capture_time(exif, utc_offset=0):
+    """POSIX time an image was taken from its EXIF dict, None if unknown.
+
+    DateTimeOriginal is camera local time, its offset to UTC is OffsetTimeOriginal
+    if the camera sets it, otherwise utc_offset (in hours).
+    """
+    exif_ifd = exif.get("Exif", {})
+    value = exif_ifd.get(piexif.ExifIFD.DateTimeOriginal)
+    if not value:
+        return None
+    try:
+        taken = datetime.strptime(value.decode("ascii").strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    offset = exif_ifd.get(piexif.ExifIFD.OffsetTimeOriginal)
+    if offset:
+        try:
+            offset = offset.decode("ascii").strip("\x00 ")
+            sign = -1 if offset.startswith("-") else 1
+            hours, minutes = offset.lstrip("+-").split(":")
+            utc_offset = sign * (int(hours) + int(minutes) / 60)
+        except ValueError:
+            pass
+    taken = taken.replace(tzinfo=timezone(timedelta(hours=utc_offset)))
+    subsec = exif_ifd.get(piexif.ExifIFD.SubSecTimeOriginal)
+    fraction = 0.0
+    if subsec:
+        try:
+            fraction = float("0." + subsec.decode("ascii").strip("\x00 "))
+        except ValueError:
+            pass
+    return taken.timestamp() + fraction
+
+
+def geotag_images(files, track, utc_offset=0, max_gap=10.0, workers=None):
+    """Geotags images by interpolating the track at their capture times.
+
+    Only the EXIF headers are read, all positions are interpolated in one pass
+    and written with tag_gps_locations. Images without capture time or outside
+    the track (see GPSTrack.interpolate) are left untouched.
+    return: the stats of tag_gps_locations, plus the untagged files
+    """
+    files = list(files)
+    times = np.full(len(files), np.nan)
+    for idx, file_name in enumerate(files):
+        try:
+            taken = capture_time(load_exif(file_name), utc_offset)
+        except (OSError, ValueError):
+            taken = None
+        if taken is not None:
+            times[idx] = taken
+    positions = track.interpolate(times, max_gap)
+    valid = ~np.isnan(positions).any(axis=1)
+    records = [(files[idx], lat, lng, alt, times[idx])
+               for idx, (lat, lng, alt) in enumerate(positions.tolist()) if valid[idx]]
+    stats = tag_gps_locations(records, workers)
+    stats["untagged"] = [files[idx] for idx in np.flatnonzero(~valid)]
+    return stats
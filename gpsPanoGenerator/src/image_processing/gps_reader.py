@@ -0,0 +1,142 @@
+# Perry Chien
+# Fast read path for the GPS position of JPEGs. Instead of parsing all of the
+# EXIF data (every IFD and the thumbnail) like piexif.load, only the APP1
+# segment is read and the GPS IFD is decoded straight from its TIFF structure
+# into decimal numbers.
+
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .imgdata import find_exif_segment
+
+GPS_IFD_POINTER = 0x8825
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+GPS_ALTITUDE_REF, GPS_ALTITUDE = 5, 6
+RATIONAL = 5
+
+def decode_gps(exif):
+    """Decimal (lat, lng, alt) of the Exif APP1 payload (starting with the Exif
+    header), lat/lng negative in the south/west, alt negative below sea level.
+    None if there is no position."""
+    tiff = 6  # after the Exif header
+    if len(exif) < tiff + 8:
+        return None
+    order = {b"II": "<", b"MM": ">"}.get(exif[tiff:tiff + 2])
+    if order is None:
+        return None
+    entries = _ifd_entries(exif, tiff, struct.unpack_from(order + "I", exif, tiff + 4)[0], order)
+    gps_pointer = entries.get(GPS_IFD_POINTER)
+    if gps_pointer is None:
+        return None
+    gps = _ifd_entries(exif, tiff, struct.unpack_from(order + "I", gps_pointer[2])[0], order)
+    try:
+        lat = _degrees(exif, tiff, gps[GPS_LATITUDE], order)
+        lng = _degrees(exif, tiff, gps[GPS_LONGITUDE], order)
+    except (KeyError, ValueError, ZeroDivisionError, struct.error):
+        return None
+    if GPS_LATITUDE_REF in gps and gps[GPS_LATITUDE_REF][2][:1] == b"S":
+        lat = -lat
+    if GPS_LONGITUDE_REF in gps and gps[GPS_LONGITUDE_REF][2][:1] == b"W":
+        lng = -lng
+    alt = 0.0
+    if GPS_ALTITUDE in gps:
+        try:
+            alt = _rationals(exif, tiff, gps[GPS_ALTITUDE], order)[0]
+        except (ValueError, ZeroDivisionError, struct.error):
+            alt = 0.0
+        if GPS_ALTITUDE_REF in gps and gps[GPS_ALTITUDE_REF][2][:1] == b"\x01":
+            alt = -alt
+    return lat, lng, alt
+
+def _ifd_entries(exif, tiff, offset, order):
+    # {tag: (type, count, raw 4 byte value or offset)} of the IFD at offset (from the TIFF header)
+    start = tiff + offset
+    if offset <= 0 or start + 2 > len(exif):
+        return {}
+    count = struct.unpack_from(order + "H", exif, start)[0]
+    entries = {}
+    for entry in range(start + 2, min(start + 2 + 12 * count, len(exif) - 11), 12):
+        tag, kind, number = struct.unpack_from(order + "HHI", exif, entry)
+        entries[tag] = (kind, number, exif[entry + 8:entry + 12])
+    return entries
+
+def _rationals(exif, tiff, entry, order):
+    kind, count, value = entry
+    if kind != RATIONAL:
+        raise ValueError("Not a rational")
+    offset = tiff + struct.unpack_from(order + "I", value)[0]
+    numbers = struct.unpack_from(f"{order}{2 * count}I", exif, offset)
+    return [numbers[i] / numbers[i + 1] for i in range(0, len(numbers), 2)]
+
+def _degrees(exif, tiff, entry, order):
+    # degrees, minutes and seconds to decimal degrees
+    return sum(value / 60 ** i for i, value in enumerate(_rationals(exif, tiff, entry, order)[:3]))
+
+def read_gps(file_name):
+    """Decimal (lat, lng, alt) of a JPEG, see decode_gps. None if it has no position."""
+    with open(file_name, "rb") as f:
+        offset, length = find_exif_segment(f)
+        if length is None:
+            return None
+        f.seek(offset)
+        return decode_gps(f.read(length))
+
+
+class GPSReader:
+    """read_gps with an LRU cache of the positions by (path, mtime, size), so
+    that files which have not changed are never opened again."""
+
+    def __init__(self, cache_size=65536):
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # path -> (mtime_ns, size, position)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def read(self, file_name):
+        # returns (lat, lng, alt), None if the file has no position or can't be read
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            cached = self.cache.get(file_name)
+            if cached is not None and cached[:2] == stamp:
+                self.cache.move_to_end(file_name)
+                self.hits += 1
+                return cached[2]
+            self.misses += 1
+        try:
+            position = read_gps(file_name)
+        except (OSError, ValueError, struct.error):
+            position = None
+        with self.lock:
+            self.cache[file_name] = stamp + (position,)
+            self.cache.move_to_end(file_name)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return position
+
+    def read_many(self, files, workers=None):
+        """Positions of many files, read over a thread pool.
+
+        return: (n, 3) float array of lat, lng, alt, NaN rows for files without position
+        """
+        files = list(files)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            positions = list(executor.map(self.read, files))
+        result = np.full((len(files), 3), np.nan)
+        for idx, position in enumerate(positions):
+            if position is not None:
+                result[idx] = position
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
@@ -1,8 +1,19 @@
 import json
 import os
+import shutil
+import struct
+import tempfile
+import time
 import piexif
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
 from fractions import Fraction
 
+EXIF_HEADER = b"Exif\x00\x00"
+APP1_PADDING = 512  # spare bytes reserved in rewritten APP1 segments, so that later tags fit in place
+MAX_APP1_LENGTH = 65533  # the segment length field is 16 bit and includes itself
+FSYNC_BATCH = 64
+
 def to_deg(value, loc):
     """convert decimal coordinates into degrees, munutes and seconds tuple
 
@@ -41,8 +52,22 @@ def set_gps_location(file_name, lat, lng, altitude):
     file_name -- image file
     lat -- latitude (as float)
     lng -- longitude (as float)
-    altitude -- altitude (as float)
+    altitude -- altitude in m (as float), GPSAltitudeRef is 0 at or above and 1
+                below sea level (it used to be 1 for any altitude)
+
+    """
+    exif_dict = {"GPS": gps_ifd(lat, lng, altitude)}
+    exif_bytes = piexif.dump(exif_dict)
+    piexif.insert(exif_bytes, file_name)
 
+
+def gps_ifd(lat, lng, altitude, timestamp=None):
+    """GPS IFD dict of a position, as piexif.dump takes it
+
+    Keyword args:
+    lat, lng, altitude -- position (as floats), the altitude in m, negative below sea level
+    timestamp -- optional time of the fix, as datetime (naive ones are taken as UTC)
+                 or as POSIX timestamp in seconds
     """
     lat_deg = to_deg(lat, ["S", "N"])
     lng_deg = to_deg(lng, ["W", "E"])
@@ -52,24 +77,224 @@ def set_gps_location(file_name, lat, lng, altitude):
 
     gps_ifd = {
         piexif.GPSIFD.GPSVersionID: (2, 0, 0, 0),
-        piexif.GPSIFD.GPSAltitudeRef: 1,
-        piexif.GPSIFD.GPSAltitude: change_to_rational(round(altitude)),
+        piexif.GPSIFD.GPSAltitudeRef: 0 if altitude >= 0 else 1,  # above or below sea level
+        piexif.GPSIFD.GPSAltitude: change_to_rational(round(abs(altitude))),
         piexif.GPSIFD.GPSLatitudeRef: lat_deg[3],
         piexif.GPSIFD.GPSLatitude: exiv_lat,
         piexif.GPSIFD.GPSLongitudeRef: lng_deg[3],
         piexif.GPSIFD.GPSLongitude: exiv_lng,
     }
-    
+    if timestamp is not None:
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.astimezone(timezone.utc)
+        else:
+            timestamp = datetime.fromtimestamp(timestamp, timezone.utc)
+        seconds = round((timestamp.second + timestamp.microsecond / 1e6) * 1000)
+        gps_ifd[piexif.GPSIFD.GPSTimeStamp] = ((timestamp.hour, 1), (timestamp.minute, 1), (seconds, 1000))
+        gps_ifd[piexif.GPSIFD.GPSDateStamp] = timestamp.strftime("%Y:%m:%d")
+    return gps_ifd
 
-    exif_dict = {"GPS": gps_ifd}
-    exif_bytes = piexif.dump(exif_dict)
-    piexif.insert(exif_bytes, file_name)
+
+def find_exif_segment(f):
+    """locates the Exif APP1 segment of an open JPEG file by walking the segment
+    headers only
+
+    return: (offset, length) of the segment payload (which starts with the Exif
+    header), or (offset, None) if there is none, offset being where a new one goes
+    """
+    f.seek(0)
+    if f.read(2) != b"\xff\xd8":
+        raise ValueError("Not a JPEG file")
+    insert_offset = 2
+    offset = 2
+    while True:
+        header = f.read(4)
+        if len(header) < 4 or header[0] != 0xFF or header[1] in (0xDA, 0xD9):
+            # start of the image data (or a broken file), no more metadata
+            return insert_offset, None
+        length = struct.unpack(">H", header[2:])[0] - 2
+        if length < 0:
+            # a corrupt length (it includes its own two bytes) would walk backwards
+            return insert_offset, None
+        if header[1] == 0xE1 and f.read(len(EXIF_HEADER)) == EXIF_HEADER:
+            return offset + 4, length
+        if header[1] == 0xE0 and offset == 2:
+            # like piexif.insert, a new segment goes after the JFIF segment
+            insert_offset = offset + 4 + length
+        offset += 4 + length
+        f.seek(offset)
+
+
+def load_exif(file_name):
+    """Exif dict of a JPEG like piexif.load, but only the APP1 segment is read
+
+    return: dict of the IFDs, empty if the file has no Exif data
+    """
+    with open(file_name, "rb") as f:
+        offset, length = find_exif_segment(f)
+        if length is None:
+            return {}
+        f.seek(offset)
+        return piexif.load(f.read(length))
+
+
+def tag_gps_location(file_name, lat, lng, altitude, timestamp=None, fsync=True):
+    """Writes a GPS position into the Exif data of a JPEG, keeping its other Exif data.
+    Only the APP1 segment is overwritten, in place, if the new Exif data fits into it.
+    Otherwise the file is rewritten once (atomically), with spare room for later tags.
+
+    Keyword args:
+    file_name -- image file
+    lat, lng, altitude, timestamp -- as for gps_ifd
+    fsync -- flush the edit to disk before returning. A rewritten file is always
+             flushed before it replaces the original, this only adds the directory
+
+    return: True if the segment was edited in place
+    """
+    with open(file_name, "r+b") as f:
+        offset, length = find_exif_segment(f)
+        exif_dict = {}
+        if length is not None:
+            f.seek(offset)
+            exif_dict = piexif.load(f.read(length))
+        exif_dict["GPS"] = gps_ifd(lat, lng, altitude, timestamp)
+        exif_bytes = piexif.dump(exif_dict)
+
+        if length is not None and len(exif_bytes) <= length:
+            f.seek(offset)
+            f.write(exif_bytes.ljust(length, b"\x00"))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+            return True
+
+        f.seek(0)
+        data = f.read()
+
+    if len(exif_bytes) > MAX_APP1_LENGTH:
+        raise ValueError("Exif data too large for an APP1 segment")
+    exif_bytes = exif_bytes.ljust(min(len(exif_bytes) + APP1_PADDING, MAX_APP1_LENGTH), b"\x00")
+    segment = b"\xff\xe1" + struct.pack(">H", len(exif_bytes) + 2) + exif_bytes
+    if length is None:
+        data = data[:offset] + segment + data[offset:]
+    else:
+        data = data[:offset - 4] + segment + data[offset + length:]
+
+    # written next to the file and renamed over it, so that it is never half written.
+    # The new file is on disk before the rename, else a crash could leave an empty file.
+    directory = os.path.dirname(os.path.abspath(file_name))
+    fd, tmp_name = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        shutil.copymode(file_name, tmp_name)
+        os.replace(tmp_name, file_name)
+    except BaseException:
+        os.remove(tmp_name)
+        raise
+    if fsync:
+        fsync_directory(directory)
+    return False
+
+def fsync_directory(directory):
+    # flushes renames in the directory to disk, directories can't be opened on Windows
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def tag_gps_locations(records, workers=None, fsync_batch=FSYNC_BATCH):
+    """Tags many JPEGs with GPS positions (see tag_gps_location) over a thread pool.
+    The files edited in place (and the directories of the rewritten ones) are
+    flushed to disk in batches, instead of one fsync per file in between the writes.
+
+    Keyword args:
+    records -- iterable of (file_name, lat, lng, altitude, timestamp) tuples,
+               timestamp may be None
+    workers -- number of threads, None for the ThreadPoolExecutor default
+    fsync_batch -- number of files flushed to disk together, 0 to not flush at all
+
+    return: dict with the number of images tagged in place and rewritten, the
+    failed (file_name, error) pairs, the seconds taken and images per second
+    """
+    start = time.perf_counter()
+    stats = {"images": 0, "in_place": 0, "rewritten": 0, "failed": []}
+    pending = []
+
+    def flush():
+        directories = set()
+        for file_name, in_place in pending:
+            if not in_place:
+                # already flushed before it was renamed
+                directories.add(os.path.dirname(os.path.abspath(file_name)))
+                continue
+            fd = os.open(file_name, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for directory in directories:
+            fsync_directory(directory)
+        pending.clear()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(tag_gps_location, file_name, lat, lng, altitude, timestamp, False): file_name
+            for file_name, lat, lng, altitude, timestamp in records
+        }
+        for future in as_completed(futures):
+            file_name = futures[future]
+            stats["images"] += 1
+            try:
+                in_place = future.result()
+            except Exception as e:
+                stats["failed"].append((file_name, str(e)))
+                continue
+            stats["in_place" if in_place else "rewritten"] += 1
+            if fsync_batch > 0:
+                pending.append((file_name, in_place))
+                if len(pending) >= fsync_batch:
+                    flush()
+        flush()
+
+    stats["seconds"] = time.perf_counter() - start
+    stats["images_per_s"] = stats["images"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    return stats
 
 # returns dict of all gps data in image exif data
 def get_gps(file):
     data = piexif.load(file)
     return data["GPS"]
 
+# converts a GPS IFD dict (as in piexif.load(file)["GPS"]) to decimal degrees and metres.
+# returns (lat, lng, alt), lat/lng negative in the south/west, alt negative below sea level.
+# returns None if there is no position.
+def gps_to_decimal(gps):
+    try:
+        lat = sum(n / d / 60 ** i for i, (n, d) in enumerate(gps[piexif.GPSIFD.GPSLatitude]))
+        lng = sum(n / d / 60 ** i for i, (n, d) in enumerate(gps[piexif.GPSIFD.GPSLongitude]))
+    except (KeyError, TypeError, ValueError, ZeroDivisionError):
+        return None
+    if gps.get(piexif.GPSIFD.GPSLatitudeRef, b"N") in (b"S", "S"):
+        lat = -lat
+    if gps.get(piexif.GPSIFD.GPSLongitudeRef, b"E") in (b"W", "W"):
+        lng = -lng
+    alt = 0.0
+    altitude = gps.get(piexif.GPSIFD.GPSAltitude)
+    if altitude and altitude[1]:
+        alt = altitude[0] / altitude[1]
+        if gps.get(piexif.GPSIFD.GPSAltitudeRef) == 1:
+            alt = -alt
+    return lat, lng, alt
+
 # takes an image file and displays its encoded GPS code information.
 # returns lat, lng coordinates in readable string format displayed in degree, minute, seconds format. 
 # returns None if there is no GPS data.
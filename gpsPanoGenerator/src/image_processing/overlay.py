@@ -5,12 +5,20 @@
 # overlay_text combines the functionality of most of the other functions to make the user experience
 # as easy as possible.
 
+import functools
+import os
 from PIL import Image, ImageDraw, ImageFont, ImageOps
 import numpy
 
 RELATIVE_TEXT_SIZE = 0.3  # determines size of text overlay compared to background image range 0.3 - 0.5
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
+FONT = "arial.ttf"
+BUNDLED_FONT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "assets", "Arial.ttf")
+TEXT_CACHE_SIZE = 256  # rendered text images kept, stamping mostly repeats the same strings
+# texts of only these characters (GPS coordinates, scale bars) are composed from
+# pre-rendered glyphs instead of being rasterised again
+GLYPH_CHARACTERS = "0123456789.,-+°'\" NSEWcm"
 
 # overlays the given txt on the given image at the specified position
 def overlayText(image, txt, coords):
@@ -30,7 +38,7 @@ def overlayText(image, txt, coords):
     width = int(RELATIVE_TEXT_SIZE * image.size[0])
     color = shade(image, coords) 
 
-    textimage = create_text_image(txt, width, color)
+    textimage = render_text_image(txt, width, tuple(color))
     return overlay(image, textimage, coords, True)
 
 def overlayRectangle(image, dims, coords):
@@ -77,6 +85,11 @@ def overlayScalebar(image, coords):
     return overlayText(img1, text, txtcoords)
 
 def create_text_image(inputtext, width, color):
+    return render_text_image(inputtext, width, tuple(color)).copy()
+
+# cached version of create_text_image, the returned image is shared and must not be modified
+@functools.lru_cache(maxsize=TEXT_CACHE_SIZE)
+def render_text_image(inputtext, width, color):
     fontsize = int(width * 1 / 10)
     numlines = 1
     if len(inputtext) * fontsize >= width:
@@ -92,13 +105,76 @@ def create_text_image(inputtext, width, color):
     else:
         text = inputtext
     height = int((numlines + 0.5) * fontsize)
+    font = get_font(fontsize)
+    if len(color) == 3 and all(char in GLYPH_CHARACTERS or char == '\n' for char in text):
+        return compose_glyphs(text, font, get_glyphs(fontsize), (width, height), color)
+
     img = Image.new('RGBA', (width, height), (255, 255, 255, 0))
-    font = ImageFont.truetype("arial.ttf", fontsize)
     draw = ImageDraw.Draw(img)
 
     draw.text((0, 0), text, font=font, fill=color)
     return img
 
+# loads a font once per (font, size), falls back to the bundled Arial if the system has no arial.ttf
+@functools.lru_cache(maxsize=32)
+def get_font(fontsize, font=FONT):
+    try:
+        return ImageFont.truetype(font, fontsize)
+    except OSError:
+        if font != FONT:
+            raise
+        return ImageFont.truetype(BUNDLED_FONT, fontsize)
+
+# coverage masks of the GLYPH_CHARACTERS as rendered by ImageDraw.text, with their offsets and
+# advances, and the kerning of the character pairs (filled as they occur)
+@functools.lru_cache(maxsize=32)
+def get_glyphs(fontsize, font=FONT):
+    loaded = get_font(fontsize, font)
+    glyphs = {}
+    for char in GLYPH_CHARACTERS:
+        left, top, right, bottom = loaded.getbbox(char)
+        mask = None
+        if right > left and bottom > top:
+            image = Image.new('L', (right - left, bottom - top), 0)
+            ImageDraw.Draw(image).text((-left, -top), char, font=loaded, fill=255)
+            mask = numpy.asarray(image)
+        glyphs[char] = (mask, (left, top), loaded.getlength(char))
+    return glyphs, {}
+
+# composes a text from glyphs, the same image as ImageDraw.text draws at (0, 0)
+def compose_glyphs(text, font, glyphs, size, color):
+    glyphs, kerning = glyphs
+    width, height = size
+    mask = numpy.zeros((height, width), numpy.uint8)
+    # the line spacing of ImageDraw.multiline_text
+    line_spacing = font.getbbox("A")[3] + 4
+    for row, line in enumerate(text.split('\n')):
+        pen = 0.0
+        previous = None
+        for char in line:
+            glyph, (left, top), advance = glyphs[char]
+            if previous is not None:
+                pair = previous + char
+                if pair not in kerning:
+                    kerning[pair] = font.getlength(pair) - glyphs[previous][2] - advance
+                pen += kerning[pair]
+            previous = char
+            x = round(pen) + left
+            y = row * line_spacing + top
+            pen += advance
+            if glyph is None:
+                continue
+            x0, y0 = max(x, 0), max(y, 0)
+            x1, y1 = min(x + glyph.shape[1], width), min(y + glyph.shape[0], height)
+            if x1 <= x0 or y1 <= y0:
+                continue
+            region = mask[y0:y1, x0:x1]
+            numpy.maximum(region, glyph[y0 - y:y1 - y, x0 - x:x1 - x], out=region)
+    pixels = numpy.full((height, width, 4), 255, numpy.uint8)
+    pixels[mask > 0, :3] = color
+    pixels[..., 3] = mask
+    return Image.fromarray(pixels)
+
 def create_rectangle(dims, color):
     newdims = [dims[1], dims[0]]
     newdims.append(3)
@@ -0,0 +1,60 @@
+# bench_depth_engine.py
+# Perry Chien, Husky Robotics, PY 2024
+# Compares the DepthEngine on a video stand-in against calling compute_depth per
+# frame pair (images and calibration written to and read from disk).
+
+import os
+import sys
+import tempfile
+import time
+
+import cv2 as cv
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.depth_engine import DepthEngine
+from src.stereo_depth_estimation import compute_depth
+
+def record_video(path, nr_frames=60, size=(1280, 720)):
+    # a textured scene panning by 4 px per frame
+    rng = np.random.default_rng(0)
+    scene = cv.resize(rng.integers(0, 256, (size[1] // 8, size[0] // 4, 3), np.uint8),
+                      (size[0] * 2, size[1]), interpolation=cv.INTER_CUBIC)
+    writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*'MJPG'), 30, size)
+    for frame in range(nr_frames):
+        writer.write(scene[:, frame * 4:frame * 4 + size[0]])
+    writer.release()
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        video = os.path.join(tmp_dir, 'stand_in.avi')
+        calibration = os.path.join(tmp_dir, 'calibration_params.npz')
+        record_video(video)
+        mtx = np.array([[1000, 0, 640], [0, 1000, 360], [0, 0, 1]], np.float64)
+        np.savez(calibration, mtx=mtx, dist=np.array([[0.05, -0.1, 0, 0, 0]]))
+
+        engine = DepthEngine(calibration)
+        for _ in engine.stream(video):
+            pass
+        metrics = engine.metrics()
+        print(f"DepthEngine      {metrics['fps']:6.1f} fps, latency {metrics['latency_mean_ms']:6.1f} ms"
+              f" (p95 {metrics['latency_p95_ms']:6.1f} ms)")
+
+        camera = cv.VideoCapture(video)
+        ret, previous = camera.read()
+        frames, start = 0, time.perf_counter()
+        while True:
+            ret, frame = camera.read()
+            if not ret:
+                break
+            left, right = os.path.join(tmp_dir, 'left.jpg'), os.path.join(tmp_dir, 'right.jpg')
+            cv.imwrite(left, previous)
+            cv.imwrite(right, frame)
+            compute_depth(left, right, calibration_params=calibration)
+            previous, frames = frame, frames + 1
+        camera.release()
+        print(f"compute_depth    {frames / (time.perf_counter() - start):6.1f} fps")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+# stream_depth.py
+# Perry Chien, Husky Robotics, PY 2024
+# Continuous depth estimation from a camera or a recorded video.
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from src.depth_engine import DepthEngine
+
+def main():
+    parser = argparse.ArgumentParser(description="Continuous depth estimation")
+    parser.add_argument('source', nargs='?', default='0', help="camera index or video file")
+    parser.add_argument('--calibration', default='calibration_params.npz')
+    parser.add_argument('--baseline', type=float, default=0.2)
+    parser.add_argument('--frame-gap', type=int, default=1)
+    parser.add_argument('--fps', type=float, default=None, help="target frames per second")
+    parser.add_argument('--frames', type=int, default=None, help="stop after that many depth maps")
+    args = parser.parse_args()
+
+    source = int(args.source) if args.source.isdigit() else args.source
+    engine = DepthEngine(args.calibration, args.baseline)
+    for _, average_depth in engine.stream(source, args.frame_gap, args.fps, args.frames):
+        metrics = engine.metrics()
+        print(f"depth at center {average_depth:6.2f} m | {metrics['fps']:5.1f} fps | "
+              f"latency {metrics['latency_mean_ms']:6.1f} ms (p95 {metrics['latency_p95_ms']:6.1f} ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# depth_engine.py
+# Perry Chien, Husky Robotics, PY 2024
+# Continuous depth estimation on frames streamed from a capture source.
+
+import time
+from collections import deque
+
+import cv2 as cv
+import numpy as np
+
+from src.stereo_depth_estimation import disparity_to_depth, get_undistortion
+
+class DepthEngine:
+    # Keeps the calibration, the undistortion maps, the StereoBM matcher and the
+    # depth buffers resident, so that every frame pair is processed in memory
+    # without any disk round trip.
+    # Parameters:
+    # - calibration_params: File path to saved camera calibration parameters.
+    # - baseline: The distance between the two camera positions.
+    # - num_disparities, block_size: StereoBM parameters.
+    # - window: Number of recent frames the latency metrics are computed over.
+
+    def __init__(self, calibration_params='calibration_params.npz', baseline=0.2,
+                 num_disparities=16, block_size=15, window=100):
+        self.calibration_params = calibration_params
+        with np.load(calibration_params) as X:
+            self.mtx = X['mtx']
+        self.baseline = baseline
+        self.stereo = cv.StereoBM_create(numDisparities=num_disparities, blockSize=block_size)
+        self.maps = {}  # undistortion maps per (width, height)
+        self.depth_map = None
+        self.latencies = deque(maxlen=window)
+        self.frames = 0
+        self.start_time = None
+
+    def get_maps(self, size):
+        # The undistortion maps for the image size, built on first use by the
+        # shared get_undistortion and kept, so that the frames don't stat the file.
+        if size not in self.maps:
+            _, map1, map2 = get_undistortion(self.calibration_params, size)
+            self.maps[size] = map1, map2
+        return self.maps[size]
+
+    def undistort_gray(self, img):
+        map1, map2 = self.get_maps((img.shape[1], img.shape[0]))
+        if img.ndim == 3:
+            img = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+        return cv.remap(img, map1, map2, cv.INTER_LINEAR)
+
+    def process(self, img_left, img_right):
+        # Computes the depth map of one frame pair.
+        # Returns:
+        # - depth_map: The computed depth map. The buffer is reused by the next
+        #   call, copy it to keep it.
+        # - average_depth: Estimated average depth at the center.
+        start = time.perf_counter()
+        disparity = self.stereo.compute(self.undistort_gray(img_left), self.undistort_gray(img_right))
+        if self.depth_map is None or self.depth_map.shape != disparity.shape:
+            self.depth_map = np.empty(disparity.shape, np.float32)
+        depth_map = disparity_to_depth(disparity, self.mtx[0, 0], self.baseline, out=self.depth_map)
+
+        center_x = depth_map.shape[1] // 2
+        center_depth = (depth_map[:, center_x - 1] + depth_map[:, center_x]) / 2
+        average_depth = np.mean(center_depth)
+
+        self.latencies.append(time.perf_counter() - start)
+        self.frames += 1
+        return depth_map, average_depth
+
+    def stream(self, source=0, frame_gap=1, target_fps=None, max_frames=None):
+        # Yields (depth_map, average_depth) for the frames of a capture source
+        # (camera index or video file), each frame paired with the one
+        # frame_gap frames before it, as the time delayed left image.
+        # - target_fps: Paces the processing to a steady rate, None runs as
+        #   fast as possible.
+        # - max_frames: Stops after that many depth maps, None at the end of
+        #   the source.
+        camera = cv.VideoCapture(source)
+        if not camera.isOpened():
+            raise IOError(f"Cannot open capture source {source}")
+        previous = deque(maxlen=frame_gap)
+        period = 1 / target_fps if target_fps else None
+        self.reset_metrics()
+        next_tick = self.start_time
+        try:
+            while max_frames is None or self.frames < max_frames:
+                ret, frame = camera.read()
+                if not ret:
+                    break
+                if len(previous) == frame_gap:
+                    yield self.process(previous[0], frame)
+                    if period is not None:
+                        next_tick += period
+                        time.sleep(max(0, next_tick - time.perf_counter()))
+                previous.append(frame)
+        finally:
+            camera.release()
+
+    def reset_metrics(self):
+        self.latencies.clear()
+        self.frames = 0
+        self.start_time = time.perf_counter()
+
+    def metrics(self):
+        # Latency of the recent frames in ms and the achieved frames per second.
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0
+        return {
+            'frames': self.frames,
+            'fps': self.frames / elapsed if elapsed > 0 else 0.0,
+            'latency_mean_ms': float(latencies.mean()),
+            'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'latency_max_ms': float(latencies.max()),
+        }
@@ -2,40 +2,79 @@
 # Perry Chien, Husky Robotics, PY 2024
 # Computes depth using the simulated stereo vision setup.
 
+import functools
+import os
+
 import cv2 as cv
 import numpy as np
 
-def compute_depth(left_image_path, right_image_path, baseline=0.2, calibration_params='calibration_params.npz'):
+def compute_depth(left_image_path, right_image_path, baseline=0.2, calibration_params='calibration_params.npz', depth_map=None):
     # Computes the depth map using the simulated stereo vision images.
     # Parameters:
     # - left_image_path: Path to the left image.
     # - right_image_path: Path to the right image.
     # - baseline: The distance between the two virtual camera positions.
     # - calibration_params: File path to saved camera calibration parameters.
+    # - depth_map: Optional float32 array of the image size to write the depth
+    #   map into, so that repeated calls don't allocate a new one.
     # Returns:
     # - depth_map: The computed depth map.
     # - average_depth: Estimated average depth at the center.
     
-    with np.load(calibration_params) as X:
-        mtx, dist = [X[i] for i in ('mtx', 'dist')]
-
     img_left = cv.imread(left_image_path)
     img_right = cv.imread(right_image_path)
-    img_left_undistorted = cv.undistort(img_left, mtx, dist, None, mtx)
-    img_right_undistorted = cv.undistort(img_right, mtx, dist, None, mtx)
+    mtx, map1, map2 = get_undistortion(calibration_params, (img_left.shape[1], img_left.shape[0]))
+    img_left_undistorted = cv.remap(img_left, map1, map2, cv.INTER_LINEAR)
+    img_right_undistorted = cv.remap(img_right, map1, map2, cv.INTER_LINEAR)
 
     stereo = cv.StereoBM_create(numDisparities=16, blockSize=15)
     disparity = stereo.compute(cv.cvtColor(img_left_undistorted, cv.COLOR_BGR2GRAY),
                                cv.cvtColor(img_right_undistorted, cv.COLOR_BGR2GRAY))
 
-    depth_map = np.zeros_like(disparity, dtype=np.float32)
-    for y in range(depth_map.shape[0]):
-        for x in range(depth_map.shape[1]):
-            if disparity[y, x] > 0:  # Avoid division by zero
-                depth_map[y, x] = baseline * mtx[0, 0] / disparity[y, x]
+    depth_map = disparity_to_depth(disparity, mtx[0, 0], baseline, out=depth_map)
 
     center_x = depth_map.shape[1] // 2
     center_depth = (depth_map[:, center_x - 1] + depth_map[:, center_x]) / 2
     average_depth = np.mean(center_depth)
 
     return depth_map, average_depth
+
+def get_undistortion(calibration_params, size):
+    # The camera matrix and the undistortion remap tables of a calibration file
+    # for the image size (width, height). The file is only read and the tables
+    # are only built on the first call, and again if the file changes.
+    # Returns:
+    # - mtx: The camera matrix.
+    # - map1, map2: Fixed point (CV_16SC2) tables for cv.remap.
+    path = os.path.abspath(calibration_params)
+    return _load_undistortion(path, os.path.getmtime(path), size)
+
+@functools.lru_cache(maxsize=8)
+def _load_undistortion(path, mtime, size):
+    with np.load(path) as X:
+        mtx, dist = [X[i] for i in ('mtx', 'dist')]
+    map1, map2 = cv.initUndistortRectifyMap(mtx, dist, None, mtx, size, cv.CV_16SC2)
+    return mtx, map1, map2
+
+def disparity_to_depth(disparity, focal_length, baseline, fixed_point=True, out=None):
+    # Converts a disparity map to a depth map (baseline * f / disparity) in one
+    # vectorized pass. Pixels without a valid disparity (<= 0) get depth 0.
+    # Parameters:
+    # - disparity: Disparity map, e.g. from StereoBM.compute.
+    # - focal_length: Focal length in pixels (mtx[0, 0]).
+    # - baseline: The distance between the two camera positions.
+    # - fixed_point: StereoBM/StereoSGBM return the disparity as int16 with 4
+    #   fractional bits, i.e. 16 times the disparity in pixels.
+    # - out: Optional float32 array of the same shape to write the depth into.
+    # Returns:
+    # - The depth map (out, if given).
+    if out is None:
+        out = np.empty(disparity.shape, np.float32)
+    elif out.shape != disparity.shape or out.dtype != np.float32:
+        raise ValueError(f"out must be a float32 array of shape {disparity.shape}")
+
+    scale = baseline * focal_length * (16 if fixed_point else 1)
+    valid = disparity > 0
+    out.fill(0)
+    np.divide(scale, disparity, out=out, where=valid, casting='same_kind')
+    return out